@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Importing python libraries"""
+import json
+import argparse
+import concurrent.futures
+from datetime import datetime, timedelta
+import warnings
+
+warnings.filterwarnings("ignore")
+
+"""Importing google-cloud libraries"""
+from google.cloud.exceptions import NotFound
+
+"""Importing local modules"""
+from bq_backup_layout import (
+    get_layout_pattern,
+    get_layout_prefix,
+    is_table_backup_file,
+)
+from bq_gcs import (
+    get_io_stats,
+    get_storage_client,
+    list_blobs,
+    print_io_stats,
+    read_json_many,
+    record_io,
+)
+
+# Retention Type -> number of days a backup is kept
+BACKUP_DATA_POLICY = {
+    "daily": 1,
+    "weekly": 7,
+    "monthly": 30,
+    "yearly": 365,
+}
+# Objects deleted per storage batch request (the batch API allows 100)
+DELETE_BATCH_SIZE = 100
+# Files of incremental backups pointing at data of earlier backup dates: a
+# reference to the whole table, or the partitions record of the table
+REFERENCE_FILE_SUFFIXES = ("-reference.json", "-partitions.json")
+
+
+def cmd_args_parser():
+    """Parsing command-line arguments"""
+    parser = argparse.ArgumentParser(
+        prog="BackupExpiration",
+        description="Deletes backups older than their retention policy",
+    )
+    parser.add_argument(
+        "--project_id",
+        type=str.split,
+        action="store",
+        dest="project_id",
+        help="""
+        Provide the project-id.
+        For multiple, use whitespace as delimiter.
+        """,
+        required=True,
+    )
+    parser.add_argument(
+        "--config_file",
+        type=str,
+        action="store",
+        dest="config_file",
+        help="Provide the backup configuration file path.",
+        required=True,
+    )
+    parser.add_argument(
+        "--retention",
+        type=str.split,
+        action="store",
+        dest="retention",
+        default=list(BACKUP_DATA_POLICY),
+        help="""
+        Provide retention tiers to sweep. All tiers by default.
+        For multiple, use whitespace as delimiter.
+        Follows lower case-sensitivity.
+        Available options are daily, monthly, weekly, yearly.
+        """,
+        required=False,
+    )
+    parser.add_argument(
+        "--date",
+        type=str,
+        action="store",
+        dest="date",
+        default=None,
+        help="Provide the date to sweep as of. Supported format: YYYY-mm-dd",
+        required=False,
+    )
+    args = parser.parse_args()
+    cmdargs = {}
+    cmdargs["project_id"] = args.project_id
+    cmdargs["config_file"] = args.config_file
+    cmdargs["retention"] = args.retention
+    cmdargs["date"] = args.date
+    return cmdargs
+
+
+def find_expired_backups(
+    project_id=None,
+    uri_templates=None,
+    bucket_name=None,
+    retention=None,
+    oldest_valid_timestamp=None,
+    max_workers=8,
+):
+    """
+    Lists a retention tier once and groups the objects of every backup dated
+    on or before oldest_valid_timestamp by their dataset/date prefix. Tables
+    a retained backup still references are kept until that backup expires.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param uri_templates: schema_uri and table_uri from the config (type:list)
+    :param bucket_name: Backup Bucket Name (type:str)
+    :param retention: Retention Type (type:str)
+    :param oldest_valid_timestamp: Format: YYYY-mm-dd (type:str)
+    :param max_workers: Reference files read at once (type:int)
+    :return expired_backups: {backup_prefix: [blob_names]} (type:dict)
+    """
+    layout_patterns = [
+        get_layout_pattern(
+            uri_template,
+            end_field="timestamp",
+            bucket_name=bucket_name,
+            retention=retention,
+        )
+        for uri_template in uri_templates
+    ]
+    tier_prefixes = sorted(
+        set(
+            get_layout_prefix(
+                uri_template, bucket_name=bucket_name, retention=retention
+            )
+            for uri_template in uri_templates
+        )
+    )
+    # Skipping prefixes already covered by a shorter one
+    tier_prefixes = [
+        prefix
+        for prefix in tier_prefixes
+        if not any(
+            prefix != other and prefix.startswith(other) for other in tier_prefixes
+        )
+    ]
+    expired_backups = {}
+    # {gcs_uri: (backup prefix up to its date, file_name)}
+    reference_files = {}
+    for tier_prefix in tier_prefixes:
+        for blob in list_blobs(tier_prefix, project_id=project_id):
+            gcs_uri = "gs://{}/{}".format(bucket_name, blob.name)
+            for layout_pattern in layout_patterns:
+                match = layout_pattern.match(gcs_uri)
+                if not match:
+                    continue
+                if match.group("timestamp") <= oldest_valid_timestamp:
+                    expired_backups.setdefault(match.group(0), []).append(blob.name)
+                elif gcs_uri.endswith(REFERENCE_FILE_SUFFIXES):
+                    reference_files[gcs_uri] = (
+                        gcs_uri[: match.start("timestamp")],
+                        gcs_uri.rsplit("/", 1)[-1],
+                    )
+                break
+    if not expired_backups or not reference_files:
+        return expired_backups
+
+    referenced_data = find_referenced_data(
+        project_id=project_id, reference_files=reference_files, max_workers=max_workers
+    )
+    # A referenced date can be a partitioned backup whose partitions record
+    # points at still older dates
+    expired_records = {}
+    for backup_prefix, table_data in referenced_data.items():
+        # Backup prefixes end with their YYYY-mm-dd date
+        prefix_head = backup_prefix[: -len(oldest_valid_timestamp)]
+        for blob_name in expired_backups.get(backup_prefix, []):
+            file_name = blob_name.rsplit("/", 1)[-1]
+            table_name = file_name[: -len("-partitions.json")]
+            if (
+                file_name.endswith("-partitions.json")
+                and (table_name, None) in table_data
+            ):
+                expired_records["gs://{}/{}".format(bucket_name, blob_name)] = (
+                    prefix_head,
+                    file_name,
+                )
+    if expired_records:
+        for backup_prefix, table_data in find_referenced_data(
+            project_id=project_id,
+            reference_files=expired_records,
+            max_workers=max_workers,
+        ).items():
+            referenced_data.setdefault(backup_prefix, set()).update(table_data)
+
+    kept_count = 0
+    for backup_prefix in list(expired_backups):
+        table_data = referenced_data.get(backup_prefix)
+        if not table_data:
+            continue
+        backup_blobs = [
+            blob_name
+            for blob_name in expired_backups[backup_prefix]
+            if not any(
+                is_table_backup_file(
+                    blob_name.rsplit("/", 1)[-1], table_name, partition_id
+                )
+                for table_name, partition_id in table_data
+            )
+        ]
+        kept_count = (
+            kept_count + len(expired_backups[backup_prefix]) - len(backup_blobs)
+        )
+        if backup_blobs:
+            expired_backups[backup_prefix] = backup_blobs
+        else:
+            del expired_backups[backup_prefix]
+    if kept_count:
+        print(
+            "Keeping {} expired {} objects still referenced by retained backups".format(
+                kept_count, retention
+            )
+        )
+    return expired_backups
+
+
+def find_referenced_data(project_id=None, reference_files=None, max_workers=8):
+    """
+    Reads reference files and partitions records concurrently and returns
+    the data they point at: whole tables for references, single partitions
+    for partitions records.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param reference_files: {gcs_uri: (backup prefix up to its date,
+                            file_name)} (type:dict)
+    :param max_workers: Number of concurrent reads (type:int)
+    :return referenced_data: {backup_prefix: {(table_name, partition_id)}},
+                             partition_id None for whole tables (type:dict)
+    """
+    referenced_data = {}
+    contents = read_json_many(
+        list(reference_files), project_id=project_id, max_workers=max_workers
+    )
+    for gcs_uri, content in contents.items():
+        if not content:
+            continue
+        prefix_head, file_name = reference_files[gcs_uri]
+        if file_name.endswith("-reference.json"):
+            referenced_data.setdefault(prefix_head + content["timestamp"], set()).add(
+                (file_name[: -len("-reference.json")], None)
+            )
+            continue
+        for partition_id, partition in content.get("partitions", {}).items():
+            referenced_data.setdefault(prefix_head + partition["timestamp"], set()).add(
+                (file_name[: -len("-partitions.json")], partition_id)
+            )
+    return referenced_data
+
+
+def delete_blobs_in_batches(
+    project_id=None, bucket_name=None, blob_names=None, max_workers=8, credentials=None
+):
+    """
+    Deletes objects with storage batch requests, running batches in parallel.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param bucket_name: Backup Bucket Name (type:str)
+    :param blob_names: Object names to delete (type:list)
+    :param max_workers: Number of batch requests in flight (type:int)
+    :param credentials: As for bq_gcs.get_storage_client
+                        (type:google.oauth2.service_account.Credentials)
+    :return deleted_count, failed_count: (type:int,int)
+    """
+    batches = [
+        blob_names[index : index + DELETE_BATCH_SIZE]
+        for index in range(0, len(blob_names), DELETE_BATCH_SIZE)
+    ]
+
+    def delete_batch(batch):
+        storage_client = get_storage_client(project_id, credentials)
+        bucket = storage_client.bucket(bucket_name)
+        try:
+            with storage_client.batch():
+                for blob_name in batch:
+                    bucket.delete_blob(blob_name)
+            record_io(requests=1)
+            return len(batch), []
+        except Exception as error:
+            record_io(requests=1)
+            print(
+                "Exception occurred at function {}: {}. Deleting the batch's "
+                "objects one by one...".format("delete_blobs_in_batches", error)
+            )
+        # A batch raises for its first failed request only, so the objects
+        # are retried one by one. Objects already gone count as deleted
+        failed_names = []
+        for blob_name in batch:
+            try:
+                bucket.delete_blob(blob_name)
+            except NotFound:
+                pass
+            except Exception as error:
+                print(
+                    "Exception occurred for {} at function {}: {}".format(
+                        blob_name, "delete_blobs_in_batches", error
+                    )
+                )
+                failed_names.append(blob_name)
+            record_io(requests=1)
+        return len(batch) - len(failed_names), failed_names
+
+    deleted_count, failed_count = 0, 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_batch = {
+            executor.submit(delete_batch, batch): batch for batch in batches
+        }
+        for future in concurrent.futures.as_completed(future_to_batch):
+            try:
+                batch_deleted, failed_names = future.result()
+                deleted_count = deleted_count + batch_deleted
+                failed_count = failed_count + len(failed_names)
+            except Exception as error:
+                failed_count = failed_count + len(future_to_batch[future])
+                print(
+                    "Exception occurred at function {}: {}".format(
+                        "delete_blobs_in_batches", error
+                    )
+                )
+    return deleted_count, failed_count
+
+
+def sweep_expired_backups(
+    project_id=None, backup_config=None, retention_list=None, date=None
+):
+    """
+    Deletes every backup of the project older than its retention policy,
+    including the days a previous run missed.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param backup_config: Backup Configuration (type:dict)
+    :param retention_list: Retention Types to sweep (type:list)
+    :param date: Date to sweep as of. Today if None. Format: YYYY-mm-dd (type:str)
+    :return failed_count: Number of objects that could not be deleted (type:int)
+    """
+    bucket_name = backup_config["projects_dict"][project_id]["bucket_name"]
+    uri_templates = [backup_config["schema_uri"], backup_config["table_uri"]]
+    # Run manifests expire with the backups they describe
+    if backup_config.get("manifest_uri"):
+        uri_templates.append(backup_config["manifest_uri"])
+    max_workers = backup_config.get("max_concurrent_deletes", 8)
+    as_of = datetime.strptime(date, "%Y-%m-%d") if date else datetime.now()
+    failed_count = 0
+    for retention in retention_list:
+        try:
+            oldest_valid_timestamp = (
+                as_of - timedelta(days=BACKUP_DATA_POLICY[retention])
+            ).strftime("%Y-%m-%d")
+            expired_backups = find_expired_backups(
+                project_id=project_id,
+                uri_templates=uri_templates,
+                bucket_name=bucket_name,
+                retention=retention,
+                oldest_valid_timestamp=oldest_valid_timestamp,
+                max_workers=max_workers,
+            )
+            blob_names = [
+                blob_name
+                for backup_blobs in expired_backups.values()
+                for blob_name in backup_blobs
+            ]
+            deleted_count, tier_failed_count = delete_blobs_in_batches(
+                project_id=project_id,
+                bucket_name=bucket_name,
+                blob_names=blob_names,
+                max_workers=max_workers,
+            )
+            failed_count = failed_count + tier_failed_count
+            for backup_prefix in sorted(expired_backups):
+                print("Expired '{}'".format(backup_prefix))
+            print(
+                "Deleted {} objects of {} {} backups on or before {}".format(
+                    deleted_count,
+                    len(expired_backups),
+                    retention,
+                    oldest_valid_timestamp,
+                )
+            )
+        except Exception as error:
+            print(
+                "Exception occurred at function {} for retention {}: {}".format(
+                    "sweep_expired_backups", retention, error
+                )
+            )
+            failed_count = failed_count + 1
+    return failed_count
+
+
+if __name__ == "__main__":
+    # Reading cmd args
+    cmdargs = cmd_args_parser()
+
+    # Reading backup-parameters from json config
+    with open(cmdargs["config_file"]) as f:
+        master_config = json.load(f)
+    backup_config = master_config["backup"]
+
+    for project_id in cmdargs["project_id"]:
+        print("Running backup expiration for project:{}".format(project_id))
+        run_io_stats = get_io_stats()
+        failed_count = sweep_expired_backups(
+            project_id=project_id,
+            backup_config=backup_config,
+            retention_list=cmdargs["retention"],
+            date=cmdargs["date"],
+        )
+        print_io_stats(label=project_id, since=run_io_stats)
+        print(
+            "Backup expiration success criteria is {}.\nHelp: 0-SUCCESS, 1-FAIL".format(
+                min(failed_count, 1)
+            )
+        )
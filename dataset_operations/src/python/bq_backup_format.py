@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Importing python libraries"""
+import os
+
+"""Importing local modules"""
+from bq_gcs import list_blobs
+
+# Backup Format -> {default compression, supported compressions, data file
+# extension, whether the data files carry their own schema}
+BACKUP_FORMATS = {
+    "NEWLINE_DELIMITED_JSON": {
+        "compression": "GZIP",
+        "compressions": ["GZIP", "NONE"],
+        "extension": "json",
+        "embeds_schema": False,
+    },
+    "AVRO": {
+        "compression": "SNAPPY",
+        "compressions": ["SNAPPY", "DEFLATE", "NONE"],
+        "extension": "avro",
+        "embeds_schema": True,
+    },
+    "PARQUET": {
+        "compression": "SNAPPY",
+        "compressions": ["SNAPPY", "GZIP", "NONE"],
+        "extension": "parquet",
+        "embeds_schema": True,
+    },
+}
+DEFAULT_BACKUP_FORMAT = "NEWLINE_DELIMITED_JSON"
+
+
+def get_backup_format(format_option=None):
+    """
+    Returns the backup format described by a config option.
+    :param format_option: "AVRO" or {"format": "AVRO", "compression": "DEFLATE"}.
+                          Defaults to gzip newline-delimited json (type:str/dict)
+    :return backup_format: {format, compression, extension, embeds_schema} (type:dict)
+    """
+    if not format_option:
+        format_option = DEFAULT_BACKUP_FORMAT
+    if isinstance(format_option, str):
+        format_option = {"format": format_option}
+    format_name = format_option["format"].upper()
+    if format_name not in BACKUP_FORMATS:
+        raise ValueError(
+            "Unsupported backup format {}. Choose from {}".format(
+                format_name, list(BACKUP_FORMATS)
+            )
+        )
+    format_spec = BACKUP_FORMATS[format_name]
+    compression = format_option.get("compression", format_spec["compression"]).upper()
+    if compression not in format_spec["compressions"]:
+        raise ValueError(
+            "Unsupported compression {} for {}. Choose from {}".format(
+                compression, format_name, format_spec["compressions"]
+            )
+        )
+    return {
+        "format": format_name,
+        "compression": compression,
+        "extension": format_spec["extension"],
+        "embeds_schema": format_spec["embeds_schema"],
+    }
+
+
+def resolve_backup_format(
+    backup_config=None, project_backup_config=None, dataset_name=None, table_name=None
+):
+    """
+    Returns the backup format of a table. A table entry in the project's
+    table_backup_formats wins over the project's backup_format, which wins
+    over the global backup_format.
+    :param backup_config: Backup Configuration (type:dict)
+    :param project_backup_config: Project Backup Configuration (type:dict)
+    :param dataset_name: Dataset-Id (type:str)
+    :param table_name: Table-Id (type:str)
+    :return backup_format: {format, compression, extension, embeds_schema} (type:dict)
+    """
+    table_formats = project_backup_config.get("table_backup_formats", {})
+    format_option = table_formats.get(
+        "{}.{}".format(dataset_name, table_name),
+        project_backup_config.get("backup_format", backup_config.get("backup_format")),
+    )
+    return get_backup_format(format_option)
+
+
+def detect_backup_format(gcs_table_path=None, project_id=None):
+    """
+    Detects the format a table was backed up in from the extension of its
+    data files. Returns None when no data files exist.
+    :param gcs_table_path: Table data uri up to the shard wildcard,
+                           e.g. gs://bucket/.../data/table- (type:str)
+    :param project_id: Google Cloud Project Id (type:str)
+    :return backup_format: {format, compression, extension, embeds_schema} (type:dict)
+    """
+    for blob in list_blobs(gcs_table_path, project_id=project_id, max_results=1):
+        extension = os.path.splitext(blob.name)[1].lstrip(".")
+        for format_name, format_spec in BACKUP_FORMATS.items():
+            if format_spec["extension"] == extension:
+                return get_backup_format(format_name)
+    return None
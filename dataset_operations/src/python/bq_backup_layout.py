@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Importing python libraries"""
+import re
+import string
+
+# Regular expressions for the fields of schema_uri/table_uri
+LAYOUT_FIELD_PATTERNS = {
+    "dataset_name": r"[^/]+",
+    "timestamp": r"\d{4}-\d{2}-\d{2}",
+    "schema_file_name": r"[^/]+",
+    "table_file_name": r"[^/]+",
+}
+
+# Schema files a table's backup consists of, besides its data files
+BACKUP_FILE_SUFFIXES = ("-schema.json", "-partitions.json", "-reference.json")
+
+
+def get_layout_pattern(uri_template=None, end_field=None, **known_fields):
+    """
+    Compiles a backup uri template into a regular expression with one named
+    group per unknown field. Known fields are matched literally.
+    :param uri_template: schema_uri or table_uri from the config (type:str)
+    :param end_field: Stop matching after this field, e.g. "timestamp" (type:str)
+    :param known_fields: Field values to fill in, e.g. bucket_name (type:dict)
+    :return layout_pattern: (type:re.Pattern)
+    """
+    regex = ""
+    for literal_text, field_name, _, _ in string.Formatter().parse(uri_template):
+        regex = regex + re.escape(literal_text)
+        if field_name is None:
+            continue
+        if field_name in known_fields:
+            regex = regex + re.escape(str(known_fields[field_name]))
+        else:
+            regex = regex + "(?P<{}>{})".format(
+                field_name, LAYOUT_FIELD_PATTERNS.get(field_name, r"[^/]+")
+            )
+        if field_name == end_field:
+            break
+    return re.compile(regex)
+
+
+def get_layout_prefix(uri_template=None, **known_fields):
+    """
+    Returns the part of a backup uri template that is fixed once the given
+    fields are known, e.g. gs://bucket/daily/ for bucket_name and retention.
+    :param uri_template: schema_uri or table_uri from the config (type:str)
+    :param known_fields: Field values to fill in (type:dict)
+    :return layout_prefix: (type:str)
+    """
+    prefix = ""
+    for literal_text, field_name, _, _ in string.Formatter().parse(uri_template):
+        prefix = prefix + literal_text
+        if field_name is None:
+            continue
+        if field_name not in known_fields:
+            break
+        prefix = prefix + str(known_fields[field_name])
+    return prefix
+
+
+def is_table_backup_file(file_name=None, table_name=None, partition_id=None):
+    """
+    Returns True if a file of a backup folder belongs to the table: its
+    schema files or its data shards, <table>-<shard> or
+    <table>-<partition>-<shard>. Given a partition_id, only the data shards
+    of that partition count.
+    :param file_name: Name of the file inside its schema or data folder (type:str)
+    :param table_name: Table-Id (type:str)
+    :param partition_id: Partition decorator, e.g. 20200726 (type:str)
+    :return is_table_file: (type:bool)
+    """
+    if partition_id is not None:
+        return file_name.startswith("{}-{}-".format(table_name, partition_id))
+    if file_name in [table_name + suffix for suffix in BACKUP_FILE_SUFFIXES]:
+        return True
+    return re.match(re.escape(table_name) + r"-(\d+-)?\d+\.", file_name) is not None
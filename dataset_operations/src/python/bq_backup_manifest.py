@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Importing python libraries"""
+import json
+import hashlib
+from datetime import datetime
+
+"""Importing local modules"""
+from bq_gcs import read_json, write_json
+
+
+def get_schema_hash(table_schema):
+    """
+    Returns a digest of a table schema, nested fields included, so two
+    backups can be compared without reading their schema files.
+    :param table_schema: [google.cloud.bigquery.schema.SchemaField] (type:list)
+    :return schema_hash: sha256 hex digest (type:str)
+    """
+    api_schema = [schema_field.to_api_repr() for schema_field in table_schema]
+    return hashlib.sha256(
+        json.dumps(api_schema, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def parse_utc_timestamp(timestamp=None):
+    """
+    Parses a UTC timestamp, e.g. the created time of a manifest or the
+    --date of a point-in-time restore. A trailing "Z" is optional.
+    :param timestamp: YYYY-mm-dd, YYYY-mm-ddTHH:MM:SS or
+                      YYYY-mm-ddTHH:MM:SS.ffffff (type:str)
+    :return utc_time: Naive datetime in UTC (type:datetime)
+    """
+    timestamp = timestamp.rstrip("Z")
+    for timestamp_format in ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(timestamp, timestamp_format)
+        except ValueError:
+            continue
+    raise ValueError("Unsupported timestamp: {}".format(timestamp))
+
+
+def get_manifest_uri(backup_config=None, bucket_name=None, **path_params):
+    """
+    Returns the manifest uri of a project's run. None if no manifest_uri
+    is configured.
+    :param backup_config: Backup or Restore Configuration (type:dict)
+    :param bucket_name: Backup Bucket Name (type:str)
+    :param path_params: retention, timestamp, project_id (type:dict)
+    :return manifest_uri: (type:str)
+    """
+    if not backup_config.get("manifest_uri"):
+        return None
+    return backup_config["manifest_uri"].format(bucket_name=bucket_name, **path_params)
+
+
+def get_table_manifest(job_params=None, table_state=None, error=None):
+    """
+    Returns the manifest entry of one table export. Shard names follow the
+    numbering bigquery gives the files of a wildcard extract.
+    :param job_params: Export Job Parameters (type:dict)
+    :param table_state: Table state returned by export_table_to_gcs (type:dict)
+    :param error: Exception raised by the export, if any (type:Exception)
+    :return table_manifest: {status, timestamp, format, compression, num_rows,
+                            num_bytes, schema_hash, shards, partitions} (type:dict)
+    """
+    if error is not None:
+        return {"status": "failed", "error": str(error)}
+    backup_format = job_params["backup_format"]
+    bq_table_name = job_params["table_name"]
+
+    def get_shards(timestamp, table_file_prefix, shard_count):
+        if shard_count is None:
+            return None
+        return [
+            job_params["table_path"].format(
+                bucket_name=job_params["bucket_name"],
+                retention=job_params["retention"],
+                dataset_name=job_params["dataset_name"],
+                timestamp=timestamp,
+                table_file_name="{}{:012d}.{}".format(
+                    table_file_prefix, index, backup_format["extension"]
+                ),
+            )
+            for index in range(shard_count)
+        ]
+
+    table_manifest = {
+        "status": table_state["status"],
+        "timestamp": table_state["timestamp"],
+        "format": backup_format["format"],
+        "compression": backup_format["compression"],
+        "num_rows": table_state.get("num_rows"),
+        "num_bytes": table_state.get("num_bytes"),
+        "schema_hash": table_state.get("schema_hash"),
+    }
+    if "partitions" in table_state:
+        table_manifest["partitions"] = {
+            partition_id: {
+                "timestamp": partition["timestamp"],
+                "total_rows": partition.get("total_rows"),
+                "shards": get_shards(
+                    partition["timestamp"],
+                    "{}-{}-".format(bq_table_name, partition_id),
+                    partition.get("shard_count"),
+                ),
+            }
+            for partition_id, partition in table_state["partitions"].items()
+        }
+    else:
+        table_manifest["shards"] = get_shards(
+            table_state["timestamp"],
+            bq_table_name + "-",
+            table_state.get("shard_count"),
+        )
+    return table_manifest
+
+
+def write_backup_manifest(
+    manifest_uri=None,
+    project_id=None,
+    retention=None,
+    timestamp=None,
+    table_manifests=None,
+):
+    """
+    Writes the manifest of one export run: every table of the project with
+    its status, size, schema hash and shard files.
+    :param manifest_uri: Manifest Uri (type:str)
+    :param project_id: Google Cloud Project Id (type:str)
+    :param retention: Retention Type (type:str)
+    :param timestamp: Backup Date. Format: YYYY-mm-dd (type:str)
+    :param table_manifests: {dataset_id.table_id: table_manifest} (type:dict)
+    :return success_criteria: {0:success, 1:fail}
+    """
+    try:
+        write_json(
+            manifest_uri,
+            {
+                "project_id": project_id,
+                "retention": retention,
+                "timestamp": timestamp,
+                "created": datetime.utcnow().isoformat() + "Z",
+                "table_count": len(table_manifests),
+                "failed_count": len(
+                    [
+                        table_manifest
+                        for table_manifest in table_manifests.values()
+                        if table_manifest["status"] == "failed"
+                    ]
+                ),
+                "tables": table_manifests,
+            },
+            project_id=project_id,
+        )
+        print("Backup manifest written to {}".format(manifest_uri))
+        return 0
+    except Exception as error:
+        print(
+            "Exception occurred at function {}: {}".format(
+                "write_backup_manifest", error
+            )
+        )
+        return 1
+
+
+def read_backup_manifest(manifest_uri=None, project_id=None):
+    """
+    Reads the manifest of an export run.
+    :param manifest_uri: Manifest Uri (type:str)
+    :param project_id: Google Cloud Project Id (type:str)
+    :return backup_manifest: Manifest content. None if the run wrote no
+                             manifest (type:dict)
+    """
+    if not manifest_uri:
+        return None
+    try:
+        return read_json(manifest_uri, project_id=project_id)
+    except Exception as error:
+        print(
+            "Exception occurred at function {}: {}".format(
+                "read_backup_manifest", error
+            )
+        )
+        return None
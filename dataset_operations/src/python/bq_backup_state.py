@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Importing python libraries"""
+import os
+import json
+
+"""Importing local modules"""
+from bq_gcs import read_json, write_json
+
+
+def load_backup_state(state_uri):
+    """
+    Reads the incremental-backup state of a project.
+    :param state_uri: Local path or gs:// uri of the state file (type:str)
+    :return backup_state: {dataset_id.table_id: table_state} (type:dict)
+    """
+    try:
+        if state_uri.startswith("gs://"):
+            return read_json(state_uri) or {}
+        if not os.path.exists(state_uri):
+            return {}
+        with open(state_uri) as f:
+            return json.load(f)
+    except Exception as error:
+        print(
+            "Exception occurred at function {}: {}".format("load_backup_state", error)
+        )
+        return {}
+
+
+def save_backup_state(state_uri, backup_state):
+    """
+    Writes the incremental-backup state of a project.
+    :param state_uri: Local path or gs:// uri of the state file (type:str)
+    :param backup_state: {dataset_id.table_id: table_state} (type:dict)
+    :return success_criteria: {0:success, 1:fail}
+    """
+    try:
+        if state_uri.startswith("gs://"):
+            write_json(state_uri, backup_state)
+        else:
+            if os.path.dirname(state_uri):
+                os.makedirs(os.path.dirname(state_uri), exist_ok=True)
+            with open(state_uri, "w") as f:
+                f.write(json.dumps(backup_state, indent=2, sort_keys=True))
+        return 0
+    except Exception as error:
+        print(
+            "Exception occurred at function {}: {}".format("save_backup_state", error)
+        )
+        return 1
+
+
+def get_table_state(table_obj):
+    """
+    Returns the fields that identify a table version.
+    :param table_obj: Big Query Table (type:google.cloud.bigquery.table.Table)
+    :return table_state: {modified, etag, num_rows} (type:dict)
+    """
+    return {
+        "modified": table_obj.modified.isoformat() if table_obj.modified else None,
+        "etag": table_obj.etag,
+        "num_rows": table_obj.num_rows,
+    }
+
+
+def is_table_unchanged(previous_state, table_state, oldest_valid_timestamp):
+    """
+    Returns True if the table was exported before and has not changed since,
+    and that earlier backup is still inside the retention window.
+    :param previous_state: State recorded at the last export (type:dict)
+    :param table_state: Current state from get_table_state (type:dict)
+    :param oldest_valid_timestamp: Backups on or before this date expire.
+                                   Format: YYYY-mm-dd (type:str)
+    :return unchanged: (type:bool)
+    """
+    if not previous_state:
+        return False
+    if previous_state.get("timestamp", "") <= oldest_valid_timestamp:
+        return False
+    return all(
+        previous_state.get(key) == value
+        for key, value in table_state.items()
+        if value is not None
+    )
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Importing python libraries"""
+import os
+import json
+import threading
+from datetime import datetime
+
+# Journal lines beyond the live entries tolerated before it is compacted
+JOURNAL_COMPACTION_SLACK = 1000
+
+# Process-wide open journals, shared by the projects of a run writing one path
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_checkpoint_key(
+    project_id=None, dataset_name=None, table_name=None, retention=None, timestamp=None
+):
+    """
+    Returns the journal key of one unit of work.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param dataset_name: Dataset-Id (type:str)
+    :param table_name: Table-Id (type:str)
+    :param retention: Retention Type (type:str)
+    :param timestamp: Backup or Restore Date (type:str)
+    :return checkpoint_key: project/dataset/table/retention/timestamp (type:str)
+    """
+    return "/".join([project_id, dataset_name, table_name, retention, timestamp])
+
+
+def get_partition_checkpoint_key(checkpoint_key=None, partition_id=None):
+    """
+    Returns the journal key of one partition job of a table.
+    :param checkpoint_key: Key of the table from get_checkpoint_key (type:str)
+    :param partition_id: Partition-Id (type:str)
+    :return checkpoint_key: (type:str)
+    """
+    return "{}${}".format(checkpoint_key, partition_id)
+
+
+def read_journal_entries(journal_path):
+    """
+    Replays a journal file into the latest entry of every key. A line cut off
+    by a crash is ignored.
+    :param journal_path: Local path of the journal (type:str)
+    :return entries, line_count, complete: {checkpoint_key: entry}, lines
+                                           read, False if the last line was
+                                           cut off (type:dict,int,bool)
+    """
+    entries, line_count, complete = {}, 0, True
+    if not os.path.exists(journal_path):
+        return entries, line_count, complete
+    with open(journal_path) as f:
+        for line in f:
+            line_count = line_count + 1
+            complete = line.endswith("\n")
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries[entry["key"]] = entry
+    return entries, line_count, complete
+
+
+def open_checkpoint_journal(journal_path=None):
+    """
+    Opens the append-only checkpoint journal of a run, replaying the entries
+    of an earlier attempt. A journal holding many superseded lines is first
+    rewritten with one line per key, so replay stays proportional to the
+    number of units, and a line cut off by a crash is dropped.
+    :param journal_path: Local path of the journal. None disables
+                         checkpointing (type:str)
+    :return journal: {path, file, entries, lock, users}. None if
+                     journal_path is None (type:dict)
+    """
+    if not journal_path:
+        return None
+    with _journals_lock:
+        if journal_path in _journals:
+            _journals[journal_path]["users"] = _journals[journal_path]["users"] + 1
+            return _journals[journal_path]
+        if os.path.dirname(journal_path):
+            os.makedirs(os.path.dirname(journal_path), exist_ok=True)
+        entries, line_count, complete = read_journal_entries(journal_path)
+        if not complete or line_count > 2 * len(entries) + JOURNAL_COMPACTION_SLACK:
+            compacted_path = journal_path + ".compacting"
+            with open(compacted_path, "w") as f:
+                for entry in entries.values():
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(compacted_path, journal_path)
+        if entries:
+            print(
+                "Resuming from checkpoint journal {} with {} entries".format(
+                    journal_path, len(entries)
+                )
+            )
+        _journals[journal_path] = {
+            "path": journal_path,
+            "file": open(journal_path, "a"),
+            "entries": entries,
+            "lock": threading.Lock(),
+            "users": 1,
+        }
+        return _journals[journal_path]
+
+
+def close_checkpoint_journal(journal=None):
+    """
+    Closes a checkpoint journal once every project writing it is done.
+    :param journal: Journal from open_checkpoint_journal (type:dict)
+    :return NoneType:
+    """
+    if journal is None:
+        return None
+    with _journals_lock:
+        journal["users"] = journal["users"] - 1
+        if journal["users"] == 0:
+            journal["file"].close()
+            _journals.pop(journal["path"], None)
+
+
+def get_checkpoint(journal=None, checkpoint_key=None):
+    """
+    Returns the latest journal entry of a unit.
+    :param journal: Journal from open_checkpoint_journal (type:dict)
+    :param checkpoint_key: Key from get_checkpoint_key (type:str)
+    :return entry: {key, status, time, ...}. None if the unit has no
+                   entry or checkpointing is disabled (type:dict)
+    """
+    if journal is None:
+        return None
+    with journal["lock"]:
+        return journal["entries"].get(checkpoint_key)
+
+
+def write_checkpoint(journal=None, checkpoint_key=None, status=None, **fields):
+    """
+    Appends an entry for a unit to the journal. Every line is flushed, so a
+    process killed mid-run loses at most the line being written.
+    :param journal: Journal from open_checkpoint_journal (type:dict)
+    :param checkpoint_key: Key from get_checkpoint_key (type:str)
+    :param status: "running", "done" or "failed" (type:str)
+    :param fields: JSON serializable details, e.g. job_id or result (type:dict)
+    :return NoneType:
+    """
+    if journal is None:
+        return None
+    entry = dict(
+        fields, key=checkpoint_key, status=status, time=datetime.now().isoformat()
+    )
+    line = json.dumps(entry) + "\n"
+    with journal["lock"]:
+        journal["entries"][checkpoint_key] = entry
+        journal["file"].write(line)
+        journal["file"].flush()
+
+
+def checkpoint_job_submission(
+    journal=None, checkpoint_key=None, client=None, location=None, submit_job=None
+):
+    """
+    Wraps the submission of a bigquery job so its job-id is journaled. If an
+    earlier attempt left the unit's job running, the first call re-attaches
+    to that job instead of submitting a new one, and falls back to a new
+    submission if the job can't be found or failed.
+    :param journal: Journal from open_checkpoint_journal (type:dict)
+    :param checkpoint_key: Key from get_checkpoint_key (type:str)
+    :param client: Bigquery Client (type:google.cloud.bigquery.client.Client)
+    :param location: Job Location (type:str)
+    :param submit_job: Callable submitting the job and returning it (type:function)
+    :return submit: Callable returning the submitted or re-attached job (type:function)
+    """
+    if journal is None:
+        return submit_job
+    entry = get_checkpoint(journal, checkpoint_key)
+    running_job_id = None
+    if entry is not None and entry["status"] == "running":
+        running_job_id = entry.get("job_id")
+    reattach = [running_job_id]
+
+    def submit():
+        job_id, reattach[0] = reattach[0], None
+        if job_id is not None:
+            try:
+                job = client.get_job(job_id, location=location)
+                job.result()
+                print("Re-attached to job {} of {}".format(job_id, checkpoint_key))
+                return job
+            except Exception as error:
+                print(
+                    "Re-attaching to job {} of {} failed: {}. Resubmitting...".format(
+                        job_id, checkpoint_key, error
+                    )
+                )
+        job = submit_job()
+        write_checkpoint(journal, checkpoint_key, "running", job_id=job.job_id)
+        return job
+
+    return submit
@@ -3,15 +3,42 @@
 """Importing python libraries"""
 import argparse
 import json
-import os
-import subprocess
+import concurrent.futures
+from datetime import datetime, timedelta
 
 """Importing google-cloud packages"""
 from google.cloud import bigquery
+from google.cloud import bigquery_datatransfer
 from google.cloud.exceptions import NotFound
 from google.oauth2 import service_account
 from google.cloud import secretmanager
 
+"""Importing local modules"""
+from bq_data_transfer import (
+    delete_duplicate_transfer_configs,
+    get_transfer_client,
+    get_transfer_run_seconds,
+    list_transfer_configs,
+    start_transfer_run,
+    upsert_transfer_config,
+    wait_for_transfer_run,
+)
+from bq_enumeration import get_dataset_table_index, iter_dataset_tables
+from bq_backup_expiration import delete_blobs_in_batches
+from bq_gcs import list_blobs, split_gcs_uri
+from bq_job_window import run_job_window
+from bq_rate_limiter import (
+    call_with_rate_limit,
+    configure_rate_limits,
+    run_rate_limited_job,
+)
+from bq_run_plan import format_bytes
+from bq_table_definition import (
+    apply_table_definition,
+    apply_table_properties,
+    get_table_definition,
+)
+
 
 def cmd_args_parser():
     """Parsing command-line arguments"""
@@ -65,35 +92,53 @@ def access_secret_version(project_id, secret_id, version_id="latest"):
     return secret_key
 
 
-def check_dataset_exists(dataset_ref=None, client=None):
-    """Returns True if dataset exists. Else returns False"""
-    try:
-        client.get_dataset(dataset_ref)
-        return True
-    except NotFound:
-        return False
-    except Exception as error:
-        print(
-            "Exception occurred at {} function: {}".format(
-                "check_dataset_exists", error
-            )
-        )
-        return False
+def get_dataset_locations(client=None, project_id=None, datasets=None, max_workers=8):
+    """
+    Returns the location of every dataset, looked up concurrently.
+    :param client: Big Query Client (type:google.cloud.bigquery.client.Client)
+    :param project_id: GCP Project-Id (type:str)
+    :param datasets: List of Dataset-Ids (type:list)
+    :param max_workers: Datasets looked up at once (type:int)
+    :return dataset_locations: {dataset_id: location}. None for datasets
+                               that don't exist (type:dict)
+    """
+
+    def get_location(dataset_id):
+        try:
+            return call_with_rate_limit(
+                project_id=project_id,
+                methods=["datasets.get"],
+                api_call=lambda: client.get_dataset(
+                    "{}.{}".format(project_id, dataset_id)
+                ),
+            ).location
+        except NotFound:
+            return None
 
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, max_workers)
+    ) as executor:
+        return dict(zip(datasets, executor.map(get_location, datasets)))
 
-def create_datasets(bq_client=None, datasets=None):
+
+def create_datasets(bq_client=None, datasets=None, dataset_locations=None):
     """
     Creates datasets in Big Query.
     :param bq_client: Target Big Query Client (type:google.cloud.bigquery.client.Client)
     :param datasets: List of Datasets (type:list)
+    :param dataset_locations: {dataset: location} (type:dict)
     :return success_criterion: (type:int)
     """
     success_criterion = 0
     try:
         for dataset_id in datasets:
             dataset = bigquery.Dataset(dataset_id)
-            dataset.location = "US"
-            dataset = bq_client.create_dataset(dataset)
+            dataset.location = dataset_locations[dataset_id]
+            dataset = call_with_rate_limit(
+                project_id=bq_client.project,
+                methods=["datasets.insert"],
+                api_call=lambda: bq_client.create_dataset(dataset),
+            )
             success_criterion = 0
     except Exception as error:
         print("Exception occurred at {} function: {}".format("create_datasets", error))
@@ -102,104 +147,545 @@ def create_datasets(bq_client=None, datasets=None):
         return success_criterion
 
 
+def prepare_target_datasets(
+    source_client=None,
+    target_client=None,
+    source_project_id=None,
+    target_project_id=None,
+    datasets=None,
+    target_location=None,
+):
+    """
+    Looks up where every source dataset and its target live, creating the
+    missing targets in target_location, or in the location of their source
+    if no target_location is set.
+    :param source_client: Source Big Query Client (type:google.cloud.bigquery.client.Client)
+    :param target_client: Target Big Query Client (type:google.cloud.bigquery.client.Client)
+    :param source_project_id: GCP Project-Id (type:str)
+    :param target_project_id: GCP Project-Id (type:str)
+    :param datasets: List of Dataset-Ids (type:list)
+    :param target_location: Location of created target datasets (type:str)
+    :return dataset_routes: {dataset_id: {source_location, target_location}},
+                            a location None if the dataset doesn't exist.
+                            None if a target dataset couldn't be created (type:dict)
+    """
+    source_locations = get_dataset_locations(
+        client=source_client, project_id=source_project_id, datasets=datasets
+    )
+    target_locations = get_dataset_locations(
+        client=target_client, project_id=target_project_id, datasets=datasets
+    )
+    # Targets of missing sources aren't created; their copies fail instead
+    missing_datasets = {
+        "{}.{}".format(target_project_id, dataset_id): target_location
+        or source_locations[dataset_id]
+        for dataset_id in datasets
+        if target_locations[dataset_id] is None
+        and source_locations[dataset_id] is not None
+    }
+    if missing_datasets:
+        if create_datasets(
+            bq_client=target_client,
+            datasets=list(missing_datasets),
+            dataset_locations=missing_datasets,
+        ):
+            return None
+        for dataset_ref, location in missing_datasets.items():
+            target_locations[dataset_ref.split(".", 1)[1]] = location
+    return {
+        dataset_id: {
+            "source_location": source_locations[dataset_id],
+            "target_location": target_locations[dataset_id],
+        }
+        for dataset_id in datasets
+    }
+
+
+def is_same_location(dataset_route=None):
+    """Returns True if a dataset and its target share a location"""
+    return (
+        dataset_route["source_location"] is not None
+        and dataset_route["target_location"] is not None
+        and dataset_route["source_location"].lower()
+        == dataset_route["target_location"].lower()
+    )
+
+
+def copy_table(
+    source_client=None,
+    source_project_id=None,
+    target_project_id=None,
+    table_id=None,
+    location=None,
+):
+    """
+    Copies one dataset_id.table_id between two projects and waits for the job.
+    :param source_client: Source Big Query Client (type:google.cloud.bigquery.client.Client)
+    :param source_project_id: GCP Project-Id (type:str)
+    :param target_project_id: GCP Project-Id (type:str)
+    :param table_id: dataset_id.table_id (type:str)
+    :param location: Location of both datasets (type:str)
+    :return copy_job: The finished job (type:google.cloud.bigquery.job.CopyJob)
+    """
+    source_table_id = "{}.{}".format(source_project_id, table_id)
+    destination_table_id = "{}.{}".format(target_project_id, table_id)
+    job_config = bigquery.CopyJobConfig()
+    job_config.write_disposition = bigquery.WriteDisposition.WRITE_TRUNCATE
+    job_config.create_disposition = bigquery.CreateDisposition.CREATE_IF_NEEDED
+    return run_rate_limited_job(
+        project_id=source_project_id,
+        job_type="copy",
+        submit_job=lambda: source_client.copy_table(
+            source_table_id,
+            destination_table_id,
+            location=location,
+            job_config=job_config,
+        ),
+    )
+
+
+def delete_staging_files(staging_table_uri=None, project_id=None, credentials=None):
+    """
+    Deletes the staging files of a cross-region table copy. Failures are
+    only printed, so they don't mask the outcome of the copy.
+    :param staging_table_uri: gs:// uri of the files with one "*" (type:str)
+    :param project_id: GCP Project-Id (type:str)
+    :param credentials: Credentials the files are deleted with
+                        (type:google.oauth2.service_account.Credentials)
+    :return NoneType:
+    """
+    try:
+        staging_blob_names = [
+            blob.name
+            for blob in list_blobs(
+                staging_table_uri.split("*")[0],
+                project_id=project_id,
+                credentials=credentials,
+            )
+        ]
+        delete_blobs_in_batches(
+            project_id=project_id,
+            bucket_name=split_gcs_uri(staging_table_uri)[0],
+            blob_names=staging_blob_names,
+            credentials=credentials,
+        )
+    except Exception as error:
+        print(
+            "Exception occurred for {} at function {}: {}".format(
+                staging_table_uri, "delete_staging_files", error
+            )
+        )
+
+
+def extract_load_table(
+    source_client=None,
+    target_client=None,
+    source_project_id=None,
+    target_project_id=None,
+    table_id=None,
+    dataset_route=None,
+    staging_uri=None,
+    credentials=None,
+):
+    """
+    Moves one dataset_id.table_id across regions: an extract to sharded avro
+    files under staging_uri, written in parallel by bigquery, and a load of
+    those files into the target region. The load recreates the definition
+    of the source table (partitioning, clustering, descriptions), as a copy
+    job would. The staging files are deleted once the copy ends, whether it
+    succeeded or not.
+    :param source_client: Source Big Query Client (type:google.cloud.bigquery.client.Client)
+    :param target_client: Target Big Query Client (type:google.cloud.bigquery.client.Client)
+    :param source_project_id: GCP Project-Id (type:str)
+    :param target_project_id: GCP Project-Id (type:str)
+    :param table_id: dataset_id.table_id (type:str)
+    :param dataset_route: {source_location, target_location} (type:dict)
+    :param staging_uri: gs:// uri template with {dataset_name}, {table_name}
+                        and one "*". Its bucket must be one the source
+                        location can extract to and the target location
+                        can load from (type:str)
+    :param credentials: Credentials the staging files are deleted with
+                        (type:google.oauth2.service_account.Credentials)
+    :return load_job: The finished job (type:google.cloud.bigquery.job.LoadJob)
+    """
+    if not staging_uri:
+        raise ValueError("Cross-region table copies need migration.staging_uri")
+    dataset_name, table_name = table_id.split(".", 1)
+    staging_table_uri = staging_uri.format(
+        dataset_name=dataset_name, table_name=table_name
+    )
+    source_table_id = "{}.{}".format(source_project_id, table_id)
+    target_table_id = "{}.{}".format(target_project_id, table_id)
+    # Avro carries the schema, but not the rest of the table definition
+    table_definition = get_table_definition(
+        call_with_rate_limit(
+            project_id=source_project_id,
+            methods=["tables.get"],
+            api_call=lambda: source_client.get_table(source_table_id),
+        )
+    )
+    try:
+        extract_job_config = bigquery.ExtractJobConfig()
+        extract_job_config.destination_format = bigquery.DestinationFormat.AVRO
+        extract_job_config.compression = bigquery.Compression.SNAPPY
+        run_rate_limited_job(
+            project_id=source_project_id,
+            job_type="extract",
+            submit_job=lambda: source_client.extract_table(
+                source_table_id,
+                staging_table_uri,
+                location=dataset_route["source_location"],
+                job_config=extract_job_config,
+            ),
+        )
+        load_job_config = bigquery.LoadJobConfig()
+        apply_table_definition(load_job_config, table_definition, embeds_schema=True)
+        load_job_config.source_format = bigquery.SourceFormat.AVRO
+        load_job_config.use_avro_logical_types = True
+        load_job_config.write_disposition = bigquery.WriteDisposition.WRITE_TRUNCATE
+        load_job_config.create_disposition = bigquery.CreateDisposition.CREATE_IF_NEEDED
+        load_job = run_rate_limited_job(
+            project_id=target_project_id,
+            job_type="load",
+            submit_job=lambda: target_client.load_table_from_uri(
+                staging_table_uri,
+                target_table_id,
+                location=dataset_route["target_location"],
+                job_config=load_job_config,
+            ),
+        )
+        # Column descriptions and require_partition_filter can't be loaded
+        target_table = call_with_rate_limit(
+            project_id=target_project_id,
+            methods=["tables.get"],
+            api_call=lambda: target_client.get_table(target_table_id),
+        )
+        changed_fields = apply_table_properties(target_table, table_definition)
+        if changed_fields:
+            call_with_rate_limit(
+                project_id=target_project_id,
+                methods=["tables.update"],
+                api_call=lambda: target_client.update_table(
+                    target_table, changed_fields
+                ),
+            )
+    finally:
+        # Shards of a failed extract or load are removed as well
+        delete_staging_files(
+            staging_table_uri=staging_table_uri,
+            project_id=target_project_id,
+            credentials=credentials,
+        )
+    return load_job
+
+
 def bq_copy_table(
     source_client=None,
+    target_client=None,
     source_project_id=None,
     target_project_id=None,
     dataset_table_list=None,
+    dataset_routes=None,
+    staging_uri=None,
+    max_concurrent_jobs=1,
+    credentials=None,
 ):
     """
-    Copying custom project.dataset.table between two projects.
+    Copying custom project.dataset.table between two projects. Tables whose
+    dataset and target share a location are copied by a copy job, the others
+    are extracted and loaded across regions. Tables run concurrently, at
+    most max_concurrent_jobs at once, and a failed table doesn't stop the
+    others.
+    :param source_client: Source Big Query Client (type:google.cloud.bigquery.client.Client)
+    :param target_client: Target Big Query Client (type:google.cloud.bigquery.client.Client)
     :param source_project_id: GCP Project-Id (type:str)
     :param target_project_id: GCP Project-Id (type:str)
     :param dataset_table_list: [dataset_id.table_id] (type:list)
-    :return table_transfer_criterion {0:SUCCESS, 1:FAIL}.
+    :param dataset_routes: From prepare_target_datasets (type:dict)
+    :param staging_uri: Staging files of cross-region tables, as for
+                        extract_load_table (type:str)
+    :param max_concurrent_jobs: Tables copied at once (type:int)
+    :param credentials: As for extract_load_table
+                        (type:google.oauth2.service_account.Credentials)
+    :return table_statuses: {dataset_id.table_id: {status, route, job_id,
+                            seconds, error}} with status "done" or "failed"
+                            and route "copy" or "extract_load" (type:dict)
     """
-    table_transfer_criterion = 0
-    # Table Copy From Source Project To Target Project
-    for table_id in dataset_table_list:
-        try:
-            source_table_id = "{}.{}".format(source_project_id, table_id)
-            destination_table_id = "{}.{}".format(target_project_id, table_id)
-            job_config = bigquery.CopyJobConfig()
-            job_config.write_disposition = bigquery.WriteDisposition.WRITE_TRUNCATE
-            job_config.create_disposition = bigquery.CreateDisposition.CREATE_IF_NEEDED
-            job = source_client.copy_table(
-                source_table_id,
-                destination_table_id,
-                location="US",
-                job_config=job_config,
+    table_statuses = {}
+    started = {}
+
+    def get_route(table_id):
+        if is_same_location(dataset_routes[table_id.split(".")[0]]):
+            return "copy"
+        return "extract_load"
+
+    def process_table(table_id):
+        started[table_id] = datetime.now()
+        dataset_route = dataset_routes[table_id.split(".")[0]]
+        if dataset_route["source_location"] is None:
+            raise ValueError("Source dataset not found")
+        if get_route(table_id) == "copy":
+            return copy_table(
+                source_client=source_client,
+                source_project_id=source_project_id,
+                target_project_id=target_project_id,
+                table_id=table_id,
+                location=dataset_route["source_location"],
             )
-            job.result()
+        return extract_load_table(
+            source_client=source_client,
+            target_client=target_client,
+            source_project_id=source_project_id,
+            target_project_id=target_project_id,
+            table_id=table_id,
+            dataset_route=dataset_route,
+            staging_uri=staging_uri,
+            credentials=credentials,
+        )
+
+    def on_table_done(table_id, copy_job, error):
+        table_statuses[table_id] = {
+            "status": "failed" if error is not None else "done",
+            "route": get_route(table_id),
+            "job_id": copy_job.job_id if copy_job is not None else None,
+            "seconds": (datetime.now() - started[table_id]).total_seconds(),
+            "error": str(error) if error is not None else None,
+        }
+        if error is not None:
             print(
-                "Copy successful from {} to {}".format(
-                    source_table_id, destination_table_id
+                "Exception occurred for {} at function {}: {}".format(
+                    table_id, "bq_copy_table", error
                 )
             )
-            table_transfer_criterion = 0
-        except Exception as error:
+        else:
             print(
-                "Exception occurred for {} at function {}: {}".format(
-                    table_id, "bq_copy_table", error
+                "Copy successful from {}.{} to {}.{} by {} in {:.1f}s".format(
+                    source_project_id,
+                    table_id,
+                    target_project_id,
+                    table_id,
+                    table_statuses[table_id]["route"],
+                    table_statuses[table_id]["seconds"],
                 )
             )
-            table_transfer_criterion = table_transfer_criterion + 1
-    return table_transfer_criterion
+
+    # Table Copy From Source Project To Target Project
+    run_job_window(
+        work_units=dataset_table_list,
+        process_unit=process_table,
+        on_unit_done=on_table_done,
+        max_in_flight=max_concurrent_jobs,
+    )
+    failed_tables = sorted(
+        table_id
+        for table_id, table_status in table_statuses.items()
+        if table_status["status"] == "failed"
+    )
+    print(
+        "Table copies: {} done, {} failed".format(
+            len(table_statuses) - len(failed_tables), len(failed_tables)
+        )
+    )
+    for table_id in failed_tables:
+        print(
+            "Copy failed for {}: {}".format(table_id, table_statuses[table_id]["error"])
+        )
+    return table_statuses
 
 
 def bq_copy_dataset(
-    shell_script=None,
+    transfer_client=None,
+    target_client=None,
     source_project_id=None,
     target_project_id=None,
     copy_datasets_dict=None,
+    dataset_routes=None,
+    max_concurrent_transfers=1,
+    transfer_poll=None,
 ):
     """
-    Copying project.dataset between two projects.
+    Copying project.dataset between two projects through the Data Transfer
+    Service and waiting for the copies to finish. Every dataset pair keeps
+    one transfer config, reused across syncs, and is copied by a run started
+    on demand. Up to max_concurrent_transfers runs are started and polled at
+    once.
+    :param transfer_client: From get_transfer_client
+                            (type:google.cloud.bigquery_datatransfer.DataTransferServiceClient)
+    :param target_client: Target Big Query Client (type:google.cloud.bigquery.client.Client)
     :param source_project_id: GCP Project-Id (type:str)
     :param target_project_id: GCP Project-Id (type:str)
     :param copy_datasets_dict: {source_dataset_id:target_dataset_id} (type:dict)
-    :return dataset_transfer_criterion {0:SUCCESS, 1:FAIL}.
+    :param dataset_routes: From prepare_target_datasets (type:dict)
+    :param max_concurrent_transfers: Transfers running at once (type:int)
+    :param transfer_poll: {poll_initial_seconds, poll_max_seconds,
+                          transfer_timeout_seconds} (type:dict)
+    :return dataset_statuses: {source_dataset_id: {status, transfer_config,
+                              transfer_run, run_state, seconds, num_bytes,
+                              table_count, error}} with status "done",
+                              "failed" or "timed_out". table_count and
+                              num_bytes cover the tables the run wrote
+                              (type:dict)
     """
-    dataset_transfer_criterion = 0
-    # Dataset Copy From Source Project To Target Project
-    for source_dataset_id, target_dataset_id in copy_datasets_dict.items():
-        try:
-            print(
-                "Copying {}.{} to {}.{}".format(
-                    source_project_id,
-                    source_dataset_id,
-                    target_project_id,
-                    target_dataset_id,
-                )
+    dataset_statuses = {}
+    batch_started = datetime.now()
+    # One listing per target location, leaving one config per pair
+    transfer_configs = {}
+    for location in set(
+        dataset_routes[source_dataset_id]["target_location"]
+        for source_dataset_id in copy_datasets_dict
+        if dataset_routes[source_dataset_id]["source_location"] is not None
+    ):
+        transfer_configs.update(
+            list_transfer_configs(
+                transfer_client=transfer_client,
+                target_project_id=target_project_id,
+                location=location,
             )
-            process = subprocess.call(
-                [
-                    shell_script
-                    + " "
-                    + target_project_id
-                    + " "
-                    + target_dataset_id
-                    + " "
-                    + source_dataset_id
-                    + " "
-                    + source_project_id
-                ],
-                shell=True,
+        )
+    transfer_configs = delete_duplicate_transfer_configs(
+        transfer_client=transfer_client,
+        transfer_configs=transfer_configs,
+        max_workers=max_concurrent_transfers,
+    )
+
+    def process_dataset(source_dataset_id):
+        target_dataset_id = copy_datasets_dict[source_dataset_id]
+        if dataset_routes[source_dataset_id]["source_location"] is None:
+            raise ValueError("Source dataset not found")
+        print(
+            "Copying {}.{} to {}.{}".format(
+                source_project_id,
+                source_dataset_id,
+                target_project_id,
+                target_dataset_id,
             )
-            if process == 0:
-                dataset_transfer_criterion = 0
-                print("Success")
-            else:
-                dataset_transfer_criterion = dataset_transfer_criterion + 1
-                print("Failed")
-        except Exception as error:
+        )
+        transfer_config = upsert_transfer_config(
+            transfer_client=transfer_client,
+            transfer_config=transfer_configs.get(
+                (source_project_id, source_dataset_id, target_dataset_id)
+            ),
+            source_project_id=source_project_id,
+            target_project_id=target_project_id,
+            source_dataset_id=source_dataset_id,
+            target_dataset_id=target_dataset_id,
+            location=dataset_routes[source_dataset_id]["target_location"],
+        )
+        # Tables the run doesn't write keep their last_modified_time
+        previous_table_index = (
+            get_dataset_table_index(
+                client=target_client,
+                project_id=target_project_id,
+                dataset=target_dataset_id,
+            )
+            or {}
+        )
+        transfer_run = start_transfer_run(
+            transfer_client=transfer_client, transfer_config_name=transfer_config.name
+        )
+        print(
+            "Transfer run {} started for {}".format(
+                transfer_run.name, source_dataset_id
+            )
+        )
+        dataset_status = {
+            "status": "timed_out",
+            "transfer_config": transfer_config.name,
+            "transfer_run": transfer_run.name,
+            "run_state": None,
+            "seconds": None,
+            "num_bytes": None,
+            "table_count": None,
+            "error": None,
+        }
+        transfer_run = wait_for_transfer_run(
+            transfer_client=transfer_client,
+            transfer_run_name=transfer_run.name,
+            transfer_poll=transfer_poll,
+        )
+        if transfer_run is None:
+            dataset_status["error"] = "no finished run within transfer_timeout_seconds"
+            return dataset_status
+        dataset_status["run_state"] = bigquery_datatransfer.enums.TransferState(
+            transfer_run.state
+        ).name
+        dataset_status["seconds"] = get_transfer_run_seconds(transfer_run)
+        if transfer_run.state != bigquery_datatransfer.enums.TransferState.SUCCEEDED:
+            dataset_status["status"] = "failed"
+            dataset_status["error"] = transfer_run.error_status.message or None
+            return dataset_status
+        # Sizing what was copied from the target dataset in one query
+        table_index = get_dataset_table_index(
+            client=target_client,
+            project_id=target_project_id,
+            dataset=target_dataset_id,
+        )
+        copied_tables = [
+            table
+            for table_name, table in (table_index or {}).items()
+            if table_name not in previous_table_index
+            or table["last_modified_time"]
+            != previous_table_index[table_name]["last_modified_time"]
+        ]
+        dataset_status["status"] = "done"
+        dataset_status["table_count"] = len(copied_tables)
+        dataset_status["num_bytes"] = sum(
+            int(table["num_bytes"] or 0) for table in copied_tables
+        )
+        return dataset_status
+
+    def on_dataset_done(source_dataset_id, dataset_status, error):
+        if error is not None:
+            dataset_status = {"status": "failed", "error": str(error)}
             print(
                 "Exception occurred for {} at function {} : {}".format(
                     source_dataset_id, "bq_copy_dataset", error
                 )
             )
-            dataset_transfer_criterion = dataset_transfer_criterion + 1
-    return dataset_transfer_criterion
+        elif dataset_status["status"] == "done":
+            print(
+                "Copied {}: {} tables, {} in {}".format(
+                    source_dataset_id,
+                    dataset_status["table_count"],
+                    format_bytes(dataset_status["num_bytes"]),
+                    timedelta(seconds=int(dataset_status["seconds"] or 0)),
+                )
+            )
+        else:
+            print(
+                "Copy of {} {}: {}".format(
+                    source_dataset_id,
+                    dataset_status["status"],
+                    dataset_status["error"] or dataset_status["run_state"],
+                )
+            )
+        dataset_statuses[source_dataset_id] = dataset_status
+
+    # Dataset Copy From Source Project To Target Project
+    run_job_window(
+        work_units=list(copy_datasets_dict),
+        process_unit=process_dataset,
+        on_unit_done=on_dataset_done,
+        max_in_flight=max_concurrent_transfers,
+    )
+    batch_seconds = (datetime.now() - batch_started).total_seconds()
+    done_statuses = [
+        dataset_status
+        for dataset_status in dataset_statuses.values()
+        if dataset_status["status"] == "done"
+    ]
+    total_bytes = sum(dataset_status["num_bytes"] for dataset_status in done_statuses)
+    print(
+        "Dataset copies: {} done, {} not done. {} tables, {} in {} ({}/s)".format(
+            len(done_statuses),
+            len(dataset_statuses) - len(done_statuses),
+            sum(dataset_status["table_count"] for dataset_status in done_statuses),
+            format_bytes(total_bytes),
+            timedelta(seconds=int(batch_seconds)),
+            format_bytes(total_bytes / max(batch_seconds, 1)),
+        )
+    )
+    return dataset_statuses
 
 
 class Data_Movement:
@@ -218,6 +704,8 @@ class Data_Movement:
             with open(config_file) as f:
                 master_config = json.load(f)
             config = master_config["migration"]
+            # Limits shared by every copy job of the run
+            configure_rate_limits(master_config.get("rate_limits"))
 
             # Getting service account json-content from secrets manager
             service_account_credentials = access_secret_version(
@@ -229,6 +717,19 @@ class Data_Movement:
                 service_account_credentials
             )
 
+            # Transfer configs are owned by the account of transfer_secret_key,
+            # passed explicitly instead of switching the gcloud account
+            transfer_credentials = bq_credentials
+            if config.get("transfer_secret_key"):
+                transfer_credentials = (
+                    service_account.Credentials.from_service_account_info(
+                        access_secret_version(
+                            config["secret_manager_project"],
+                            config["transfer_secret_key"],
+                        )
+                    )
+                )
+
             # Checking the data-transfer type
             dataset_table_list, datasets_list = {}, []
             if type == "tables":
@@ -248,35 +749,38 @@ class Data_Movement:
             target_client = bigquery.Client(
                 project=config["target_project_id"], credentials=bq_credentials
             )
+            transfer_client = get_transfer_client(credentials=transfer_credentials)
 
             # Table-level data transfer
             if dataset_table_list:
                 datasets = list(set([x.split(".")[0] for x in dataset_table_list]))
-                missing_datasets = []
-                for dataset_id in datasets:
-                    dataset_ref = "{}.{}".format(
-                        config["target_project_id"], dataset_id
-                    )
-                    dataset_exists = check_dataset_exists(
-                        dataset_ref=dataset_ref, client=target_client
-                    )
-                    if not dataset_exists:
-                        missing_datasets.append(dataset_ref)
-                    else:
-                        pass
-                if missing_datasets:
-                    success_criterion = create_datasets(
-                        bq_client=target_client, datasets=missing_datasets,
-                    )
-                else:
-                    success_criterion = 0
-                if success_criterion == 0:
-                    table_transfer_criterion = 0
-                    table_transfer_criterion = bq_copy_table(
+                dataset_routes = prepare_target_datasets(
+                    source_client=source_client,
+                    target_client=target_client,
+                    source_project_id=config["source_project_id"],
+                    target_project_id=config["target_project_id"],
+                    datasets=datasets,
+                    target_location=config.get("target_location"),
+                )
+                if dataset_routes is not None:
+                    table_statuses = bq_copy_table(
                         source_client=source_client,
+                        target_client=target_client,
                         source_project_id=config["source_project_id"],
                         target_project_id=config["target_project_id"],
                         dataset_table_list=dataset_table_list,
+                        dataset_routes=dataset_routes,
+                        staging_uri=config.get("staging_uri"),
+                        max_concurrent_jobs=config.get("max_concurrent_jobs", 1),
+                        credentials=bq_credentials,
+                    )
+                    table_transfer_criterion = (
+                        1
+                        if any(
+                            table_status["status"] == "failed"
+                            for table_status in table_statuses.values()
+                        )
+                        else 0
                     )
                 else:
                     table_transfer_criterion = 1
@@ -285,47 +789,69 @@ class Data_Movement:
 
             # Dataset-level data transfer
             if datasets_list:
-                missing_datasets = []
-                for dataset_id in datasets_list:
-                    dataset_ref = "{}.{}".format(
-                        config["target_project_id"], dataset_id
-                    )
-                    dataset_exists = check_dataset_exists(
-                        dataset_ref=dataset_ref, client=target_client
-                    )
-                    if not dataset_exists:
-                        missing_datasets.append(dataset_ref)
-                    else:
-                        pass
-                if missing_datasets:
-                    success_criterion = create_datasets(
-                        bq_client=target_client, datasets=missing_datasets,
-                    )
-                else:
-                    success_criterion = 0
-                if success_criterion == 0:
+                dataset_routes = prepare_target_datasets(
+                    source_client=source_client,
+                    target_client=target_client,
+                    source_project_id=config["source_project_id"],
+                    target_project_id=config["target_project_id"],
+                    datasets=datasets_list,
+                    target_location=config.get("target_location"),
+                )
+                if dataset_routes is not None:
+                    # Datasets staying in their location are copied table by
+                    # table with copy jobs, the others by the transfer service
+                    same_location_datasets = [
+                        dataset
+                        for dataset in datasets_list
+                        if is_same_location(dataset_routes[dataset])
+                    ]
                     data_sources = {}
                     for dataset in datasets_list:
-                        data_sources[dataset] = dataset
-                    # Switch to User Account
-                    print("Switching to user-level account...")
-                    os.system(
-                        "gcloud config set account {}".format(
-                            config["bq_data_transfer_account"]
-                        )
-                    )
+                        if dataset not in same_location_datasets:
+                            data_sources[dataset] = dataset
                     dataset_transfer_criterion = 0
-                    dataset_transfer_criterion = bq_copy_dataset(
-                        shell_script=config["copy_script"],
-                        source_project_id=config["source_project_id"],
-                        target_project_id=config["target_project_id"],
-                        copy_datasets_dict=data_sources,
-                    )
-                    # Switch to Default Account
-                    print("Switching to default service-account...")
-                    os.system(
-                        "gcloud config set account {}".format(config["default_account"])
-                    )
+                    if same_location_datasets:
+                        same_location_tables = [
+                            "{}.{}".format(dataset_id, table_id)
+                            for dataset_id, table_id, table_type in iter_dataset_tables(
+                                client=source_client,
+                                project_id=config["source_project_id"],
+                                datasets=same_location_datasets,
+                            )
+                            if table_type == "TABLE"
+                        ]
+                        table_statuses = bq_copy_table(
+                            source_client=source_client,
+                            target_client=target_client,
+                            source_project_id=config["source_project_id"],
+                            target_project_id=config["target_project_id"],
+                            dataset_table_list=same_location_tables,
+                            dataset_routes=dataset_routes,
+                            max_concurrent_jobs=config.get("max_concurrent_jobs", 1),
+                        )
+                        if any(
+                            table_status["status"] == "failed"
+                            for table_status in table_statuses.values()
+                        ):
+                            dataset_transfer_criterion = 1
+                    if data_sources:
+                        dataset_statuses = bq_copy_dataset(
+                            transfer_client=transfer_client,
+                            target_client=target_client,
+                            source_project_id=config["source_project_id"],
+                            target_project_id=config["target_project_id"],
+                            copy_datasets_dict=data_sources,
+                            dataset_routes=dataset_routes,
+                            max_concurrent_transfers=config.get(
+                                "max_concurrent_transfers", 1
+                            ),
+                            transfer_poll=config.get("transfer_poll"),
+                        )
+                        if any(
+                            dataset_status["status"] != "done"
+                            for dataset_status in dataset_statuses.values()
+                        ):
+                            dataset_transfer_criterion = 1
                 else:
                     dataset_transfer_criterion = 1
             else:
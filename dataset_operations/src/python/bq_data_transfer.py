@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Importing python libraries"""
+import time
+import random
+import concurrent.futures
+from datetime import datetime
+
+"""Importing google-cloud libraries"""
+from google.cloud import bigquery_datatransfer
+from google.protobuf import struct_pb2, timestamp_pb2
+
+# Data source of BigQuery dataset copies
+CROSS_REGION_COPY = "cross_region_copy"
+
+# Display name of the transfer configs data movement owns. Configs of other
+# names are never reused or deleted
+TRANSFER_DISPLAY_NAME = "Data Movement"
+
+# States a transfer run doesn't leave
+TERMINAL_RUN_STATES = (
+    bigquery_datatransfer.enums.TransferState.SUCCEEDED,
+    bigquery_datatransfer.enums.TransferState.FAILED,
+    bigquery_datatransfer.enums.TransferState.CANCELLED,
+)
+DEFAULT_TRANSFER_POLL = {
+    "poll_initial_seconds": 10,
+    "poll_max_seconds": 120,
+    "transfer_timeout_seconds": 6 * 60 * 60,
+}
+
+
+def get_transfer_client(credentials=None):
+    """
+    Returns a Data Transfer Service client authenticated with the given
+    credentials, so transfers don't depend on the active gcloud account.
+    :param credentials: Service Account Credentials
+                        (type:google.oauth2.service_account.Credentials)
+    :return transfer_client: (type:google.cloud.bigquery_datatransfer.DataTransferServiceClient)
+    """
+    return bigquery_datatransfer.DataTransferServiceClient(credentials=credentials)
+
+
+def get_transfer_parent(transfer_client=None, target_project_id=None, location=None):
+    """
+    Returns the parent resource of transfer configs. Configs of a location
+    live under that location, the default being the US multi-region.
+    :param transfer_client: From get_transfer_client
+                            (type:google.cloud.bigquery_datatransfer.DataTransferServiceClient)
+    :param target_project_id: GCP Project-Id (type:str)
+    :param location: Location of the target datasets (type:str)
+    :return parent: projects/.. or projects/../locations/.. (type:str)
+    """
+    if location is None:
+        return transfer_client.project_path(target_project_id)
+    return transfer_client.location_path(target_project_id, location.lower())
+
+
+def get_transfer_pair(transfer_config=None):
+    """
+    Returns the datasets a copy transfer config moves between.
+    :param transfer_config: (type:google.cloud.bigquery_datatransfer_v1.types.TransferConfig)
+    :return transfer_pair: (source_project_id, source_dataset_id,
+                           target_dataset_id) (type:tuple)
+    """
+    return (
+        transfer_config.params["source_project_id"],
+        transfer_config.params["source_dataset_id"],
+        transfer_config.destination_dataset_id,
+    )
+
+
+def list_transfer_configs(transfer_client=None, target_project_id=None, location=None):
+    """
+    Lists the copy transfer configs of data movement in a location of the
+    target project, grouped by the datasets they move between.
+    :param transfer_client: From get_transfer_client
+                            (type:google.cloud.bigquery_datatransfer.DataTransferServiceClient)
+    :param target_project_id: GCP Project-Id (type:str)
+    :param location: Location of the target datasets (type:str)
+    :return transfer_configs: {transfer_pair: [transfer_config]}, the most
+                              recently updated config first (type:dict)
+    """
+    transfer_configs = {}
+    for transfer_config in transfer_client.list_transfer_configs(
+        get_transfer_parent(transfer_client, target_project_id, location),
+        data_source_ids=[CROSS_REGION_COPY],
+    ):
+        if transfer_config.display_name != TRANSFER_DISPLAY_NAME:
+            continue
+        transfer_configs.setdefault(get_transfer_pair(transfer_config), []).append(
+            transfer_config
+        )
+    for pair_configs in transfer_configs.values():
+        pair_configs.sort(
+            key=lambda transfer_config: transfer_config.update_time.seconds,
+            reverse=True,
+        )
+    return transfer_configs
+
+
+def delete_duplicate_transfer_configs(
+    transfer_client=None, transfer_configs=None, max_workers=8
+):
+    """
+    Deletes every config of a dataset pair but its most recently updated one,
+    for all pairs at once. Configs left by earlier runs, which created a new
+    config per copy, are removed in one pass.
+    :param transfer_client: From get_transfer_client
+                            (type:google.cloud.bigquery_datatransfer.DataTransferServiceClient)
+    :param transfer_configs: From list_transfer_configs (type:dict)
+    :param max_workers: Configs deleted at once (type:int)
+    :return transfer_configs: {transfer_pair: transfer_config} of the kept
+                              configs (type:dict)
+    """
+    duplicate_names = [
+        transfer_config.name
+        for pair_configs in transfer_configs.values()
+        for transfer_config in pair_configs[1:]
+    ]
+    if duplicate_names:
+        print("Deleting {} duplicate transfer configs".format(len(duplicate_names)))
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, max_workers)
+        ) as executor:
+            future_to_name = {
+                executor.submit(transfer_client.delete_transfer_config, name): name
+                for name in duplicate_names
+            }
+            for future in concurrent.futures.as_completed(future_to_name):
+                try:
+                    future.result()
+                except Exception as error:
+                    print(
+                        "Exception occurred for {} at function {}: {}".format(
+                            future_to_name[future],
+                            "delete_duplicate_transfer_configs",
+                            error,
+                        )
+                    )
+    return {
+        transfer_pair: pair_configs[0]
+        for transfer_pair, pair_configs in transfer_configs.items()
+    }
+
+
+def upsert_transfer_config(
+    transfer_client=None,
+    transfer_config=None,
+    source_project_id=None,
+    target_project_id=None,
+    source_dataset_id=None,
+    target_dataset_id=None,
+    location=None,
+):
+    """
+    Returns the copy transfer config of a dataset pair, creating it if the
+    pair has none. Configs only run when started, so a kept config is
+    switched to manual runs if an earlier run scheduled it.
+    :param transfer_client: From get_transfer_client
+                            (type:google.cloud.bigquery_datatransfer.DataTransferServiceClient)
+    :param transfer_config: Existing config of the pair, from
+                            delete_duplicate_transfer_configs. None if the
+                            pair has none
+                            (type:google.cloud.bigquery_datatransfer_v1.types.TransferConfig)
+    :param source_project_id: GCP Project-Id (type:str)
+    :param target_project_id: GCP Project-Id (type:str)
+    :param source_dataset_id: Dataset-Id (type:str)
+    :param target_dataset_id: Dataset-Id (type:str)
+    :param location: Location of the target dataset (type:str)
+    :return transfer_config: (type:google.cloud.bigquery_datatransfer_v1.types.TransferConfig)
+    """
+    schedule_options = bigquery_datatransfer.types.ScheduleOptions(
+        disable_auto_scheduling=True
+    )
+    if transfer_config is not None:
+        if not transfer_config.schedule_options.disable_auto_scheduling:
+            transfer_config.schedule_options.CopyFrom(schedule_options)
+            transfer_config = transfer_client.update_transfer_config(
+                transfer_config, {"paths": ["schedule_options"]}
+            )
+        return transfer_config
+    params = struct_pb2.Struct()
+    params.update(
+        {
+            "source_project_id": source_project_id,
+            "source_dataset_id": source_dataset_id,
+            "overwrite_destination_table": "true",
+        }
+    )
+    transfer_config = bigquery_datatransfer.types.TransferConfig(
+        destination_dataset_id=target_dataset_id,
+        display_name=TRANSFER_DISPLAY_NAME,
+        data_source_id=CROSS_REGION_COPY,
+        params=params,
+        schedule_options=schedule_options,
+    )
+    return transfer_client.create_transfer_config(
+        get_transfer_parent(transfer_client, target_project_id, location),
+        transfer_config,
+    )
+
+
+def start_transfer_run(transfer_client=None, transfer_config_name=None):
+    """
+    Starts a run of a transfer config now instead of waiting for its schedule.
+    :param transfer_client: From get_transfer_client
+                            (type:google.cloud.bigquery_datatransfer.DataTransferServiceClient)
+    :param transfer_config_name: projects/../transferConfigs/.. (type:str)
+    :return transfer_run: (type:google.cloud.bigquery_datatransfer_v1.types.TransferRun)
+    """
+    requested_run_time = timestamp_pb2.Timestamp()
+    requested_run_time.FromDatetime(datetime.utcnow())
+    response = transfer_client.start_manual_transfer_runs(
+        transfer_config_name, requested_run_time=requested_run_time
+    )
+    return response.runs[0]
+
+
+def wait_for_transfer_run(
+    transfer_client=None, transfer_run_name=None, transfer_poll=None
+):
+    """
+    Polls a transfer run until it succeeds, fails or is cancelled. The poll
+    interval doubles from poll_initial_seconds up to poll_max_seconds, so
+    long copies cost few requests.
+    :param transfer_client: From get_transfer_client
+                            (type:google.cloud.bigquery_datatransfer.DataTransferServiceClient)
+    :param transfer_run_name: projects/../transferConfigs/../runs/.. (type:str)
+    :param transfer_poll: {poll_initial_seconds, poll_max_seconds,
+                          transfer_timeout_seconds} (type:dict)
+    :return transfer_run: The finished run. None if it didn't finish within
+                          transfer_timeout_seconds
+                          (type:google.cloud.bigquery_datatransfer_v1.types.TransferRun)
+    """
+    transfer_poll = dict(DEFAULT_TRANSFER_POLL, **(transfer_poll or {}))
+    deadline = time.monotonic() + transfer_poll["transfer_timeout_seconds"]
+    poll_seconds = transfer_poll["poll_initial_seconds"]
+    while True:
+        transfer_run = transfer_client.get_transfer_run(transfer_run_name)
+        if transfer_run.state in TERMINAL_RUN_STATES:
+            return transfer_run
+        if time.monotonic() >= deadline:
+            return None
+        # Jitter keeps the transfers of a batch from polling in lockstep
+        time.sleep(
+            min(poll_seconds, max(0, deadline - time.monotonic()))
+            * random.uniform(0.5, 1)
+        )
+        poll_seconds = min(transfer_poll["poll_max_seconds"], poll_seconds * 2)
+
+
+def get_transfer_run_seconds(transfer_run=None):
+    """
+    Returns the time a transfer run took, from its start to its end.
+    :param transfer_run: A finished run
+                         (type:google.cloud.bigquery_datatransfer_v1.types.TransferRun)
+    :return run_seconds: None if the run has no start or end time (type:float)
+    """
+    if not transfer_run.start_time.seconds or not transfer_run.end_time.seconds:
+        return None
+    return (
+        transfer_run.end_time.ToDatetime() - transfer_run.start_time.ToDatetime()
+    ).total_seconds()
@@ -1,19 +1,54 @@
 #!/usr/bin/env python
 # coding: utf-8
 """Importing python libraries"""
-import os
 import json
 import argparse
 import concurrent.futures
-from concurrent import futures
 from datetime import datetime, timedelta
-import gcsfs
 import warnings
 
 warnings.filterwarnings("ignore")
 """Importing google-cloud libraries"""
 from google.cloud import bigquery
-from google.cloud import storage
+
+"""Importing local modules"""
+from bq_backup_expiration import BACKUP_DATA_POLICY, sweep_expired_backups
+from bq_backup_format import resolve_backup_format
+from bq_backup_manifest import (
+    get_manifest_uri,
+    get_schema_hash,
+    get_table_manifest,
+    write_backup_manifest,
+)
+from bq_backup_state import (
+    get_table_state,
+    is_table_unchanged,
+    load_backup_state,
+    save_backup_state,
+)
+from bq_checkpoint_journal import (
+    checkpoint_job_submission,
+    close_checkpoint_journal,
+    get_checkpoint,
+    get_checkpoint_key,
+    get_partition_checkpoint_key,
+    open_checkpoint_journal,
+    write_checkpoint,
+)
+from bq_enumeration import (
+    iter_dataset_tables,
+    iter_pattern_tables,
+    list_table_partitions,
+)
+from bq_gcs import get_io_stats, print_io_stats, write_json
+from bq_job_window import fan_out, run_work_queue
+from bq_rate_limiter import (
+    call_with_rate_limit,
+    configure_rate_limits,
+    run_rate_limited_job,
+)
+from bq_run_plan import get_export_shard_count, print_run_plan
+from bq_table_definition import get_table_definition
 
 
 def cmd_args_parser():
@@ -79,6 +114,34 @@ def cmd_args_parser():
         """,
         required=True,
     )
+    parser.add_argument(
+        "--incremental",
+        type=str.split,
+        action="store",
+        dest="incremental",
+        default=["False"],
+        help="""
+        Provide incremental to export only the tables changed since the last backup.
+        For multiple, use whitespace as delimiter.
+        Follows title case-sensitivity.
+        Available options are True, False.
+        """,
+        required=False,
+    )
+    parser.add_argument(
+        "--plan",
+        type=str,
+        action="store",
+        dest="plan",
+        default="False",
+        help="""
+        Provide plan to print the job count, bytes, shards and projected wall
+        time of the run without submitting any job.
+        Follows title case-sensitivity.
+        Available options are True, False.
+        """,
+        required=False,
+    )
     args = parser.parse_args()
     cmdargs = {}
     cmdargs["project_id"] = args.project_id
@@ -86,271 +149,845 @@ def cmd_args_parser():
     cmdargs["retention"] = args.retention
     cmdargs["backup_type"] = args.backup_type
     cmdargs["expiration"] = args.expiration
+    cmdargs["incremental"] = args.incremental
+    cmdargs["plan"] = args.plan
     return cmdargs
 
 
-def list_all_datasets(client=None):
+def export_table_to_gcs(job_params):
     """
-    Returns a list of datasets in the project.
-    :param client: Bigquery Client (type:google.cloud.bigquery.client.Client)
-    :return datasets: List of Datasets(type:list)
+    Exports one bigquery table (data, schema) to google-cloud-storage.
+    Blocks until the extract job finishes.
+    :param client: Big Query Client (type:google.cloud.bigquery.client.Client)
+    :param project_id: Google Cloud Project Id (type:str)
+    :param bucket_name: Backup Bucket Name (type:str)
+    :param dataset_name: Dataset-Id (type:str)
+    :param table_name: Table-Id (type:str)
+    :param retention: Retention Type (type:str)
+    :param timestamp: Backup Date. Format: YYYY-mm-dd (type:str)
+    :param location: Table-Data Location (type:str)
+    :param schema_path: Schema Uri Template (type:str)
+    :param table_path: Table Data Uri Template (type:str)
+    :param backup_format: Backup Format from resolve_backup_format (type:dict)
+    :param previous_state: Table state of the last export, None when not
+                           running incrementally (type:dict)
+    :param oldest_valid_timestamp: Backups on or before this date expire (type:str)
+    :param partition_export: Export time-partitioned tables per partition (type:bool)
+    :param journal: Checkpoint journal of the run. None disables
+                    checkpointing (type:dict)
+    :param checkpoint_key: Journal key of the table (type:str)
+    :return table_state: {modified, etag, num_rows, num_bytes, schema_hash,
+                         timestamp, status, shard_count, partitions}, or the
+                         fan_out of a per-partition export (type:dict)
     """
-    datasets = []
-    try:
-        datasets_list = list(client.list_datasets())
-        if datasets_list:
-            for dataset in datasets_list:
-                datasets.append(dataset.dataset_id)
-    except Exception as error:
+    client = job_params.get("client")
+    project_id = job_params.get("project_id")
+    bucket_name = job_params.get("bucket_name")
+    bq_dataset_name = job_params.get("dataset_name")
+    bq_table_name = job_params.get("table_name")
+    retention = job_params.get("retention")
+    timestamp = job_params.get("timestamp")
+    location = job_params.get("location")
+    schema_path = job_params.get("schema_path")
+    table_path = job_params.get("table_path")
+    backup_format = job_params.get("backup_format")
+    previous_state = job_params.get("previous_state")
+    oldest_valid_timestamp = job_params.get("oldest_valid_timestamp")
+    journal = job_params.get("journal")
+    checkpoint_key = job_params.get("checkpoint_key")
+    print("Backing up table: {}".format(bq_table_name))
+
+    # Skipping tables an interrupted attempt of this run already exported
+    checkpoint = get_checkpoint(journal, checkpoint_key)
+    if checkpoint is not None and checkpoint["status"] == "done":
         print(
-            "Exception occurred at function {}: {}".format("list_all_datasets", error)
+            "Table {}.{} already backed up by an earlier attempt".format(
+                bq_dataset_name, bq_table_name
+            )
+        )
+        return checkpoint["result"]
+
+    # Getting dataset and table objects
+    dataset_ref = bigquery.DatasetReference(project_id, bq_dataset_name)
+    table_ref = dataset_ref.table(bq_table_name)
+    table_obj = call_with_rate_limit(
+        project_id=project_id,
+        methods=["tables.get"],
+        api_call=lambda: client.get_table(table_ref),
+    )
+    table_state = get_table_state(table_obj)
+    table_details = {
+        "num_bytes": table_obj.num_bytes,
+        "schema_hash": get_schema_hash(table_obj.schema),
+    }
+
+    # Skipping tables unchanged since the last backup (incremental mode)
+    if previous_state is not None and is_table_unchanged(
+        previous_state, table_state, oldest_valid_timestamp
+    ):
+        # Keeping timestamp, shard_count and partitions of that backup
+        table_state = dict(previous_state, **table_state)
+        table_state.update(table_details)
+        if previous_state["timestamp"] == timestamp:
+            table_state["status"] = "unchanged"
+            return table_state
+        gcs_reference_path = schema_path.format(
+            bucket_name=bucket_name,
+            retention=retention,
+            dataset_name=bq_dataset_name,
+            timestamp=timestamp,
+            schema_file_name=bq_table_name + "-reference.json",
+        )
+        write_json(
+            gcs_reference_path,
+            {"timestamp": previous_state["timestamp"]},
+            project_id=project_id,
+        )
+        table_state["status"] = "referenced"
+        return table_state
+
+    table_state.update(table_details)
+    table_state["timestamp"] = timestamp
+    table_state["status"] = "exported"
+
+    # Listing the partitions of time-partitioned tables
+    partitions = None
+    if job_params.get("partition_export") and table_obj.time_partitioning:
+        partitions = list_table_partitions(
+            client=client, table_obj=table_obj, location=location
         )
-    finally:
-        return datasets
+        # __NULL__ and __UNPARTITIONED__ can't be addressed by a decorator
+        if any(partition_id.startswith("__") for partition_id in partitions):
+            print(
+                "Table {} has unaddressable partitions. Exporting whole table...".format(
+                    bq_table_name
+                )
+            )
+            partitions = None
+
+    if partitions:
+        # Exporting table-data to gcs partition by partition, as sub-units
+        # of the work-queue
+        return export_table_partitions(job_params, table_obj, partitions, table_state)
+
+    # Specifying extract-job parameters
+    gcs_table_path = table_path.format(
+        bucket_name=bucket_name,
+        retention=retention,
+        dataset_name=bq_dataset_name,
+        timestamp=timestamp,
+        table_file_name=bq_table_name + "-*." + backup_format["extension"],
+    )
+    job_config = bigquery.ExtractJobConfig()
+    job_config.compression = backup_format["compression"]
+    job_config.destination_format = backup_format["format"]
+
+    # Exporting table-data to gcs
+    extract_job = run_rate_limited_job(
+        project_id=project_id,
+        job_type="extract",
+        submit_job=checkpoint_job_submission(
+            journal=journal,
+            checkpoint_key=checkpoint_key,
+            client=client,
+            location=location,
+            submit_job=lambda: client.extract_table(
+                table_ref, gcs_table_path, job_config=job_config, location=location
+            ),
+        ),
+    )
+    table_state["shard_count"] = sum(extract_job.destination_uri_file_counts)
+    write_table_definition(job_params, table_obj)
+    return table_state
 
 
-def get_datasets_tables_dict(client=None, project_id=None, datasets=None):
+def write_table_definition(job_params, table_obj):
     """
-    Returns a dictionary of datasets and their tables.
-    :param client: Bigquery Client (type:google.cloud.bigquery.client.Client)
-    :param project_id: Google Cloud Project-Id (type:str)
-    :param datasets: List of dataset-ids (type:list)
-    :return dataset_tables_dict: {dataset_id:[tables_list]} (type:dict)
+    Writes the table-definition (nested schema, partitioning, clustering)
+    next to the exported data. Avro and Parquet files carry the schema, but
+    not the rest of it.
+    :param job_params: Export Job Parameters (type:dict)
+    :param table_obj: Big Query Table (type:google.cloud.bigquery.table.Table)
+    :return NoneType:
+    """
+    # Defining schema-path
+    gcs_schema_path = job_params["schema_path"].format(
+        bucket_name=job_params["bucket_name"],
+        retention=job_params["retention"],
+        dataset_name=job_params["dataset_name"],
+        timestamp=job_params["timestamp"],
+        schema_file_name=job_params["table_name"] + "-schema.json",
+    )
+
+    # Writing table-definition to gcs
+    write_json(
+        gcs_schema_path,
+        get_table_definition(table_obj),
+        project_id=job_params["project_id"],
+    )
+
+
+def export_table_partitions(job_params, table_obj, partitions, table_state):
+    """
+    Splits the export of a time-partitioned table into one extract job per
+    table$partition decorator. The jobs run as sub-units of the work-queue,
+    under the same caps as every other extract job; once all are done the
+    partitions are recorded in a <table>-partitions.json file next to the
+    schema. In incremental mode only partitions modified since the last
+    backup are extracted again.
+    :param job_params: Export Job Parameters (type:dict)
+    :param table_obj: Big Query Table (type:google.cloud.bigquery.table.Table)
+    :param partitions: {partition_id: {last_modified, total_rows}} (type:dict)
+    :param table_state: State of the table export so far (type:dict)
+    :return fan_out: Sub-units of the export. The table_state with its
+                     partitions {partition_id: {last_modified, total_rows,
+                     timestamp, shard_count}} is the result (type:tuple)
+    """
+    client = job_params.get("client")
+    project_id = job_params.get("project_id")
+    bucket_name = job_params.get("bucket_name")
+    bq_dataset_name = job_params.get("dataset_name")
+    bq_table_name = job_params.get("table_name")
+    retention = job_params.get("retention")
+    timestamp = job_params.get("timestamp")
+    location = job_params.get("location")
+    schema_path = job_params.get("schema_path")
+    table_path = job_params.get("table_path")
+    backup_format = job_params.get("backup_format")
+    previous_partitions = (job_params.get("previous_state") or {}).get("partitions", {})
+    oldest_valid_timestamp = job_params.get("oldest_valid_timestamp")
+
+    # Keeping partitions unchanged since a backup that is still retained
+    partitions_state = {}
+    changed_partitions = []
+    for partition_id, partition in partitions.items():
+        previous_partition = previous_partitions.get(partition_id, {})
+        if (
+            previous_partition.get("last_modified") == partition["last_modified"]
+            and previous_partition.get("timestamp", "") > oldest_valid_timestamp
+        ):
+            partitions_state[partition_id] = dict(previous_partition)
+        else:
+            changed_partitions.append(partition_id)
+
+    def extract_partition(partition_id):
+        gcs_table_path = table_path.format(
+            bucket_name=bucket_name,
+            retention=retention,
+            dataset_name=bq_dataset_name,
+            timestamp=timestamp,
+            table_file_name="{}-{}-*.{}".format(
+                bq_table_name, partition_id, backup_format["extension"]
+            ),
+        )
+        job_config = bigquery.ExtractJobConfig()
+        job_config.compression = backup_format["compression"]
+        job_config.destination_format = backup_format["format"]
+        return run_rate_limited_job(
+            project_id=project_id,
+            job_type="extract",
+            submit_job=checkpoint_job_submission(
+                journal=job_params.get("journal"),
+                checkpoint_key=get_partition_checkpoint_key(
+                    job_params.get("checkpoint_key"), partition_id
+                ),
+                client=client,
+                location=location,
+                submit_job=lambda: client.extract_table(
+                    "{}.{}.{}${}".format(
+                        project_id, bq_dataset_name, bq_table_name, partition_id
+                    ),
+                    gcs_table_path,
+                    job_config=job_config,
+                    location=location,
+                ),
+            ),
+        )
+
+    def finish_partitions(partition_results):
+        failed_partitions = []
+        for partition_id, extract_job, error in partition_results:
+            if error is None:
+                partitions_state[partition_id] = dict(
+                    partitions[partition_id],
+                    timestamp=timestamp,
+                    shard_count=sum(extract_job.destination_uri_file_counts),
+                )
+            else:
+                failed_partitions.append(partition_id)
+                print(
+                    "Exception occurred for partition {}${}: {}".format(
+                        bq_table_name, partition_id, error
+                    )
+                )
+        if failed_partitions:
+            raise RuntimeError(
+                "{} of {} partitions failed to export".format(
+                    len(failed_partitions), len(changed_partitions)
+                )
+            )
+        print(
+            "Exported {} of {} partitions of table: {}".format(
+                len(changed_partitions), len(partitions), bq_table_name
+            )
+        )
+
+        # Recording the partitions so restore can load them back in parallel
+        gcs_partitions_path = schema_path.format(
+            bucket_name=bucket_name,
+            retention=retention,
+            dataset_name=bq_dataset_name,
+            timestamp=timestamp,
+            schema_file_name=bq_table_name + "-partitions.json",
+        )
+        write_json(
+            gcs_partitions_path,
+            {
+                "format": backup_format["format"],
+                "time_partitioning": table_obj.time_partitioning.to_api_repr(),
+                "partitions": partitions_state,
+            },
+            project_id=project_id,
+        )
+        table_state["partitions"] = partitions_state
+        write_table_definition(job_params, table_obj)
+        return table_state
+
+    return fan_out(
+        sub_units=changed_partitions,
+        process_sub_unit=extract_partition,
+        finish_unit=finish_partitions,
+    )
+
+
+def report_export_outcome(job_params, table_state, error):
+    """
+    Prints the outcome of one table export.
+    :param job_params: Export Job Parameters (type:dict)
+    :param table_state: Table state returned by export_table_to_gcs (type:dict)
+    :param error: Exception raised by the export, if any (type:Exception)
+    :return NoneType:
     """
-    try:
-        datasets_tables_dict = {}
-        for dataset in datasets:
-            tables_list = []
-            dataset_id = "{}.{}".format(project_id, dataset)
-            tables = client.list_tables(dataset_id)
-            for table in tables:
-                tables_list.append(table.table_id)
-            datasets_tables_dict[dataset] = tables_list
-    except Exception as error:
+    if error is None and table_state["status"] != "exported":
+        print(
+            "Table {}.{} unchanged since backup of {}. Skipping extract job...".format(
+                job_params["dataset_name"],
+                job_params["table_name"],
+                table_state["timestamp"],
+            )
+        )
+    elif error is None:
         print(
-            "Exception occurred at function {}: {}".format(
-                "get_datasets_tables_dict", error
+            "Backup successful for table: {}.{}".format(
+                job_params["dataset_name"], job_params["table_name"]
+            )
+        )
+    else:
+        print(
+            "Exception occurred for project {} at function {} inside export-loop: {}".format(
+                job_params["project_id"], "main_process_function", error
             )
         )
-    finally:
-        return datasets_tables_dict
 
 
-def main_process_function(project_id, config_file, retention, backup_type, expiration):
+def get_backup_table_units(
+    client=None, project_id=None, backup_config=None, backup_type=None
+):
     """
-    This is the main function for exporting the big-query datasets
-    to google-cloud-storage.
+    Returns the tables a backup_type selects, streamed as the listing
+    progresses.
+    :param client: Bigquery Client (type:google.cloud.bigquery.client.Client)
     :param project_id: Google Cloud Project Id (type:str)
-    :param config_file: Backup Configuration File Path (type:str)
+    :param backup_config: Backup Configuration (type:dict)
+    :param backup_type: Backup Type ["all", "config"] (type:str)
+    :return table_units: Generator of (dataset_id, table_id, table_type).
+                         None if the backup_type is invalid (type:generator)
+    """
+    max_concurrent_listings = backup_config.get("max_concurrent_listings", 8)
+    if backup_type == "all":
+        return iter_dataset_tables(
+            client=client, project_id=project_id, max_workers=max_concurrent_listings
+        )
+    if backup_type == "config":
+        # Extract the backup pattern from config
+        backup_pattern = backup_config["projects_dict"][project_id]["backup_pattern"]
+        return iter_pattern_tables(
+            client=client,
+            project_id=project_id,
+            pattern=backup_pattern,
+            max_workers=max_concurrent_listings,
+        )
+    print("Please provide a valid backup_type option. Choose from ['all', 'config']")
+    return None
+
+
+def prepare_project_export(
+    project_id, backup_config, retention, backup_type, expiration, incremental="False"
+):
+    """
+    Prepares the export of one project for the shared work-queue: a stream of
+    table export jobs, the callback recording their outcome and the stage
+    run once every table of the project is done.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param backup_config: Backup Configuration (type:dict)
     :param retention: Retention Type ["daily", "monthly", "weekly", "yearly"] (type:str)
     :param backup_type: Backup Type ["all", "config"] (type:str)
     :param expiration: True/False (type:bool/str)
-    :return NoneType:
+    :param incremental: True/False. Export only tables changed since the
+                        last backup (type:bool/str)
+    :return project_export: {project_id, max_concurrent_jobs, work_units,
+                            on_unit_done, finish_export}. None if the
+                            backup_type is invalid (type:dict)
     """
     print("Running bigquery dataset export for project:{}".format(project_id))
-    # Reading backup-parameters from json config
-    with open(config_file) as f:
-        master_config = json.load(f)
-    backup_config = master_config["backup"]
-
     location = backup_config["location"]
     schema_path = backup_config["schema_uri"]
     table_path = backup_config["table_uri"]
     project_backup_config = backup_config["projects_dict"][project_id]
-    mapped_list = []
+    # Project-level cap of in-flight extract jobs overrides the global one
+    max_concurrent_jobs = project_backup_config.get(
+        "max_concurrent_jobs", backup_config.get("max_concurrent_jobs", 1)
+    )
 
     # Get timestamp
     timestamp = datetime.now().strftime("%Y-%m-%d")
+    oldest_valid_timestamp = (
+        datetime.now() - timedelta(days=BACKUP_DATA_POLICY[retention])
+    ).strftime("%Y-%m-%d")
+
+    # Reading the incremental-backup state of the project
+    incremental = str(incremental).title() == "True"
+    if incremental:
+        state_uri = backup_config["state_uri"].format(
+            bucket_name=project_backup_config["bucket_name"],
+            retention=retention,
+            project_id=project_id,
+        )
+        backup_state = load_backup_state(state_uri)
 
     # Creating Big Query Client
     client = bigquery.Client(project=project_id)
 
-    # Getting mapped relation between datasets and their tables
-    if backup_type == "all":
-        # Get all datasets
-        datasets = list_all_datasets(client=client)
-        # Map dataset->[tables]
-        dataset_tables_map = get_datasets_tables_dict(
-            client=client, project_id=project_id, datasets=datasets
-        )
-        mapped_list.append(dataset_tables_map)
-    elif backup_type == "config":
-        # Extract the backup pattern from config
-        backup_pattern = project_backup_config["backup_pattern"]
-        for key, value in backup_pattern.items():
-            dataset_tables_map = {}
-            if value == "all":
-                # Map dataset->[tables]
-                dataset_tables_map = get_datasets_tables_dict(
-                    client=client, project_id=project_id, datasets=[key]
-                )
-                mapped_list.append(dataset_tables_map)
-            else:
-                # Map dataset->[tables]
-                dataset_tables_map[key] = value
-                mapped_list.append(dataset_tables_map)
-    else:
-        print(
-            "Please provide a valid backup_type option. Choose from ['all', 'config']"
-        )
+    # Streaming (dataset, table, table_type) units as the listing progresses
+    table_units = get_backup_table_units(
+        client=client,
+        project_id=project_id,
+        backup_config=backup_config,
+        backup_type=backup_type,
+    )
+    if table_units is None:
         return None
 
-    # Performing dataset export to gcs (data, schema)
-    if mapped_list:
-        for datasets_tables_dict in mapped_list:
-            for bq_dataset_name in datasets_tables_dict.keys():
+    backed_up_datasets = []
+    table_manifests = {}
+    # Journal of this run, so a restarted run skips the tables already done
+    journal = None
+    if backup_config.get("journal_path"):
+        journal = open_checkpoint_journal(
+            backup_config["journal_path"].format(
+                retention=retention, timestamp=timestamp, project_id=project_id
+            )
+        )
+    manifest_uri = get_manifest_uri(
+        backup_config,
+        bucket_name=project_backup_config["bucket_name"],
+        retention=retention,
+        timestamp=timestamp,
+        project_id=project_id,
+    )
+
+    def iter_job_params():
+        for bq_dataset_name, bq_table_name, table_type in table_units:
+            if bq_dataset_name not in backed_up_datasets:
                 print("Backup Operation on dataset: {}".format(bq_dataset_name))
-                for bq_table_name in datasets_tables_dict[bq_dataset_name]:
-                    print("Backing up table: {}".format(bq_table_name))
-                    try:
-                        # Getting dataset and table objects
-                        dataset_ref = bigquery.DatasetReference(
-                            project_id, bq_dataset_name
-                        )
-                        table_ref = dataset_ref.table(bq_table_name)
-                        table_obj = client.get_table(table_ref)
-
-                        # Specifying extract-job parameters
-                        gcs_table_path = table_path.format(
-                            bucket_name=project_backup_config["bucket_name"],
-                            retention=retention,
-                            dataset_name=bq_dataset_name,
-                            timestamp=timestamp,
-                            table_file_name=bq_table_name + "-*.json",
-                        )
-                        job_config = bigquery.ExtractJobConfig()
-                        job_config.compression = bigquery.Compression.GZIP
-                        job_config.destination_format = (
-                            bigquery.DestinationFormat.NEWLINE_DELIMITED_JSON
-                        )
-
-                        # Exporting table-data to gcs
-                        extract_job = client.extract_table(
-                            table_ref,
-                            gcs_table_path,
-                            job_config=job_config,
-                            location=location,
-                        )
-                        extract_job.result()
-
-                        # Extracting table-schema
-                        table_schema = table_obj.schema
-                        table_schema = [
-                            {
-                                "name": item.name,
-                                "mode": item.mode,
-                                "type": item.field_type,
-                            }
-                            for item in table_schema
-                        ]
-                        json_schema = json.dumps(table_schema)
-
-                        # Defining schema-path
-                        gcs_schema_path = schema_path.format(
-                            bucket_name=project_backup_config["bucket_name"],
-                            retention=retention,
-                            dataset_name=bq_dataset_name,
-                            timestamp=timestamp,
-                            schema_file_name=bq_table_name + "-schema.json",
-                        )
-
-                        # Writing table-schema to gcs
-                        sa_credentials = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-                        fs = gcsfs.GCSFileSystem(
-                            project=project_id, token=sa_credentials
-                        )
-                        with fs.open(
-                            gcs_schema_path,
-                            "w",
-                            metadata={"Content-Type": "application/json"},
-                        ) as f:
-                            f.write(json_schema)
-                    except Exception as error:
-                        print(
-                            "Exception occurred for project {} at function {} inside export-loop: {}".format(
-                                project_id, "main_process_function", error
-                            )
-                        )
-                # Deleting backup data based on the backup_data_policy
-                backup_data_policy = {
-                    "daily": 1,
-                    "weekly": 7,
-                    "monthly": 30,
-                    "yearly": 365,
-                }
-                if str(expiration).title() == "True":
-                    try:
-                        bucket_name = project_backup_config["bucket_name"]
-                        storage_client = storage.Client(project_id)
-                        client_bucket = storage_client.get_bucket(bucket_name)
-                        delete_date = (
-                            datetime.now()
-                            - timedelta(days=backup_data_policy[retention])
-                        ).strftime("%Y-%m-%d")
-                        delete_path = "{retention}/{dataset_name}/{timestamp}".format(
-                            retention=retention,
-                            dataset_name=bq_dataset_name,
-                            timestamp=delete_date,
-                        )
-                        for file in client_bucket.list_blobs(prefix=delete_path):
-                            file.delete()
-                            print("Deleted '{}'".format(file.name))
-                    except Exception as error:
-                        print(
-                            "Exception occurred at function {} inside expiration-loop: {}".format(
-                                "main_process_function", error
-                            )
-                        )
-                else:
-                    pass
+                backed_up_datasets.append(bq_dataset_name)
+            # Views and external tables hold no data to extract
+            if table_type not in (None, "TABLE"):
+                print(
+                    "Skipping {} {}.{}".format(
+                        table_type, bq_dataset_name, bq_table_name
+                    )
+                )
+                continue
+            try:
+                backup_format = resolve_backup_format(
+                    backup_config=backup_config,
+                    project_backup_config=project_backup_config,
+                    dataset_name=bq_dataset_name,
+                    table_name=bq_table_name,
+                )
+            except ValueError as error:
+                print(
+                    "Invalid backup format for {}.{}: {}".format(
+                        bq_dataset_name, bq_table_name, error
+                    )
+                )
+                continue
+            state_key = "{}.{}".format(bq_dataset_name, bq_table_name)
+            yield {
+                "previous_state": (
+                    backup_state.get(state_key, {}) if incremental else None
+                ),
+                "oldest_valid_timestamp": oldest_valid_timestamp,
+                "client": client,
+                "project_id": project_id,
+                "bucket_name": project_backup_config["bucket_name"],
+                "dataset_name": bq_dataset_name,
+                "table_name": bq_table_name,
+                "retention": retention,
+                "timestamp": timestamp,
+                "location": location,
+                "schema_path": schema_path,
+                "table_path": table_path,
+                "backup_format": backup_format,
+                "partition_export": backup_config.get("partition_export", False),
+                "journal": journal,
+                "checkpoint_key": get_checkpoint_key(
+                    project_id=project_id,
+                    dataset_name=bq_dataset_name,
+                    table_name=bq_table_name,
+                    retention=retention,
+                    timestamp=timestamp,
+                ),
+            }
+
+    def on_table_done(job_params, table_state, error):
+        report_export_outcome(job_params, table_state, error)
+        state_key = "{}.{}".format(job_params["dataset_name"], job_params["table_name"])
+        table_manifests[state_key] = get_table_manifest(job_params, table_state, error)
+        if error is None:
+            write_checkpoint(
+                journal, job_params["checkpoint_key"], "done", result=table_state
+            )
+        else:
+            write_checkpoint(
+                journal, job_params["checkpoint_key"], "failed", error=str(error)
+            )
+        if incremental and error is None:
+            backup_state[state_key] = {
+                key: value for key, value in table_state.items() if key != "status"
+            }
+
+    def finish_export():
+        close_checkpoint_journal(journal)
+        if incremental:
+            save_backup_state(state_uri, backup_state)
+        if not backed_up_datasets:
+            print(
+                "The mapping between datasets and their tables is empty for project:{}".format(
+                    project_id
+                )
+            )
+            return None
+        if manifest_uri is not None:
+            write_backup_manifest(
+                manifest_uri=manifest_uri,
+                project_id=project_id,
+                retention=retention,
+                timestamp=timestamp,
+                table_manifests=table_manifests,
+            )
+
+        # Expiration stage: deleting every backup older than the BACKUP_DATA_POLICY
+        if str(expiration).title() == "True":
+            sweep_expired_backups(
+                project_id=project_id,
+                backup_config=backup_config,
+                retention_list=[retention],
+            )
         return None
-    else:
-        print("The mapping between datasets and their tables is empty.")
+
+    return {
+        "project_id": project_id,
+        "max_concurrent_jobs": max_concurrent_jobs,
+        "work_units": iter_job_params(),
+        "on_unit_done": on_table_done,
+        "finish_export": finish_export,
+    }
+
+
+def plan_project_export(
+    project_id, backup_config, retention, backup_type, expiration, incremental="False"
+):
+    """
+    Expands the tables of one project's export and reads their sizes
+    concurrently, without submitting any job.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param backup_config: Backup Configuration (type:dict)
+    :param retention: Retention Type ["daily", "monthly", "weekly", "yearly"] (type:str)
+    :param backup_type: Backup Type ["all", "config"] (type:str)
+    :param expiration: True/False. Not used by the plan (type:bool/str)
+    :param incremental: True/False. Tables unchanged since the last backup
+                        are planned as skipped (type:bool/str)
+    :return project_plan: {project_id, max_concurrent_jobs, table_count,
+                          skipped, job_bytes, shard_count, object_count}.
+                          None if the backup_type is invalid (type:dict)
+    """
+    print("Planning bigquery dataset export for project:{}".format(project_id))
+    project_backup_config = backup_config["projects_dict"][project_id]
+    oldest_valid_timestamp = (
+        datetime.now() - timedelta(days=BACKUP_DATA_POLICY[retention])
+    ).strftime("%Y-%m-%d")
+    backup_state = None
+    if str(incremental).title() == "True":
+        backup_state = load_backup_state(
+            backup_config["state_uri"].format(
+                bucket_name=project_backup_config["bucket_name"],
+                retention=retention,
+                project_id=project_id,
+            )
+        )
+
+    client = bigquery.Client(project=project_id)
+    table_units = get_backup_table_units(
+        client=client,
+        project_id=project_id,
+        backup_config=backup_config,
+        backup_type=backup_type,
+    )
+    if table_units is None:
         return None
+    project_plan = {
+        "project_id": project_id,
+        "max_concurrent_jobs": project_backup_config.get(
+            "max_concurrent_jobs", backup_config.get("max_concurrent_jobs", 1)
+        ),
+        "table_count": 0,
+        "skipped": {},
+        "job_bytes": [],
+        "shard_count": 0,
+        "object_count": 0,
+    }
+
+    def skip_table(reason):
+        project_plan["skipped"][reason] = project_plan["skipped"].get(reason, 0) + 1
+
+    def get_table(bq_dataset_name, bq_table_name):
+        table_ref = bigquery.DatasetReference(project_id, bq_dataset_name).table(
+            bq_table_name
+        )
+        return call_with_rate_limit(
+            project_id=project_id,
+            methods=["tables.get"],
+            api_call=lambda: client.get_table(table_ref),
+        )
+
+    # Reading table sizes concurrently while the listing streams in
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=backup_config.get("max_workers", 16)
+    ) as executor:
+        future_to_table = {}
+        for bq_dataset_name, bq_table_name, table_type in table_units:
+            project_plan["table_count"] = project_plan["table_count"] + 1
+            if table_type not in (None, "TABLE"):
+                skip_table(table_type)
+                continue
+            future = executor.submit(get_table, bq_dataset_name, bq_table_name)
+            future_to_table[future] = "{}.{}".format(bq_dataset_name, bq_table_name)
+        for future in concurrent.futures.as_completed(future_to_table):
+            try:
+                table_obj = future.result()
+            except Exception as error:
+                print(
+                    "Exception occurred for {} at function {}: {}".format(
+                        future_to_table[future], "plan_project_export", error
+                    )
+                )
+                skip_table("not readable")
+                continue
+            if table_obj.table_type not in (None, "TABLE"):
+                skip_table(table_obj.table_type)
+                continue
+            if backup_state is not None and is_table_unchanged(
+                backup_state.get(future_to_table[future], {}),
+                get_table_state(table_obj),
+                oldest_valid_timestamp,
+            ):
+                skip_table("unchanged since the last backup")
+                continue
+            # Partitioned tables count as one job; per-partition exports split
+            # the same bytes over more, smaller jobs
+            shard_count = get_export_shard_count(table_obj.num_bytes)
+            project_plan["job_bytes"].append(int(table_obj.num_bytes or 0))
+            project_plan["shard_count"] = project_plan["shard_count"] + shard_count
+            # Data shards plus the -schema.json of every table
+            project_plan["object_count"] = (
+                project_plan["object_count"] + shard_count + 1
+            )
+    return project_plan
+
+
+def plan_process_function(project_params_list, config_file):
+    """
+    Prints the estimate of an export run instead of running it: job count,
+    total bytes, expected shards and the projected wall time at the
+    configured concurrency. No job is submitted.
+    :param project_params_list: [{project_id, retention, backup_type,
+                                expiration, incremental}] (type:list)
+    :param config_file: Backup Configuration File Path (type:str)
+    :return run_plan: From print_run_plan (type:dict)
+    """
+    with open(config_file) as f:
+        master_config = json.load(f)
+    backup_config = master_config["backup"]
+    configure_rate_limits(master_config.get("rate_limits"))
+
+    project_plans = []
+    for project_params in project_params_list:
+        try:
+            project_plan = plan_project_export(
+                backup_config=backup_config, **project_params
+            )
+        except Exception as error:
+            print(
+                "Exception occurred for project {} at function {}: {}".format(
+                    project_params["project_id"], "plan_project_export", error
+                )
+            )
+            continue
+        if project_plan is not None:
+            project_plans.append(project_plan)
+    return print_run_plan(
+        label="export",
+        project_plans=project_plans,
+        max_workers=backup_config.get(
+            "max_workers",
+            sum(project_plan["max_concurrent_jobs"] for project_plan in project_plans)
+            or 1,
+        ),
+        job_type="extract",
+        plan_config=backup_config.get("plan"),
+    )
+
+
+def main_process_function(project_params_list, config_file):
+    """
+    This is the main function for exporting the big-query datasets
+    to google-cloud-storage. The tables of every project are flattened into
+    one work-queue served by max_workers threads, with each project capped
+    at its max_concurrent_jobs.
+    :param project_params_list: [{project_id, retention, backup_type,
+                                expiration, incremental}] (type:list)
+    :param config_file: Backup Configuration File Path (type:str)
+    :return table_count: Number of table exports run (type:int)
+    """
+    run_io_stats = get_io_stats()
+    # Reading backup-parameters from json config
+    with open(config_file) as f:
+        master_config = json.load(f)
+    backup_config = master_config["backup"]
+    # Limits shared by every extract job of the run
+    configure_rate_limits(master_config.get("rate_limits"))
+
+    project_exports = []
+    for project_params in project_params_list:
+        try:
+            project_export = prepare_project_export(
+                backup_config=backup_config, **project_params
+            )
+        except Exception as error:
+            print(
+                "Exception occurred for project {} at function {}: {}".format(
+                    project_params["project_id"], "prepare_project_export", error
+                )
+            )
+            continue
+        if project_export is not None:
+            project_exports.append(project_export)
+
+    # A project listed twice (e.g. for two retentions) shares one cap
+    max_in_flight_per_key = {}
+    for project_export in project_exports:
+        max_in_flight_per_key[project_export["project_id"]] = max(
+            max_in_flight_per_key.get(project_export["project_id"], 1),
+            project_export["max_concurrent_jobs"],
+        )
+    # Without a max_workers setting every project gets its full cap
+    max_workers = backup_config.get(
+        "max_workers", sum(max_in_flight_per_key.values()) or 1
+    )
+
+    def iter_stream_units(project_export):
+        for job_params in project_export["work_units"]:
+            yield project_export, job_params
+
+    unit_results = run_work_queue(
+        unit_streams=[
+            (project_export["project_id"], iter_stream_units(project_export))
+            for project_export in project_exports
+        ],
+        process_unit=lambda unit: export_table_to_gcs(unit[1]),
+        on_unit_done=lambda unit, table_state, error: unit[0]["on_unit_done"](
+            unit[1], table_state, error
+        ),
+        max_workers=max_workers,
+        max_in_flight_per_key=max_in_flight_per_key,
+    )
+    for project_export in project_exports:
+        try:
+            project_export["finish_export"]()
+        except Exception as error:
+            print(
+                "Exception occurred for project {} at function {}: {}".format(
+                    project_export["project_id"], "finish_export", error
+                )
+            )
+    print_io_stats(label="export", since=run_io_stats)
+    return len(unit_results)
 
 
 if __name__ == "__main__":
     # Reading cmd args
     cmdargs = cmd_args_parser()
 
-    # Preparing params for multi-processing
+    # Preparing params for the work-queue
 
     project_id_list = cmdargs["project_id"]
-    # Define number of workers
-    num_workers = len(project_id_list)
+    # Define number of projects
+    num_projects = len(project_id_list)
     # Defining other positional params list
-    config_file_param_list = [cmdargs["config_file"]] * num_workers
     if len(cmdargs["retention"]) == 1:
-        retention_param_list = cmdargs["retention"] * num_workers
+        retention_param_list = cmdargs["retention"] * num_projects
     else:
         retention_param_list = cmdargs["retention"]
     if len(cmdargs["backup_type"]) == 1:
-        backup_type_param_list = cmdargs["backup_type"] * num_workers
+        backup_type_param_list = cmdargs["backup_type"] * num_projects
     else:
         backup_type_param_list = cmdargs["backup_type"]
     if len(cmdargs["expiration"]) == 1:
-        expiration_param_list = cmdargs["expiration"] * num_workers
+        expiration_param_list = cmdargs["expiration"] * num_projects
     else:
         expiration_param_list = cmdargs["expiration"]
+    if len(cmdargs["incremental"]) == 1:
+        incremental_param_list = cmdargs["incremental"] * num_projects
+    else:
+        incremental_param_list = cmdargs["incremental"]
+    project_params_list = [
+        {
+            "project_id": project_id,
+            "retention": retention,
+            "backup_type": backup_type,
+            "expiration": expiration,
+            "incremental": incremental,
+        }
+        for project_id, retention, backup_type, expiration, incremental in zip(
+            project_id_list,
+            retention_param_list,
+            backup_type_param_list,
+            expiration_param_list,
+            incremental_param_list,
+        )
+    ]
 
-    # Starting Multi Processing
-    process_call_count = 0
-    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
-        try:
-            for val in executor.map(
-                main_process_function,
-                project_id_list,
-                config_file_param_list,
-                retention_param_list,
-                backup_type_param_list,
-                expiration_param_list,
-            ):
-                process_call_count = process_call_count + 1
-        except futures.process.BrokenProcessPool as e:
-            print("Could not start new tasks: {}".format(e))
+    if cmdargs["plan"].title() == "True":
+        # Printing the estimate of the run without submitting jobs
+        plan_process_function(project_params_list, cmdargs["config_file"])
+    else:
+        # Starting the work-queue
+        table_count = main_process_function(project_params_list, cmdargs["config_file"])
 
-    print(
-        "For projects: {}, total number of processes executed: {}".format(
-            num_workers, process_call_count
+        print(
+            "For projects: {}, total number of table exports executed: {}".format(
+                num_projects, table_count
+            )
         )
-    )
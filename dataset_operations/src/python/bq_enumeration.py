@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Importing python libraries"""
+import queue
+import concurrent.futures
+
+"""Importing google-cloud libraries"""
+from google.cloud import bigquery
+from google.cloud.exceptions import NotFound
+
+"""Importing local modules"""
+from bq_rate_limiter import run_rate_limited_job
+
+# Table types of the __TABLES__ meta-table
+TABLE_TYPES = {1: "TABLE", 2: "VIEW", 3: "EXTERNAL"}
+
+
+def iter_all_datasets(client=None):
+    """
+    Yields the datasets in the project page by page.
+    :param client: Bigquery Client (type:google.cloud.bigquery.client.Client)
+    :return datasets: Generator of dataset-ids (type:generator)
+    """
+    try:
+        for page in client.list_datasets().pages:
+            for dataset in page:
+                yield dataset.dataset_id
+    except Exception as error:
+        print(
+            "Exception occurred at function {}: {}".format("iter_all_datasets", error)
+        )
+
+
+def iter_dataset_tables(client=None, project_id=None, datasets=None, max_workers=8):
+    """
+    Lists the tables of many datasets concurrently and yields them as
+    pages arrive, so callers can start work before the listing finishes.
+    :param client: Bigquery Client (type:google.cloud.bigquery.client.Client)
+    :param project_id: Google Cloud Project-Id (type:str)
+    :param datasets: Iterable of dataset-ids. All datasets if None (type:iterable)
+    :param max_workers: Number of datasets listed at once (type:int)
+    :return units: Generator of (dataset_id, table_id, table_type) (type:generator)
+    """
+    if datasets is None:
+        datasets = iter_all_datasets(client=client)
+    units = queue.Queue()
+    dataset_done = object()
+
+    def list_dataset_tables(dataset):
+        try:
+            dataset_id = "{}.{}".format(project_id, dataset)
+            for page in client.list_tables(dataset_id).pages:
+                for table in page:
+                    units.put((dataset, table.table_id, table.table_type))
+        except Exception as error:
+            print(
+                "Exception occurred at function {} for dataset {}: {}".format(
+                    "iter_dataset_tables", dataset, error
+                )
+            )
+        finally:
+            units.put(dataset_done)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        submitted, finished = 0, 0
+        for dataset in datasets:
+            executor.submit(list_dataset_tables, dataset)
+            submitted = submitted + 1
+            # Handing out whatever tables have arrived so far
+            while True:
+                try:
+                    unit = units.get_nowait()
+                except queue.Empty:
+                    break
+                if unit is dataset_done:
+                    finished = finished + 1
+                else:
+                    yield unit
+        while finished < submitted:
+            unit = units.get()
+            if unit is dataset_done:
+                finished = finished + 1
+            else:
+                yield unit
+
+
+def iter_pattern_tables(client=None, project_id=None, pattern=None, max_workers=8):
+    """
+    Yields the tables selected by a backup/restore pattern.
+    Explicit table lists are yielded straight away; datasets mapped to "all"
+    are enumerated concurrently.
+    :param client: Bigquery Client (type:google.cloud.bigquery.client.Client)
+    :param project_id: Google Cloud Project-Id (type:str)
+    :param pattern: {dataset_id: "all" or [table_ids]} (type:dict)
+    :param max_workers: Number of datasets listed at once (type:int)
+    :return units: Generator of (dataset_id, table_id, table_type) (type:generator)
+    """
+    all_datasets = []
+    for dataset, tables in pattern.items():
+        if tables == "all":
+            all_datasets.append(dataset)
+        else:
+            for table in tables:
+                yield (dataset, table, None)
+    if all_datasets:
+        for unit in iter_dataset_tables(
+            client=client,
+            project_id=project_id,
+            datasets=all_datasets,
+            max_workers=max_workers,
+        ):
+            yield unit
+
+
+def list_table_partitions(client=None, table_obj=None, location=None):
+    """
+    Returns the partitions of a table with their last-modified time,
+    read in one INFORMATION_SCHEMA.PARTITIONS query.
+    :param client: Bigquery Client (type:google.cloud.bigquery.client.Client)
+    :param table_obj: Big Query Table (type:google.cloud.bigquery.table.Table)
+    :param location: Dataset Location (type:str)
+    :return partitions: {partition_id: {last_modified, total_rows}} (type:dict)
+    """
+    query = (
+        "SELECT partition_id, last_modified_time, total_rows "
+        "FROM `{}.{}.INFORMATION_SCHEMA.PARTITIONS` "
+        "WHERE table_name = @table_name"
+    ).format(table_obj.project, table_obj.dataset_id)
+    job_config = bigquery.QueryJobConfig()
+    job_config.query_parameters = [
+        bigquery.ScalarQueryParameter("table_name", "STRING", table_obj.table_id)
+    ]
+    query_job = run_rate_limited_job(
+        project_id=table_obj.project,
+        job_type="query",
+        submit_job=lambda: client.query(
+            query, job_config=job_config, location=location
+        ),
+    )
+    partitions = {}
+    for row in query_job.result():
+        if row["partition_id"] is None:
+            continue
+        partitions[row["partition_id"]] = {
+            "last_modified": row["last_modified_time"].isoformat(),
+            "total_rows": row["total_rows"],
+        }
+    return partitions
+
+
+def get_dataset_table_index(client=None, project_id=None, dataset=None, location=None):
+    """
+    Returns the tables of a dataset with their type and size, read in one
+    __TABLES__ query instead of a get_table call per table.
+    None if the dataset doesn't exist.
+    :param client: Bigquery Client (type:google.cloud.bigquery.client.Client)
+    :param project_id: Google Cloud Project-Id (type:str)
+    :param dataset: Dataset-Id (type:str)
+    :param location: Dataset Location (type:str)
+    :return table_index: {table_id: {table_type, num_rows, num_bytes,
+                         last_modified_time}} (type:dict)
+    """
+    query = (
+        "SELECT table_id, type, row_count, size_bytes, last_modified_time"
+        " FROM `{}.{}.__TABLES__`"
+    ).format(project_id, dataset)
+    try:
+        rows = run_rate_limited_job(
+            project_id=project_id,
+            job_type="query",
+            submit_job=lambda: client.query(query, location=location),
+        ).result()
+    except NotFound:
+        return None
+    return {
+        row["table_id"]: {
+            "table_type": TABLE_TYPES.get(row["type"], "TABLE"),
+            "num_rows": row["row_count"],
+            "num_bytes": row["size_bytes"],
+            "last_modified_time": row["last_modified_time"],
+        }
+        for row in rows
+    }
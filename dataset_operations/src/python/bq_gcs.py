@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Importing python libraries"""
+import json
+import threading
+import concurrent.futures
+from requests.adapters import HTTPAdapter
+
+"""Importing google-cloud libraries"""
+import google.auth
+import google.auth.credentials
+from google.auth.transport.requests import AuthorizedSession
+from google.cloud import storage
+from google.cloud.exceptions import NotFound
+
+# Connections kept open per host by the shared HTTP session
+HTTP_POOL_SIZE = 32
+STORAGE_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+# Process-wide storage clients, credentials and HTTP sessions, created once
+# per worker
+_storage_clients = {}
+_credentials = {}
+_http_sessions = {}
+_client_lock = threading.Lock()
+
+# Requests and bytes transferred by this process
+_io_stats = {"requests": 0, "bytes_read": 0, "bytes_written": 0}
+_io_stats_lock = threading.Lock()
+
+
+def record_io(requests=0, bytes_read=0, bytes_written=0):
+    """
+    Adds to the process-wide storage I/O counters.
+    :param requests: Number of storage requests (type:int)
+    :param bytes_read: Bytes downloaded (type:int)
+    :param bytes_written: Bytes uploaded (type:int)
+    :return NoneType:
+    """
+    with _io_stats_lock:
+        _io_stats["requests"] = _io_stats["requests"] + requests
+        _io_stats["bytes_read"] = _io_stats["bytes_read"] + bytes_read
+        _io_stats["bytes_written"] = _io_stats["bytes_written"] + bytes_written
+
+
+def get_io_stats():
+    """
+    Returns a copy of the process-wide storage I/O counters.
+    :return io_stats: {requests, bytes_read, bytes_written} (type:dict)
+    """
+    with _io_stats_lock:
+        return dict(_io_stats)
+
+
+def print_io_stats(label=None, since=None):
+    """
+    Prints the process-wide storage I/O counters.
+    :param label: Run label, e.g. the project-id (type:str)
+    :param since: Counters from get_io_stats at the start of the run.
+                  Only the difference is printed when given (type:dict)
+    :return NoneType:
+    """
+    io_stats = get_io_stats()
+    if since:
+        io_stats = {key: value - since.get(key, 0) for key, value in io_stats.items()}
+    print(
+        "Storage I/O for {}: {} requests, {} bytes read, {} bytes written".format(
+            label,
+            io_stats["requests"],
+            io_stats["bytes_read"],
+            io_stats["bytes_written"],
+        )
+    )
+
+
+def get_http_session(credentials=None):
+    """
+    Returns the pooled HTTP session of a set of credentials. Call with
+    _client_lock held.
+    :param credentials: Google Credentials (type:google.auth.credentials.Credentials)
+    :return session: (type:google.auth.transport.requests.AuthorizedSession)
+    """
+    if credentials not in _http_sessions:
+        session = AuthorizedSession(credentials)
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_POOL_SIZE,
+            pool_maxsize=HTTP_POOL_SIZE,
+            max_retries=3,
+        )
+        session.mount("https://", adapter)
+        _http_sessions[credentials] = session
+    return _http_sessions[credentials]
+
+
+def get_storage_client(project_id=None, credentials=None):
+    """
+    Returns the storage client of this process for the project. Credentials
+    are resolved once and every client of the same credentials shares a
+    pooled HTTP session, so auth and TLS setup is not repeated per call.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param credentials: Service Account Credentials. Application default
+                        credentials when None
+                        (type:google.oauth2.service_account.Credentials)
+    :return storage_client: Storage Client (type:google.cloud.storage.client.Client)
+    """
+    with _client_lock:
+        if (project_id, credentials) not in _storage_clients:
+            if credentials is None:
+                if "credentials" not in _credentials:
+                    default_credentials, default_project = google.auth.default(
+                        scopes=STORAGE_SCOPES
+                    )
+                    _credentials["credentials"] = default_credentials
+                    _credentials["project_id"] = default_project
+                client_credentials = _credentials["credentials"]
+                client_project_id = project_id or _credentials["project_id"]
+            else:
+                if credentials not in _credentials:
+                    # Keys read from Secret Manager carry no scopes
+                    _credentials[credentials] = (
+                        google.auth.credentials.with_scopes_if_required(
+                            credentials, STORAGE_SCOPES
+                        )
+                    )
+                client_credentials = _credentials[credentials]
+                client_project_id = project_id
+            _storage_clients[(project_id, credentials)] = storage.Client(
+                project=client_project_id,
+                credentials=client_credentials,
+                _http=get_http_session(client_credentials),
+            )
+        return _storage_clients[(project_id, credentials)]
+
+
+def split_gcs_uri(gcs_uri):
+    """
+    Splits gs://bucket/object into bucket and object names.
+    :param gcs_uri: Google Cloud Storage Uri (type:str)
+    :return bucket_name, blob_name: (type:str,str)
+    """
+    bucket_name, _, blob_name = gcs_uri[len("gs://") :].partition("/")
+    return bucket_name, blob_name
+
+
+def read_json(gcs_uri, project_id=None):
+    """
+    Reads a JSON object from google-cloud-storage.
+    Returns None when the object does not exist.
+    :param gcs_uri: Google Cloud Storage Uri (type:str)
+    :param project_id: Google Cloud Project Id (type:str)
+    :return content: Parsed JSON content (type:dict/list)
+    """
+    bucket_name, blob_name = split_gcs_uri(gcs_uri)
+    blob = get_storage_client(project_id).bucket(bucket_name).blob(blob_name)
+    try:
+        data = blob.download_as_string()
+    except NotFound:
+        record_io(requests=1)
+        return None
+    record_io(requests=1, bytes_read=len(data))
+    return json.loads(data)
+
+
+def write_json(gcs_uri, content, project_id=None):
+    """
+    Writes a JSON object to google-cloud-storage.
+    :param gcs_uri: Google Cloud Storage Uri (type:str)
+    :param content: JSON serializable content (type:dict/list)
+    :param project_id: Google Cloud Project Id (type:str)
+    :return NoneType:
+    """
+    bucket_name, blob_name = split_gcs_uri(gcs_uri)
+    blob = get_storage_client(project_id).bucket(bucket_name).blob(blob_name)
+    data = json.dumps(content)
+    blob.upload_from_string(data, content_type="application/json")
+    record_io(requests=1, bytes_written=len(data))
+
+
+def read_json_many(gcs_uris=None, project_id=None, max_workers=16):
+    """
+    Reads many small JSON objects concurrently over the shared session.
+    :param gcs_uris: Google Cloud Storage Uris (type:list)
+    :param project_id: Google Cloud Project Id (type:str)
+    :param max_workers: Number of concurrent reads (type:int)
+    :return contents: {gcs_uri: content or None} (type:dict)
+    """
+    contents = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_uri = {
+            executor.submit(read_json, gcs_uri, project_id): gcs_uri
+            for gcs_uri in gcs_uris
+        }
+        for future in concurrent.futures.as_completed(future_to_uri):
+            gcs_uri = future_to_uri[future]
+            try:
+                contents[gcs_uri] = future.result()
+            except Exception as error:
+                print(
+                    "Exception occurred at function {} for {}: {}".format(
+                        "read_json_many", gcs_uri, error
+                    )
+                )
+                contents[gcs_uri] = None
+    return contents
+
+
+def read_json_folder(gcs_folder_uri=None, project_id=None, max_workers=16):
+    """
+    Lists a folder once and reads every JSON object directly inside it
+    concurrently. Raises if a listed object can't be read, as a partial
+    folder would pass for one without those objects.
+    :param gcs_folder_uri: gs://bucket/folder/ (type:str)
+    :param project_id: Google Cloud Project Id (type:str)
+    :param max_workers: Number of concurrent reads (type:int)
+    :return contents: {object name relative to the folder: content} (type:dict)
+    """
+    bucket_name, _ = split_gcs_uri(gcs_folder_uri)
+    gcs_uris = [
+        "gs://{}/{}".format(bucket_name, blob.name)
+        for blob in list_blobs(gcs_folder_uri, project_id=project_id, delimiter="/")
+        if not blob.name.endswith("/")
+    ]
+    contents = read_json_many(gcs_uris, project_id=project_id, max_workers=max_workers)
+    failed_uris = [gcs_uri for gcs_uri, content in contents.items() if content is None]
+    if failed_uris:
+        raise RuntimeError(
+            "{} of {} objects in {} could not be read".format(
+                len(failed_uris), len(contents), gcs_folder_uri
+            )
+        )
+    return {
+        gcs_uri[len(gcs_folder_uri) :]: content for gcs_uri, content in contents.items()
+    }
+
+
+def write_json_many(contents=None, project_id=None, max_workers=16):
+    """
+    Writes many small JSON objects concurrently over the shared session.
+    :param contents: {gcs_uri: content} (type:dict)
+    :param project_id: Google Cloud Project Id (type:str)
+    :param max_workers: Number of concurrent writes (type:int)
+    :return failed_uris: Uris that could not be written (type:list)
+    """
+    failed_uris = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_uri = {
+            executor.submit(write_json, gcs_uri, content, project_id): gcs_uri
+            for gcs_uri, content in contents.items()
+        }
+        for future in concurrent.futures.as_completed(future_to_uri):
+            gcs_uri = future_to_uri[future]
+            try:
+                future.result()
+            except Exception as error:
+                print(
+                    "Exception occurred at function {} for {}: {}".format(
+                        "write_json_many", gcs_uri, error
+                    )
+                )
+                failed_uris.append(gcs_uri)
+    return failed_uris
+
+
+def list_blobs(
+    gcs_uri_prefix, project_id=None, max_results=None, delimiter=None, credentials=None
+):
+    """
+    Yields the objects under a gs:// prefix page by page.
+    :param gcs_uri_prefix: gs://bucket/prefix (type:str)
+    :param project_id: Google Cloud Project Id (type:str)
+    :param max_results: Maximum number of objects (type:int)
+    :param delimiter: Delimiter for directory-like listings (type:str)
+    :param credentials: As for get_storage_client
+                        (type:google.oauth2.service_account.Credentials)
+    :return blobs: Generator of blobs (type:generator)
+    """
+    bucket_name, prefix = split_gcs_uri(gcs_uri_prefix)
+    iterator = get_storage_client(project_id, credentials).list_blobs(
+        bucket_name, prefix=prefix, max_results=max_results, delimiter=delimiter
+    )
+    for page in iterator.pages:
+        record_io(requests=1)
+        for blob in page:
+            yield blob
+
+
+def list_prefixes(gcs_uri_prefix, project_id=None, delimiter="/"):
+    """
+    Returns the folder-like prefixes directly under a gs:// prefix.
+    :param gcs_uri_prefix: gs://bucket/prefix/ (type:str)
+    :param project_id: Google Cloud Project Id (type:str)
+    :param delimiter: Folder delimiter (type:str)
+    :return prefixes: gs:// uris of the sub-folders (type:list)
+    """
+    bucket_name, prefix = split_gcs_uri(gcs_uri_prefix)
+    iterator = get_storage_client(project_id).list_blobs(
+        bucket_name, prefix=prefix, delimiter=delimiter
+    )
+    # Prefixes are collected while the pages are read
+    for page in iterator.pages:
+        record_io(requests=1)
+        for _ in page:
+            pass
+    return [
+        "gs://{}/{}".format(bucket_name, sub_prefix)
+        for sub_prefix in sorted(iterator.prefixes)
+    ]
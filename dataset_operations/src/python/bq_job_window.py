@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Importing python libraries"""
+import queue
+import threading
+import collections
+import concurrent.futures
+
+# Marks the results of process_unit that split the unit into sub-units
+FAN_OUT = object()
+
+
+def fan_out(sub_units=None, process_sub_unit=None, finish_unit=None):
+    """
+    Splits a unit of run_work_queue into sub-units, e.g. a table into its
+    partitions. Returned by process_unit instead of a result; the sub-units
+    then run under the same caps as every other unit, ahead of the stream's
+    next units, so splitting never adds jobs beyond the caps.
+    :param sub_units: Iterable of sub-units (type:iterable)
+    :param process_sub_unit: Blocking callable that runs one sub-unit's job
+                             to completion (type:function)
+    :param finish_unit: Callable([(sub_unit, result, error)]) run once every
+                        sub-unit is done. Its return value, which may split
+                        again, is the result of the unit (type:function)
+    :return fan_out: (type:tuple)
+    """
+    return (FAN_OUT, list(sub_units), process_sub_unit, finish_unit)
+
+
+def is_fan_out(result):
+    """Returns True if a process_unit result is from fan_out."""
+    return isinstance(result, tuple) and len(result) == 4 and result[0] is FAN_OUT
+
+
+def run_job_window(
+    work_units=None, process_unit=None, on_unit_done=None, max_in_flight=1
+):
+    """
+    Runs process_unit for every work-unit while keeping at most max_in_flight
+    units running. The next unit is submitted as soon as any running unit
+    finishes, so a slow job never holds back the rest of the window.
+    :param work_units: Iterable of work-units (type:iterable)
+    :param process_unit: Blocking callable that runs one work-unit's job
+                         to completion (type:function)
+    :param on_unit_done: Callable(work_unit, result, error) invoked in the
+                         calling thread for every finished unit (type:function)
+    :param max_in_flight: Maximum number of units running at once (type:int)
+    :return unit_results: [(work_unit, result, error)] (type:list)
+    """
+    max_in_flight = max(1, int(max_in_flight or 1))
+    unit_results = []
+    in_flight = {}
+
+    def collect(done_futures):
+        for future in done_futures:
+            work_unit = in_flight.pop(future)
+            try:
+                result, error = future.result(), None
+            except Exception as exc:
+                result, error = None, exc
+            unit_results.append((work_unit, result, error))
+            if on_unit_done is not None:
+                on_unit_done(work_unit, result, error)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for work_unit in work_units:
+            # Waiting for a free slot before submitting the next unit
+            while len(in_flight) >= max_in_flight:
+                done, _ = concurrent.futures.wait(
+                    in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                collect(done)
+            in_flight[executor.submit(process_unit, work_unit)] = work_unit
+        while in_flight:
+            done, _ = concurrent.futures.wait(
+                in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            collect(done)
+    return unit_results
+
+
+def run_work_queue(
+    unit_streams=None,
+    process_unit=None,
+    on_unit_done=None,
+    max_workers=1,
+    max_in_flight_per_key=None,
+    max_buffered_per_stream=16,
+):
+    """
+    Runs the work-units of many streams, e.g. one per project, on one shared
+    pool of max_workers threads. Every stream is enumerated in the background
+    into a small bounded buffer and the buffers are served round-robin, while
+    no key runs more than its cap at once. A large project therefore can't
+    take every worker while small ones wait, and idle workers pick up
+    whichever project still has work. A unit split with fan_out counts as
+    done once its finish_unit returns.
+    :param unit_streams: [(key, work_units)]. The key, e.g. a project-id, is
+                         what the fairness cap applies to (type:list)
+    :param process_unit: Blocking callable that runs one work-unit's job
+                         to completion, or returns fan_out (type:function)
+    :param on_unit_done: Callable(work_unit, result, error) invoked in the
+                         calling thread for every finished unit (type:function)
+    :param max_workers: Maximum number of units and sub-units running at
+                        once (type:int)
+    :param max_in_flight_per_key: {key: cap}. Keys not listed are only
+                                  bound by max_workers (type:dict)
+    :param max_buffered_per_stream: Units enumerated ahead of dispatch
+                                    per stream (type:int)
+    :return unit_results: [(work_unit, result, error)] (type:list)
+    """
+    max_workers = max(1, int(max_workers or 1))
+    key_caps = max_in_flight_per_key or {}
+    stream_keys = [key for key, _ in unit_streams]
+    buffers = [
+        queue.Queue(maxsize=max(1, max_buffered_per_stream)) for _ in unit_streams
+    ]
+    open_streams = set(range(len(unit_streams)))
+    # Sub-units and finish steps of split units, per stream
+    pending_tasks = [collections.deque() for _ in unit_streams]
+    key_in_flight = dict.fromkeys(stream_keys, 0)
+    stream_done = object()
+    wakeup = threading.Event()
+    unit_results = []
+    in_flight = {}
+
+    def feed_stream(index, work_units):
+        try:
+            for work_unit in work_units:
+                buffers[index].put(work_unit)
+                wakeup.set()
+        except Exception as error:
+            print(
+                "Exception occurred at function {} for {}: {}".format(
+                    "run_work_queue", stream_keys[index], error
+                )
+            )
+        finally:
+            buffers[index].put(stream_done)
+            wakeup.set()
+
+    for index, (_, work_units) in enumerate(unit_streams):
+        threading.Thread(
+            target=feed_stream, args=(index, work_units), daemon=True
+        ).start()
+
+    def finish_task(index, work_unit, result, error):
+        # Queues the sub-units of a split unit, or reports the finished unit
+        if error is None and is_fan_out(result):
+            _, sub_units, process_sub_unit, finish_unit = result
+            split_unit = {
+                "work_unit": work_unit,
+                "finish_unit": finish_unit,
+                "remaining": len(sub_units),
+                "sub_results": [],
+            }
+            for sub_unit in sub_units:
+                pending_tasks[index].append(
+                    (process_sub_unit, sub_unit, split_unit, sub_unit)
+                )
+            if not sub_units:
+                queue_finish_step(index, split_unit)
+            return
+        unit_results.append((work_unit, result, error))
+        if on_unit_done is not None:
+            on_unit_done(work_unit, result, error)
+
+    def queue_finish_step(index, split_unit):
+        pending_tasks[index].append(
+            (
+                split_unit["finish_unit"],
+                split_unit["sub_results"],
+                split_unit,
+                split_unit,
+            )
+        )
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        next_stream = 0
+        while open_streams or in_flight or any(pending_tasks):
+            # Clearing first, so a unit arriving during the pass isn't missed
+            wakeup.clear()
+            progressed = False
+            for offset in range(len(unit_streams)):
+                if len(in_flight) >= max_workers:
+                    break
+                index = (next_stream + offset) % len(unit_streams)
+                key = stream_keys[index]
+                if key_in_flight[key] >= max(1, key_caps.get(key, max_workers)):
+                    continue
+                # Split units already started go ahead of the stream's next units
+                if pending_tasks[index]:
+                    task = pending_tasks[index].popleft()
+                elif index in open_streams:
+                    try:
+                        work_unit = buffers[index].get_nowait()
+                    except queue.Empty:
+                        continue
+                    if work_unit is stream_done:
+                        open_streams.discard(index)
+                        progressed = True
+                        continue
+                    task = (process_unit, work_unit, None, work_unit)
+                else:
+                    continue
+                progressed = True
+                run_task, task_arg, split_unit, task_unit = task
+                future = executor.submit(run_task, task_arg)
+                future.add_done_callback(lambda _: wakeup.set())
+                in_flight[future] = (index, split_unit, task_unit)
+                key_in_flight[key] = key_in_flight[key] + 1
+            next_stream = (next_stream + 1) % max(1, len(unit_streams))
+
+            for future in [future for future in in_flight if future.done()]:
+                index, split_unit, task_unit = in_flight.pop(future)
+                key = stream_keys[index]
+                key_in_flight[key] = key_in_flight[key] - 1
+                progressed = True
+                try:
+                    result, error = future.result(), None
+                except Exception as exc:
+                    result, error = None, exc
+                if split_unit is None:
+                    finish_task(index, task_unit, result, error)
+                elif task_unit is split_unit:
+                    # The finish step of a split unit
+                    finish_task(index, split_unit["work_unit"], result, error)
+                else:
+                    split_unit["sub_results"].append((task_unit, result, error))
+                    split_unit["remaining"] = split_unit["remaining"] - 1
+                    if not split_unit["remaining"]:
+                        queue_finish_step(index, split_unit)
+            if not progressed:
+                wakeup.wait()
+    return unit_results
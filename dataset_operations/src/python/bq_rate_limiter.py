@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Importing python libraries"""
+import time
+import random
+import threading
+
+# Error reasons bigquery returns when a quota or rate limit is hit
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "quotaExceeded")
+# Quotas counted per day or per table (e.g. load jobs per table per day)
+# don't clear within a backoff, so hitting one fails the call at once
+NON_RETRYABLE_QUOTA_MESSAGES = ("per day", "daily", "per table", "per-table")
+
+# Requests per second and burst size of every rate-limited method. Job types
+# (extract, load, copy, query) also draw from the jobs.insert bucket of the
+# project. Concurrent jobs per project are capped by the work-queues of the
+# scripts (max_concurrent_jobs), not here
+DEFAULT_RATE_LIMITS = {
+    "jobs.insert": {"rate": 10, "burst": 20},
+    "tables.get": {"rate": 50, "burst": 100},
+    "datasets.get": {"rate": 50, "burst": 100},
+    "datasets.insert": {"rate": 5, "burst": 10},
+    "extract": {"rate": 5, "burst": 10},
+    "load": {"rate": 5, "burst": 10},
+    "copy": {"rate": 5, "burst": 10},
+}
+DEFAULT_RETRY = {"max_retries": 6, "initial_backoff": 1, "max_backoff": 64}
+
+# Process-wide token buckets, one per (project_id, method)
+_rate_limits = {"methods": dict(DEFAULT_RATE_LIMITS), "projects": {}}
+_retry = dict(DEFAULT_RETRY)
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def configure_rate_limits(rate_limits=None):
+    """
+    Sets the limits of the process-wide rate limiter from the "rate_limits"
+    section of the config. Methods not listed keep their default limits.
+    :param rate_limits: {methods: {method: {rate, burst}}, projects:
+                        {project_id: {method: {rate, burst}}}, max_retries,
+                        initial_backoff, max_backoff} (type:dict)
+    :return NoneType:
+    """
+    rate_limits = rate_limits or {}
+    with _buckets_lock:
+        _rate_limits["methods"] = dict(
+            DEFAULT_RATE_LIMITS, **rate_limits.get("methods", {})
+        )
+        _rate_limits["projects"] = rate_limits.get("projects", {})
+        for key in DEFAULT_RETRY:
+            _retry[key] = rate_limits.get(key, DEFAULT_RETRY[key])
+        # Buckets are rebuilt with the new limits on next use
+        _buckets.clear()
+
+
+def get_bucket(project_id, method):
+    """
+    Returns the token bucket of a project's method. Callers hold _buckets_lock.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param method: API method or job type (type:str)
+    :return bucket: {rate, max_rate, burst, tokens, updated} (type:dict)
+    """
+    bucket_key = (project_id, method)
+    if bucket_key not in _buckets:
+        # Project-level limits override the ones of every project
+        project_limits = _rate_limits["projects"].get(project_id, {})
+        limit = project_limits.get(method, _rate_limits["methods"].get(method))
+        if limit is None:
+            return None
+        rate = float(limit["rate"])
+        burst = float(limit.get("burst", rate))
+        _buckets[bucket_key] = {
+            "rate": rate,
+            "max_rate": rate,
+            "burst": burst,
+            "tokens": burst,
+            "updated": time.monotonic(),
+        }
+    return _buckets[bucket_key]
+
+
+def acquire_token(project_id=None, method=None):
+    """
+    Blocks until the bucket of the project's method has a token and takes it.
+    Methods without a configured limit are not throttled.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param method: API method or job type (type:str)
+    :return NoneType:
+    """
+    while True:
+        with _buckets_lock:
+            bucket = get_bucket(project_id, method)
+            if bucket is None:
+                return None
+            now = time.monotonic()
+            bucket["tokens"] = min(
+                bucket["burst"],
+                bucket["tokens"] + (now - bucket["updated"]) * bucket["rate"],
+            )
+            bucket["updated"] = now
+            if bucket["tokens"] >= 1:
+                bucket["tokens"] = bucket["tokens"] - 1
+                return None
+            wait_seconds = (1 - bucket["tokens"]) / bucket["rate"]
+        time.sleep(wait_seconds)
+
+
+def adapt_rate(project_id=None, methods=None, limited=False):
+    """
+    Halves the rate of the project's methods when a limit was hit and
+    recovers a tenth of the configured rate after every success.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param methods: API methods or job types (type:list)
+    :param limited: True if the call hit a rate or quota limit (type:bool)
+    :return NoneType:
+    """
+    with _buckets_lock:
+        for method in methods:
+            bucket = get_bucket(project_id, method)
+            if bucket is None:
+                continue
+            if limited:
+                bucket["rate"] = max(bucket["max_rate"] / 64, bucket["rate"] / 2)
+                # Dropping the burst so the slower rate applies at once
+                bucket["tokens"] = min(bucket["tokens"], 0)
+            elif bucket["rate"] < bucket["max_rate"]:
+                bucket["rate"] = min(
+                    bucket["max_rate"], bucket["rate"] + bucket["max_rate"] / 10
+                )
+
+
+def classify_rate_limit(reason=None, message=None):
+    """
+    Returns the reason of a rate or quota limit a backoff can wait out.
+    :param reason: Error reason (type:str)
+    :param message: Error message (type:str)
+    :return reason: "rateLimitExceeded", "quotaExceeded" or None (type:str)
+    """
+    if reason not in RATE_LIMIT_REASONS:
+        return None
+    if reason == "quotaExceeded" and any(
+        quota_message in (message or "").lower()
+        for quota_message in NON_RETRYABLE_QUOTA_MESSAGES
+    ):
+        return None
+    return reason
+
+
+def get_rate_limit_reason(error):
+    """
+    Returns the rate or quota limit reason of an api or job error, from the
+    reasons of its errors and their messages. Daily and per-table quotas
+    return None, as retrying them only burns the backoff.
+    :param error: Exception raised by the google-cloud client (type:Exception)
+    :return reason: "rateLimitExceeded", "quotaExceeded" or None (type:str)
+    """
+    error_details = [
+        error_detail
+        for error_detail in getattr(error, "errors", None) or []
+        if isinstance(error_detail, dict)
+    ]
+    if error_details:
+        reasons = [
+            classify_rate_limit(
+                reason=error_detail.get("reason"),
+                message="{} {}".format(error_detail.get("message"), error),
+            )
+            for error_detail in error_details
+            if error_detail.get("reason") in RATE_LIMIT_REASONS
+        ]
+        if reasons and all(reasons):
+            return reasons[0]
+        return None
+    # Errors without details only carry the reason in their message
+    for reason in RATE_LIMIT_REASONS:
+        if reason in str(error):
+            return classify_rate_limit(reason=reason, message=str(error))
+    return None
+
+
+def call_with_rate_limit(project_id=None, methods=None, api_call=None):
+    """
+    Calls api_call once every method's bucket of the project grants a token.
+    Calls failing with rateLimitExceeded or quotaExceeded are retried with
+    exponential backoff while the rate of those buckets is lowered; any
+    other error is raised straight away.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param methods: API methods or job types the call counts against (type:list)
+    :param api_call: Callable making the request (type:function)
+    :return result: Return value of api_call
+    """
+    attempt = 0
+    while True:
+        for method in methods:
+            acquire_token(project_id=project_id, method=method)
+        try:
+            result = api_call()
+        except Exception as error:
+            reason = get_rate_limit_reason(error)
+            if reason is None or attempt >= _retry["max_retries"]:
+                raise
+            adapt_rate(project_id=project_id, methods=methods, limited=True)
+            backoff = min(
+                _retry["max_backoff"], _retry["initial_backoff"] * (2**attempt)
+            )
+            # Jitter keeps the workers of a project from retrying in lockstep
+            backoff = backoff * random.uniform(0.5, 1)
+            print(
+                "{} for {} in project {}. Retrying in {:.1f}s...".format(
+                    reason, "/".join(methods), project_id, backoff
+                )
+            )
+            time.sleep(backoff)
+            attempt = attempt + 1
+            continue
+        adapt_rate(project_id=project_id, methods=methods, limited=False)
+        return result
+
+
+def run_rate_limited_job(project_id=None, job_type=None, submit_job=None):
+    """
+    Submits a bigquery job through the rate limiter and waits for it. A job
+    that fails on a rate or quota limit is submitted again after a backoff.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param job_type: "extract", "load", "copy" or "query" (type:str)
+    :param submit_job: Callable submitting the job and returning it (type:function)
+    :return job: The finished job (type:google.cloud.bigquery.job._AsyncJob)
+    """
+
+    def run_job():
+        job = submit_job()
+        job.result()
+        return job
+
+    return call_with_rate_limit(
+        project_id=project_id, methods=["jobs.insert", job_type], api_call=run_job
+    )
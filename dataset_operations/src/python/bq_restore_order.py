@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Importing python libraries"""
+import concurrent.futures
+
+# restore_order policies. listing keeps the order tables are listed in and
+# starts loading before the listing finishes; the others size every table
+# first. Higher priorities always go first, the policy orders within one
+RESTORE_ORDERS = ("listing", "priority", "small_critical_first", "largest_first")
+
+
+def get_restore_priority(restore_priorities=None, dataset_name=None, table_name=None):
+    """
+    Returns the priority of a table. A dataset.table entry overrides the
+    entry of its dataset; tables without either get 0.
+    :param restore_priorities: {dataset_id or dataset_id.table_id: priority} (type:dict)
+    :param dataset_name: Dataset-Id (type:str)
+    :param table_name: Table-Id (type:str)
+    :return priority: Higher is restored earlier (type:int)
+    """
+    restore_priorities = restore_priorities or {}
+    return restore_priorities.get(
+        "{}.{}".format(dataset_name, table_name),
+        restore_priorities.get(dataset_name, 0),
+    )
+
+
+def get_restore_sort_key(restore_order=None, priority=0, table_bytes=0):
+    """
+    Returns the dispatch sort key of a table under a restore_order policy.
+    small_critical_first gets small tables of high priority online within
+    minutes; largest_first starts the longest loads early, which gives the
+    lowest total restore time.
+    :param restore_order: One of RESTORE_ORDERS (type:str)
+    :param priority: From get_restore_priority (type:int)
+    :param table_bytes: Backup size of the table (type:int)
+    :return sort_key: (type:tuple)
+    """
+    if restore_order == "small_critical_first":
+        return (-priority, table_bytes)
+    if restore_order == "largest_first":
+        return (-priority, -table_bytes)
+    return (-priority,)
+
+
+def order_restore_jobs(
+    job_params_list=None,
+    restore_order=None,
+    restore_priorities=None,
+    get_table_bytes=None,
+    max_workers=16,
+):
+    """
+    Sorts restore jobs for dispatch. Table sizes are read concurrently and
+    only for the policies that need them; ties keep the listing order.
+    :param job_params_list: Restore Job Parameters (type:list)
+    :param restore_order: One of RESTORE_ORDERS (type:str)
+    :param restore_priorities: {dataset_id or dataset_id.table_id: priority} (type:dict)
+    :param get_table_bytes: Callable(job_params) returning the backup size
+                            of a table (type:function)
+    :param max_workers: Tables sized at once (type:int)
+    :return job_params_list: Restore Job Parameters in dispatch order (type:list)
+    """
+    table_sizes = [0] * len(job_params_list)
+    if restore_order in ("small_critical_first", "largest_first"):
+
+        def get_size(job_params):
+            try:
+                return int(get_table_bytes(job_params) or 0)
+            except Exception as error:
+                print(
+                    "Exception occurred for {}.{} at function {}: {}".format(
+                        job_params["dataset_name"],
+                        job_params["table_name"],
+                        "order_restore_jobs",
+                        error,
+                    )
+                )
+                return 0
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, max_workers)
+        ) as executor:
+            table_sizes = list(executor.map(get_size, job_params_list))
+
+    sort_keys = [
+        get_restore_sort_key(
+            restore_order,
+            get_restore_priority(
+                restore_priorities, job_params["dataset_name"], job_params["table_name"]
+            ),
+            table_bytes,
+        )
+        for job_params, table_bytes in zip(job_params_list, table_sizes)
+    ]
+    dispatch_order = sorted(range(len(job_params_list)), key=lambda i: sort_keys[i])
+    return [job_params_list[i] for i in dispatch_order]
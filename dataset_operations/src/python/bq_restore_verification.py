@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Importing python libraries"""
+import json
+import argparse
+import concurrent.futures
+from datetime import datetime
+import warnings
+
+warnings.filterwarnings("ignore")
+
+"""Importing google-cloud libraries"""
+from google.cloud import bigquery
+
+"""Importing local modules"""
+from bq_backup_manifest import get_manifest_uri, read_backup_manifest
+from bq_enumeration import get_dataset_table_index
+from bq_gcs import get_io_stats, print_io_stats, write_json
+
+
+def cmd_args_parser():
+    """Parsing command-line arguments"""
+    parser = argparse.ArgumentParser(
+        prog="RestoreVerification",
+        description="Compares restored tables against their backup manifest",
+    )
+    parser.add_argument(
+        "--project_id",
+        type=str.split,
+        action="store",
+        dest="project_id",
+        help="""
+        Provide the project-id.
+        For multiple, use whitespace as delimiter.
+        """,
+        required=True,
+    )
+    parser.add_argument(
+        "--config_file",
+        type=str,
+        action="store",
+        dest="config_file",
+        help="Provide the restore configuration file path.",
+        required=True,
+    )
+    parser.add_argument(
+        "--retention",
+        type=str,
+        action="store",
+        dest="retention",
+        help="""
+        Provide the retention of the backup that was restored.
+        Follows lower case-sensitivity.
+        Available options are daily, monthly, weekly, yearly.
+        """,
+        required=True,
+    )
+    parser.add_argument(
+        "--date",
+        type=str,
+        action="store",
+        dest="date",
+        help="Provide the date of the backup that was restored. Supported format: YYYY-mm-dd",
+        required=True,
+    )
+    parser.add_argument(
+        "--restore_type",
+        type=str.lower,
+        action="store",
+        choices=["all", "config"],
+        dest="restore_type",
+        default="all",
+        help="""
+        Provide the tables to verify.
+        all verifies every table of the backup manifest, config only the
+        tables of the project's restore_pattern.
+        """,
+        required=False,
+    )
+    args = parser.parse_args()
+    cmdargs = {}
+    cmdargs["project_id"] = args.project_id
+    cmdargs["config_file"] = args.config_file
+    cmdargs["retention"] = args.retention
+    cmdargs["date"] = args.date
+    cmdargs["restore_type"] = args.restore_type
+    return cmdargs
+
+
+def compare_table(expected, restored, bytes_tolerance=0.0):
+    """
+    Compares a restored table against the values recorded at export time.
+    Row counts must match exactly, byte sizes within bytes_tolerance.
+    :param expected: {num_rows, num_bytes} of the export. None if the backup
+                     recorded none (type:dict)
+    :param restored: {num_rows, num_bytes} from get_dataset_table_index.
+                     None if the table doesn't exist (type:dict)
+    :param bytes_tolerance: Allowed relative difference of num_bytes (type:float)
+    :return table_result: {status, expected_rows, restored_rows,
+                          expected_bytes, restored_bytes, reason} (type:dict)
+    """
+    expected = expected or {}
+    table_result = {
+        "expected_rows": expected.get("num_rows"),
+        "restored_rows": restored["num_rows"] if restored else None,
+        "expected_bytes": expected.get("num_bytes"),
+        "restored_bytes": restored["num_bytes"] if restored else None,
+    }
+    if restored is None:
+        table_result.update(status="failed", reason="table not found")
+    elif expected.get("num_rows") is None:
+        table_result.update(status="unverified", reason="no export-time row count")
+    elif int(restored["num_rows"]) != int(expected["num_rows"]):
+        table_result.update(status="failed", reason="row count mismatch")
+    elif expected.get("num_bytes") is not None and abs(
+        int(restored["num_bytes"]) - int(expected["num_bytes"])
+    ) > bytes_tolerance * int(expected["num_bytes"]):
+        table_result.update(status="failed", reason="byte size mismatch")
+    else:
+        table_result.update(status="passed", reason=None)
+    return table_result
+
+
+def verify_restored_tables(
+    client=None,
+    project_id=None,
+    location=None,
+    expected_tables=None,
+    bytes_tolerance=0.0,
+    max_workers=8,
+):
+    """
+    Verifies restored tables against their export-time row counts and byte
+    sizes. The sizes of every table of a dataset are read in one __TABLES__
+    query, and the datasets are queried concurrently.
+    :param client: Bigquery Client (type:google.cloud.bigquery.client.Client)
+    :param project_id: Google Cloud Project-Id (type:str)
+    :param location: Dataset Location (type:str)
+    :param expected_tables: {dataset_id.table_id: {num_rows, num_bytes}} (type:dict)
+    :param bytes_tolerance: Allowed relative difference of num_bytes (type:float)
+    :param max_workers: Number of datasets queried at once (type:int)
+    :return table_results: {dataset_id.table_id: table_result} (type:dict)
+    """
+    datasets = sorted(set(key.split(".")[0] for key in expected_tables))
+
+    def index_dataset(dataset):
+        return get_dataset_table_index(
+            client=client, project_id=project_id, dataset=dataset, location=location
+        )
+
+    table_indexes = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_dataset = {
+            executor.submit(index_dataset, dataset): dataset for dataset in datasets
+        }
+        for future in concurrent.futures.as_completed(future_to_dataset):
+            dataset = future_to_dataset[future]
+            try:
+                table_indexes[dataset] = future.result() or {}
+            except Exception as error:
+                print(
+                    "Exception occurred at function {} for dataset {}: {}".format(
+                        "verify_restored_tables", dataset, error
+                    )
+                )
+                table_indexes[dataset] = None
+
+    table_results = {}
+    for key, expected in sorted(expected_tables.items()):
+        dataset, table = key.split(".", 1)
+        if table_indexes[dataset] is None:
+            table_results[key] = {"status": "unverified", "reason": "query failed"}
+            continue
+        table_results[key] = compare_table(
+            expected, table_indexes[dataset].get(table), bytes_tolerance
+        )
+    return table_results
+
+
+def write_verification_report(
+    verification_uri=None,
+    project_id=None,
+    retention=None,
+    timestamp=None,
+    table_results=None,
+):
+    """
+    Writes the pass/fail report of a restore verification and prints its
+    summary.
+    :param verification_uri: Report Uri (type:str)
+    :param project_id: Google Cloud Project Id (type:str)
+    :param retention: Retention Type (type:str)
+    :param timestamp: Restore Date (type:str)
+    :param table_results: {dataset_id.table_id: table_result} (type:dict)
+    :return success_criteria: {0:every table passed, 1:fail}
+    """
+    status_counts = {"passed": 0, "failed": 0, "unverified": 0}
+    for table_result in table_results.values():
+        status_counts[table_result["status"]] = (
+            status_counts.get(table_result["status"], 0) + 1
+        )
+    print(
+        "Restore verification for project:{}: {} passed, {} failed, {} unverified".format(
+            project_id,
+            status_counts["passed"],
+            status_counts["failed"],
+            status_counts["unverified"],
+        )
+    )
+    for key, table_result in sorted(table_results.items()):
+        if table_result["status"] == "failed":
+            print("Verification failed for {}: {}".format(key, table_result["reason"]))
+    success_criteria = 1 if status_counts["failed"] else 0
+    try:
+        write_json(
+            verification_uri,
+            {
+                "project_id": project_id,
+                "retention": retention,
+                "timestamp": timestamp,
+                "created": datetime.now().isoformat(),
+                "status": "passed" if success_criteria == 0 else "failed",
+                "table_count": len(table_results),
+                "passed_count": status_counts["passed"],
+                "failed_count": status_counts["failed"],
+                "unverified_count": status_counts["unverified"],
+                "tables": table_results,
+            },
+            project_id=project_id,
+        )
+        print("Verification report written to {}".format(verification_uri))
+    except Exception as error:
+        print(
+            "Exception occurred at function {}: {}".format(
+                "write_verification_report", error
+            )
+        )
+        success_criteria = 1
+    return success_criteria
+
+
+def get_verification_uri(restore_config=None, bucket_name=None, **path_params):
+    """
+    Returns the report uri of a restore verification. None if no
+    verification_uri is configured.
+    :param restore_config: Restore Configuration (type:dict)
+    :param bucket_name: Backup Bucket Name (type:str)
+    :param path_params: retention, timestamp, project_id (type:dict)
+    :return verification_uri: (type:str)
+    """
+    if not restore_config.get("verification_uri"):
+        return None
+    return restore_config["verification_uri"].format(
+        bucket_name=bucket_name, **path_params
+    )
+
+
+def verify_restore(
+    project_id=None, restore_config=None, retention=None, date=None, restore_type="all"
+):
+    """
+    Verifies an existing restore against the manifest of the backup it was
+    restored from.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param restore_config: Restore Configuration (type:dict)
+    :param retention: Retention Type ["daily", "monthly", "weekly", "yearly"] (type:str)
+    :param date: Backup Date. Format: YYYY-mm-dd (type:str)
+    :param restore_type: Restore Type ["all", "config"] (type:str)
+    :return success_criteria: {0:success, 1:fail}
+    """
+    print("Running restore verification for project:{}".format(project_id))
+    project_restore_config = restore_config["projects_dict"][project_id]
+    path_params = {"retention": retention, "timestamp": date, "project_id": project_id}
+    backup_manifest = read_backup_manifest(
+        manifest_uri=get_manifest_uri(
+            restore_config,
+            bucket_name=project_restore_config["bucket_name"],
+            **path_params
+        ),
+        project_id=project_id,
+    )
+    if backup_manifest is None:
+        print(
+            "No backup manifest for {} backup of {}. Nothing to verify against.".format(
+                retention, date
+            )
+        )
+        return 1
+    expected_tables = {
+        key: table_manifest
+        for key, table_manifest in backup_manifest["tables"].items()
+        if table_manifest["status"] != "failed"
+    }
+    if restore_type == "config":
+        restore_pattern = project_restore_config["restore_pattern"]
+        expected_tables = {
+            key: table_manifest
+            for key, table_manifest in expected_tables.items()
+            if restore_pattern.get(key.split(".")[0]) == "all"
+            or key.split(".", 1)[1] in restore_pattern.get(key.split(".")[0], [])
+        }
+    table_results = verify_restored_tables(
+        client=bigquery.Client(project=project_id),
+        project_id=project_id,
+        location=restore_config["location"],
+        expected_tables=expected_tables,
+        bytes_tolerance=restore_config.get("verify_bytes_tolerance", 0.0),
+        max_workers=restore_config.get("max_concurrent_listings", 8),
+    )
+    verification_uri = get_verification_uri(
+        restore_config, bucket_name=project_restore_config["bucket_name"], **path_params
+    )
+    if verification_uri is None:
+        print("No verification_uri configured. Report not written.")
+        return 1
+    return write_verification_report(
+        verification_uri=verification_uri,
+        project_id=project_id,
+        retention=retention,
+        timestamp=date,
+        table_results=table_results,
+    )
+
+
+if __name__ == "__main__":
+    # Reading cmd args
+    cmdargs = cmd_args_parser()
+
+    # Reading restore-parameters from json config
+    with open(cmdargs["config_file"]) as f:
+        master_config = json.load(f)
+    restore_config = master_config["restore"]
+
+    for project_id in cmdargs["project_id"]:
+        run_io_stats = get_io_stats()
+        success_criteria = verify_restore(
+            project_id=project_id,
+            restore_config=restore_config,
+            retention=cmdargs["retention"],
+            date=cmdargs["date"],
+            restore_type=cmdargs["restore_type"],
+        )
+        print_io_stats(label=project_id, since=run_io_stats)
+        print(
+            "Restore verification success criteria is {}.\nHelp: 0-SUCCESS, 1-FAIL".format(
+                success_criteria
+            )
+        )
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Importing python libraries"""
+import heapq
+from datetime import timedelta
+
+# Largest file bigquery writes per shard of a wildcard extract
+EXPORT_SHARD_BYTES = 1024 * 1024 * 1024
+
+# Throughput assumed per job when projecting wall time. Overridden by the
+# "plan" section of the backup/restore config
+DEFAULT_PLAN_RATES = {
+    "extract_bytes_per_second": 200 * 1024 * 1024,
+    "load_bytes_per_second": 100 * 1024 * 1024,
+    "job_overhead_seconds": 15,
+}
+
+
+def get_export_shard_count(num_bytes):
+    """
+    Returns the number of files an extract of num_bytes is expected to write.
+    :param num_bytes: Table Size in bytes (type:int)
+    :return shard_count: (type:int)
+    """
+    return max(1, -(-int(num_bytes or 0) // EXPORT_SHARD_BYTES))
+
+
+def get_job_seconds(job_bytes=None, job_type=None, plan_config=None):
+    """
+    Returns the projected duration of one job.
+    :param job_bytes: Bytes the job moves (type:int)
+    :param job_type: "extract" or "load" (type:str)
+    :param plan_config: "plan" section of the config (type:dict)
+    :return job_seconds: (type:float)
+    """
+    plan_rates = dict(DEFAULT_PLAN_RATES, **(plan_config or {}))
+    bytes_per_second = plan_rates["{}_bytes_per_second".format(job_type)]
+    return plan_rates["job_overhead_seconds"] + float(job_bytes or 0) / bytes_per_second
+
+
+def estimate_wall_time(job_seconds=None, max_in_flight=1):
+    """
+    Returns the projected wall time of running jobs with at most
+    max_in_flight at once, the largest jobs dispatched first.
+    :param job_seconds: Projected duration of every job (type:list)
+    :param max_in_flight: Jobs running at once (type:int)
+    :return wall_seconds: (type:float)
+    """
+    slots = [0.0] * max(1, int(max_in_flight or 1))
+    for seconds in sorted(job_seconds, reverse=True):
+        heapq.heapreplace(slots, slots[0] + seconds)
+    return max(slots)
+
+
+def format_bytes(num_bytes):
+    """
+    Returns a byte count in human readable units.
+    :param num_bytes: (type:int)
+    :return formatted: e.g. "1.5 GiB" (type:str)
+    """
+    num_bytes = float(num_bytes or 0)
+    for unit in ["B", "KiB", "MiB", "GiB", "TiB"]:
+        if num_bytes < 1024 or unit == "TiB":
+            return "{:.1f} {}".format(num_bytes, unit)
+        num_bytes = num_bytes / 1024
+
+
+def print_run_plan(
+    label=None, project_plans=None, max_workers=1, job_type=None, plan_config=None
+):
+    """
+    Prints the estimate of a run: jobs, bytes, shards and storage objects per
+    project, and the wall time projected at the configured concurrency.
+    :param label: "export" or "import" (type:str)
+    :param project_plans: [{project_id, max_concurrent_jobs, table_count,
+                          skipped, job_bytes, shard_count, object_count}] (type:list)
+    :param max_workers: Jobs running at once across projects (type:int)
+    :param job_type: "extract" or "load" (type:str)
+    :param plan_config: "plan" section of the config (type:dict)
+    :return run_plan: {job_count, total_bytes, shard_count, object_count,
+                      wall_seconds} (type:dict)
+    """
+    run_plan = {
+        "job_count": 0,
+        "total_bytes": 0,
+        "shard_count": 0,
+        "object_count": 0,
+        "wall_seconds": 0.0,
+    }
+    all_job_seconds = []
+    for project_plan in project_plans:
+        job_seconds = [
+            get_job_seconds(job_bytes, job_type, plan_config)
+            for job_bytes in project_plan["job_bytes"]
+        ]
+        all_job_seconds.extend(job_seconds)
+        max_in_flight = min(project_plan["max_concurrent_jobs"], max_workers)
+        wall_seconds = estimate_wall_time(job_seconds, max_in_flight)
+        total_bytes = sum(project_plan["job_bytes"])
+        print(
+            "Plan for {} of project:{}: {} tables, {} jobs, {}, {} shards, {} objects, {} at {} jobs in flight".format(
+                label,
+                project_plan["project_id"],
+                project_plan["table_count"],
+                len(job_seconds),
+                format_bytes(total_bytes),
+                project_plan["shard_count"],
+                project_plan["object_count"],
+                timedelta(seconds=int(wall_seconds)),
+                max_in_flight,
+            )
+        )
+        for reason, count in sorted(project_plan["skipped"].items()):
+            print("  {} tables skipped: {}".format(count, reason))
+        run_plan["job_count"] = run_plan["job_count"] + len(job_seconds)
+        run_plan["total_bytes"] = run_plan["total_bytes"] + total_bytes
+        run_plan["shard_count"] = run_plan["shard_count"] + project_plan["shard_count"]
+        run_plan["object_count"] = (
+            run_plan["object_count"] + project_plan["object_count"]
+        )
+        run_plan["wall_seconds"] = max(run_plan["wall_seconds"], wall_seconds)
+    # Projects share max_workers, so the run takes at least its total job
+    # time spread over every worker
+    run_plan["wall_seconds"] = max(
+        run_plan["wall_seconds"], sum(all_job_seconds) / max(1, max_workers)
+    )
+    print(
+        "Plan for {}: {} jobs, {}, {} shards, {} objects. Projected wall time {} at {} workers. Nothing was submitted.".format(
+            label,
+            run_plan["job_count"],
+            format_bytes(run_plan["total_bytes"]),
+            run_plan["shard_count"],
+            run_plan["object_count"],
+            timedelta(seconds=int(run_plan["wall_seconds"])),
+            max_workers,
+        )
+    )
+    return run_plan
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Importing google-cloud libraries"""
+
+from google.cloud import bigquery
+
+
+def get_table_definition(table_obj):
+    """
+    Returns the definition of a table that a restore needs to recreate it:
+    the nested schema with descriptions, partitioning, clustering and the
+    table's own properties.
+    :param table_obj: Big Query Table (type:google.cloud.bigquery.table.Table)
+    :return table_definition: {schema, description, friendly_name, labels,
+                              expires, time_partitioning, range_partitioning,
+                              clustering_fields, require_partition_filter}
+                              (type:dict)
+    """
+    table_definition = {
+        "schema": [schema_field.to_api_repr() for schema_field in table_obj.schema],
+        "description": table_obj.description,
+        "friendly_name": table_obj.friendly_name,
+        "labels": table_obj.labels,
+        "expires": table_obj.expires.isoformat() if table_obj.expires else None,
+        "time_partitioning": None,
+        "range_partitioning": None,
+        "clustering_fields": table_obj.clustering_fields,
+        "require_partition_filter": table_obj.require_partition_filter,
+    }
+    if table_obj.time_partitioning is not None:
+        table_definition["time_partitioning"] = (
+            table_obj.time_partitioning.to_api_repr()
+        )
+    # Range partitioning is missing from older google-cloud-bigquery releases
+    range_partitioning = getattr(table_obj, "range_partitioning", None)
+    if range_partitioning is not None:
+        table_definition["range_partitioning"] = {
+            "field": range_partitioning.field,
+            "range": {
+                "start": range_partitioning.range_.start,
+                "end": range_partitioning.range_.end,
+                "interval": range_partitioning.range_.interval,
+            },
+        }
+    return table_definition
+
+
+def read_table_definition(json_content):
+    """
+    Returns a table definition from the content of a -schema.json file.
+    Backups written before table definitions were captured hold a bare
+    list of {name, mode, type}.
+    :param json_content: Content of the -schema.json file (type:dict/list)
+    :return table_definition: (type:dict)
+    """
+    if json_content is None:
+        return None
+    if isinstance(json_content, list):
+        return {"schema": json_content}
+    return json_content
+
+
+def apply_table_definition(load_job_config, table_definition, embeds_schema=False):
+    """
+    Sets the schema, partitioning, clustering and description of a table
+    definition on a load job, so the restored table matches the original.
+    :param load_job_config: (type:google.cloud.bigquery.job.LoadJobConfig)
+    :param table_definition: From get_table_definition (type:dict)
+    :param embeds_schema: True for formats whose files carry the schema (type:bool)
+    :return load_job_config: (type:google.cloud.bigquery.job.LoadJobConfig)
+    """
+    if not table_definition:
+        return load_job_config
+    if table_definition.get("schema") and not embeds_schema:
+        load_job_config.schema = [
+            bigquery.SchemaField.from_api_repr(schema)
+            for schema in table_definition["schema"]
+        ]
+    if table_definition.get("time_partitioning"):
+        load_job_config.time_partitioning = bigquery.TimePartitioning.from_api_repr(
+            table_definition["time_partitioning"]
+        )
+    range_partitioning = table_definition.get("range_partitioning")
+    if range_partitioning:
+        load_job_config.range_partitioning = bigquery.RangePartitioning(
+            field=range_partitioning["field"],
+            range_=bigquery.PartitionRange(
+                start=int(range_partitioning["range"]["start"]),
+                end=int(range_partitioning["range"]["end"]),
+                interval=int(range_partitioning["range"]["interval"]),
+            ),
+        )
+    if table_definition.get("clustering_fields"):
+        load_job_config.clustering_fields = table_definition["clustering_fields"]
+    if table_definition.get("description"):
+        load_job_config.destination_table_description = table_definition["description"]
+    if table_definition.get("friendly_name"):
+        load_job_config.destination_table_friendly_name = table_definition[
+            "friendly_name"
+        ]
+    return load_job_config
+
+
+def apply_table_properties(table_obj, table_definition):
+    """
+    Sets what a load job can't carry onto a loaded table: the column
+    descriptions of the definition, matched by field name, and
+    require_partition_filter.
+    :param table_obj: Loaded Big Query Table (type:google.cloud.bigquery.table.Table)
+    :param table_definition: From get_table_definition (type:dict)
+    :return changed_fields: Table properties to pass to update_table (type:list)
+    """
+    changed_fields = []
+    if not table_definition:
+        return changed_fields
+    schema = [schema_field.to_api_repr() for schema_field in table_obj.schema]
+    if merge_field_descriptions(schema, table_definition.get("schema") or []):
+        table_obj.schema = [
+            bigquery.SchemaField.from_api_repr(schema_field) for schema_field in schema
+        ]
+        changed_fields.append("schema")
+    if (
+        table_definition.get("require_partition_filter")
+        and not table_obj.require_partition_filter
+    ):
+        table_obj.require_partition_filter = True
+        changed_fields.append("require_partition_filter")
+    return changed_fields
+
+
+def merge_field_descriptions(fields, definition_fields):
+    """
+    Copies the descriptions of definition_fields onto the fields of the same
+    name, nested fields included.
+    :param fields: API representation of a schema, changed in place (type:list)
+    :param definition_fields: Schema of a table definition (type:list)
+    :return changed: True if any description was copied (type:bool)
+    """
+    definition_by_name = {field["name"].lower(): field for field in definition_fields}
+    changed = False
+    for field in fields:
+        definition_field = definition_by_name.get(field["name"].lower())
+        if definition_field is None:
+            continue
+        description = definition_field.get("description")
+        if description and field.get("description") != description:
+            field["description"] = description
+            changed = True
+        if field.get("fields") and definition_field.get("fields"):
+            changed = (
+                merge_field_descriptions(field["fields"], definition_field["fields"])
+                or changed
+            )
+    return changed
@@ -1,11 +1,12 @@
 #!/usr/bin/env python
 # coding: utf-8
 """Importing python libraries"""
+import re
 import json
 import argparse
+import threading
 import concurrent.futures
-from concurrent import futures
-import gcsfs
+from datetime import timedelta
 import warnings
 
 warnings.filterwarnings("ignore")
@@ -14,6 +15,59 @@ warnings.filterwarnings("ignore")
 from google.cloud import bigquery
 from google.cloud.exceptions import NotFound
 
+"""Importing local modules"""
+from bq_backup_expiration import BACKUP_DATA_POLICY
+from bq_backup_format import detect_backup_format, get_backup_format
+from bq_backup_manifest import (
+    get_manifest_uri,
+    parse_utc_timestamp,
+    read_backup_manifest,
+)
+from bq_checkpoint_journal import (
+    checkpoint_job_submission,
+    close_checkpoint_journal,
+    get_checkpoint,
+    get_checkpoint_key,
+    get_partition_checkpoint_key,
+    open_checkpoint_journal,
+    write_checkpoint,
+)
+from bq_enumeration import (
+    get_dataset_table_index,
+    iter_dataset_tables,
+    iter_pattern_tables,
+)
+from bq_backup_layout import (
+    BACKUP_FILE_SUFFIXES,
+    get_layout_pattern,
+    get_layout_prefix,
+)
+from bq_gcs import (
+    get_io_stats,
+    list_blobs,
+    list_prefixes,
+    print_io_stats,
+    read_json_folder,
+)
+from bq_job_window import fan_out, run_work_queue
+from bq_rate_limiter import (
+    call_with_rate_limit,
+    configure_rate_limits,
+    run_rate_limited_job,
+)
+from bq_restore_order import RESTORE_ORDERS, order_restore_jobs
+from bq_restore_verification import (
+    get_verification_uri,
+    verify_restored_tables,
+    write_verification_report,
+)
+from bq_run_plan import print_run_plan
+from bq_table_definition import (
+    apply_table_definition,
+    apply_table_properties,
+    read_table_definition,
+)
+
 
 def cmd_args_parser():
     """Parsing command-line arguments"""
@@ -58,7 +112,10 @@ def cmd_args_parser():
         type=str.split,
         action="store",
         dest="date",
-        help="Provide date for importing table. Supported format: YYYY-mm-dd",
+        help="""
+        Provide date for importing table. Supported format: YYYY-mm-dd
+        With point_in_time, YYYY-mm-ddTHH:MM:SS in UTC is supported too.
+        """,
         required=True,
     )
     parser.add_argument(
@@ -70,10 +127,40 @@ def cmd_args_parser():
         Provide restore_type for restoring the restore.
         For multiple, use whitespace as delimiter.
         Follows lower case-sensitivity.
-        Available options are all, config.
+        Available options are all, config, backup.
+        backup restores every table found in the backup bucket.
         """,
         required=True,
     )
+    parser.add_argument(
+        "--point_in_time",
+        type=str.split,
+        action="store",
+        dest="point_in_time",
+        default=["False"],
+        help="""
+        Provide point_in_time to restore every table from its most recent
+        backup at or before date, searching all retention tiers.
+        For multiple, use whitespace as delimiter.
+        Follows title case-sensitivity.
+        Available options are True, False.
+        """,
+        required=False,
+    )
+    parser.add_argument(
+        "--plan",
+        type=str,
+        action="store",
+        dest="plan",
+        default="False",
+        help="""
+        Provide plan to print the job count, bytes, shards and projected wall
+        time of the run without creating datasets or submitting any job.
+        Follows title case-sensitivity.
+        Available options are True, False.
+        """,
+        required=False,
+    )
     args = parser.parse_args()
     cmdargs = {}
     cmdargs["project_id"] = args.project_id
@@ -81,109 +168,294 @@ def cmd_args_parser():
     cmdargs["retention"] = args.retention
     cmdargs["restore_type"] = args.restore_type
     cmdargs["date"] = args.date
+    cmdargs["point_in_time"] = args.point_in_time
+    cmdargs["plan"] = args.plan
 
     return cmdargs
 
 
-def list_all_datasets(client=None):
+# Backup listings read so far: {listing key: content}
+_backup_listings = {}
+_backup_listing_locks = {}
+_backup_listings_lock = threading.Lock()
+
+
+def read_backup_listing(listing_key, read_listing):
     """
-    Returns a list of datasets in the project.
-    :param client: Bigquery Client (type:google.cloud.bigquery.client.Client)
-    :return datasets: List of Datasets(type:list)
+    Reads a listing of the backup bucket once per run. Tables needing the
+    same listing wait for the first reader instead of repeating it.
+    :param listing_key: Cache key, e.g. the listed uri (type:str/tuple)
+    :param read_listing: Callable returning the listing (type:function)
+    :return listing: Value returned by read_listing
     """
-    datasets = []
-    try:
-        datasets_list = list(client.list_datasets())
-        if datasets_list:
-            for dataset in datasets_list:
-                datasets.append(dataset.dataset_id)
-    except Exception as error:
-        print(
-            "Exception occurred at function {}: {}".format("list_all_datasets", error)
-        )
-    finally:
-        return datasets
+    with _backup_listings_lock:
+        listing_lock = _backup_listing_locks.setdefault(listing_key, threading.Lock())
+    with listing_lock:
+        if listing_key not in _backup_listings:
+            _backup_listings[listing_key] = read_listing()
+    return _backup_listings[listing_key]
 
 
-def get_datasets_tables_dict(client=None, project_id=None, datasets=None):
+def get_schema_folder_path(schema_path, **path_fields):
     """
-    Returns a dictionary of datasets and their tables.
-    :param client: Bigquery Client (type:google.cloud.bigquery.client.Client)
-    :param project_id: Google Cloud Project-Id (type:str)
-    :param datasets: List of dataset-ids (type:list)
-    :return dataset_tables_dict: {dataset_id:[tables_list]} (type:dict)
+    Returns the folder holding the schema files of a dataset's backup.
+    :param schema_path: Schema Uri Template (type:str)
+    :param path_fields: bucket_name, retention, dataset_name, timestamp (type:dict)
+    :return gcs_folder_path: gs://bucket/.../schema/ (type:str)
     """
-    try:
-        datasets_tables_dict = {}
-        for dataset in datasets:
-            tables_list = []
-            dataset_id = "{}.{}".format(project_id, dataset)
-            tables = client.list_tables(dataset_id)
-            for table in tables:
-                tables_list.append(table.table_id)
-            datasets_tables_dict[dataset] = tables_list
-    except Exception as error:
-        print(
-            "Exception occurred at function {}: {}".format(
-                "get_datasets_tables_dict", error
-            )
-        )
-    finally:
-        return datasets_tables_dict
+    return (
+        schema_path.format(schema_file_name="", **path_fields).rsplit("/", 1)[0] + "/"
+    )
 
 
-def read_json_schema(gcs_schema_path):
-    """Reads JSON content from GCS file and returns."""
-    try:
-        fs = gcsfs.GCSFileSystem()
-        with fs.open(gcs_schema_path, "r") as f:
-            schema = json.loads(f.read())
-        return schema
-    except Exception as error:
-        print(
-            "Exception occurred at function {} inside export-loop: {}".format(
-                "read_json_schema", error
+def read_schema_folder(gcs_folder_path, project_id=None):
+    """
+    Lists a schema folder of a backup once and reads all of its files
+    concurrently. The folder is cached, so every other table of the dataset
+    and date is served from memory. A folder with files that couldn't be
+    read raises and isn't cached, so the next table reads it again.
+    :param gcs_folder_path: gs://bucket/.../schema/ (type:str)
+    :param project_id: Google Cloud Project Id (type:str)
+    :return schema_files: {schema_file_name: content} (type:dict)
+    """
+    return read_backup_listing(
+        gcs_folder_path,
+        lambda: read_json_folder(gcs_folder_path, project_id=project_id),
+    )
+
+
+def read_data_folder_sizes(gcs_folder_path, project_id=None):
+    """
+    Lists the data files of a backup folder once, with their sizes.
+    :param gcs_folder_path: gs://bucket/.../data/ (type:str)
+    :param project_id: Google Cloud Project Id (type:str)
+    :return file_sizes: {data_file_name: size in bytes} (type:dict)
+    """
+    return read_backup_listing(
+        ("data_sizes", gcs_folder_path),
+        lambda: {
+            blob.name.rsplit("/", 1)[-1]: blob.size
+            for blob in list_blobs(gcs_folder_path, project_id=project_id)
+        },
+    )
+
+
+def has_table_backup(schema_files, table_name):
+    """Returns True if a schema folder holds a backup file of the table."""
+    return any(table_name + suffix in schema_files for suffix in BACKUP_FILE_SUFFIXES)
+
+
+def list_backup_dates(project_id=None, schema_path=None, path_params=None):
+    """
+    Lists the backup dates of a dataset in every retention tier, once per
+    dataset. Point-in-time restores pick their dates from this index.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param schema_path: Schema Uri Template (type:str)
+    :param path_params: bucket_name, dataset_name (type:dict)
+    :return backup_dates: [(timestamp, retention)], newest first (type:list)
+    """
+
+    def read_backup_dates():
+        backup_dates = []
+        for retention in BACKUP_DATA_POLICY:
+            date_pattern = get_layout_pattern(
+                schema_path, end_field="timestamp", retention=retention, **path_params
             )
+            for date_prefix in list_prefixes(
+                get_layout_prefix(schema_path, retention=retention, **path_params),
+                project_id=project_id,
+            ):
+                match = date_pattern.match(date_prefix)
+                if match:
+                    backup_dates.append((match.group("timestamp"), retention))
+        return sorted(backup_dates, reverse=True)
+
+    return read_backup_listing(
+        ("backup_dates", path_params["bucket_name"], path_params["dataset_name"]),
+        read_backup_dates,
+    )
+
+
+def resolve_point_in_time(**kwargs):
+    """
+    Finds the most recent backup of a table at or before a target time,
+    across all retention tiers. Backup folders are dated in the time zone
+    of the host that exported them, so with a target time the backups dated
+    from the day before to the day after the target date are decided by the
+    UTC created time of their run manifest.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param schema_path: Schema Uri Template (type:str)
+    :param manifest_path: Manifest Uri Template (type:str)
+    :param path_params: bucket_name, dataset_name (type:dict)
+    :param table_name: Table-Id (type:str)
+    :param target_timestamp: YYYY-mm-dd or YYYY-mm-ddTHH:MM:SS in UTC (type:str)
+    :return retention, timestamp: Tier and date of the backup. None, None
+                                  if there is none (type:str,str)
+    """
+    project_id = kwargs.get("project_id")
+    schema_path = kwargs.get("schema_path")
+    manifest_path = kwargs.get("manifest_path")
+    path_params = kwargs.get("path_params")
+    bq_table_name = kwargs.get("table_name")
+    target_timestamp = kwargs.get("target_timestamp")
+    target_date = target_timestamp[:10]
+    latest_date, earliest_checked_date = target_date, None
+    if len(target_timestamp) > len(target_date):
+        target_time = parse_utc_timestamp(target_timestamp)
+        latest_date = (target_time + timedelta(days=1)).strftime("%Y-%m-%d")
+        earliest_checked_date = (target_time - timedelta(days=1)).strftime("%Y-%m-%d")
+
+    for timestamp, retention in list_backup_dates(
+        project_id=project_id, schema_path=schema_path, path_params=path_params
+    ):
+        if timestamp > latest_date:
+            continue
+        schema_files = read_schema_folder(
+            get_schema_folder_path(
+                schema_path, retention=retention, timestamp=timestamp, **path_params
+            ),
+            project_id,
         )
+        if not has_table_backup(schema_files, bq_table_name):
+            continue
+        # Backups dated around the target date may have run after the target time
+        if earliest_checked_date is not None and timestamp >= earliest_checked_date:
+            manifest_uri = get_manifest_uri(
+                {"manifest_uri": manifest_path},
+                bucket_name=path_params["bucket_name"],
+                retention=retention,
+                timestamp=timestamp,
+                project_id=project_id,
+            )
+            backup_manifest = read_backup_listing(
+                manifest_uri,
+                lambda: read_backup_manifest(manifest_uri, project_id=project_id),
+            )
+            if not backup_manifest:
+                # Without a manifest only backups of earlier dates count
+                if timestamp >= target_date:
+                    continue
+            elif parse_utc_timestamp(backup_manifest["created"]) > target_time:
+                continue
+        return retention, timestamp
+    return None, None
+
+
+def read_json_schema(gcs_schema_path, project_id=None):
+    """
+    Reads JSON content from GCS file and returns. None if it does not exist.
+    Read errors are raised, so a table isn't restored without its definition.
+    """
+    gcs_folder_path, schema_file_name = gcs_schema_path.rsplit("/", 1)
+    schema_files = read_schema_folder(gcs_folder_path + "/", project_id)
+    return schema_files.get(schema_file_name)
+
+
+def restore_table_properties(
+    client=None, project_id=None, full_table_id=None, table_definition=None
+):
+    """
+    Sets the column descriptions and require_partition_filter of a table
+    definition on a restored table, which a load job can't carry.
+    :param client: Big Query Client (type:google.cloud.bigquery.client.Client)
+    :param project_id: Google Cloud Project Id (type:str)
+    :param full_table_id: Project_Id.Dataset_Id.Table_Id (type:str)
+    :param table_definition: From read_table_definition (type:dict)
+    :return NoneType:
+    """
+    if not table_definition:
         return None
+    table_obj = call_with_rate_limit(
+        project_id=project_id,
+        methods=["tables.get"],
+        api_call=lambda: client.get_table(full_table_id),
+    )
+    changed_fields = apply_table_properties(table_obj, table_definition)
+    if changed_fields:
+        call_with_rate_limit(
+            project_id=project_id,
+            methods=["tables.update"],
+            api_call=lambda: client.update_table(table_obj, changed_fields),
+        )
 
 
 def load_table_from_gcs(job_params):
     """
     Loads bigquery table from google-cloud-storage.
     :param client: Big Query Client (type:google.cloud.bigquery.client.Client)
+    :param project_id: Google Cloud Project Id (type:str)
     :param full_table_id: Project_Id.Dataset_Id.Table_Id (type:str)
     :param gcs_table_path: Table Data Uri (type:str)
-    :param json_schema: Table Json Schema (type:dict)
+    :param backup_format: Backup Format from detect_backup_format (type:dict)
+    :param table_definition: Schema, partitioning and clustering of the
+                             table. None if the backup has none (type:dict)
     :param location: Table-Data File Location (type:str)
+    :param time_partitioning: Partitioning of the table, required when loading
+                              into a table$partition decorator (type:dict)
+    :param journal: Checkpoint journal of the run. None disables
+                    checkpointing (type:dict)
+    :param checkpoint_key: Journal key of the load (type:str)
     :return success_criteria: {0:success, 1:fail}
     """
     client = job_params.get("client")
+    project_id = job_params.get("project_id")
     full_table_id = job_params.get("full_table_id")
     gcs_table_path = job_params.get("gcs_table_path")
-    json_schema = job_params.get("json_schema", {})
+    backup_format = job_params.get("backup_format")
+    table_definition = job_params.get("table_definition")
     location = job_params.get("location")
+    time_partitioning = job_params.get("time_partitioning")
     try:
         load_job_config = bigquery.LoadJobConfig()
-        load_job_config.schema = [
-            bigquery.SchemaField(
-                schema.get("name"), schema.get("type"), schema.get("mode")
+        # Recreating schema, partitioning and clustering of the original table
+        apply_table_definition(
+            load_job_config,
+            table_definition,
+            embeds_schema=backup_format["embeds_schema"],
+        )
+        if time_partitioning:
+            load_job_config.time_partitioning = bigquery.TimePartitioning.from_api_repr(
+                time_partitioning
             )
-            for schema in json_schema
-        ]
-        load_job_config.source_format = bigquery.SourceFormat.NEWLINE_DELIMITED_JSON
+        load_job_config.source_format = backup_format["format"]
+        if backup_format["format"] == "AVRO":
+            load_job_config.use_avro_logical_types = True
         load_job_config.write_disposition = bigquery.WriteDisposition.WRITE_TRUNCATE
         load_job_config.create_disposition = bigquery.CreateDisposition.CREATE_IF_NEEDED
-        load_job = client.load_table_from_uri(
-            gcs_table_path, full_table_id, location=location, job_config=load_job_config
+        load_job = run_rate_limited_job(
+            project_id=project_id,
+            job_type="load",
+            submit_job=checkpoint_job_submission(
+                journal=job_params.get("journal"),
+                checkpoint_key=job_params.get("checkpoint_key"),
+                client=client,
+                location=location,
+                submit_job=lambda: client.load_table_from_uri(
+                    gcs_table_path,
+                    full_table_id,
+                    location=location,
+                    job_config=load_job_config,
+                ),
+            ),
+        )
+        # The finished job reports its row count, no get_table needed
+        print(
+            "Loaded {} rows successfully into {}.".format(
+                load_job.output_rows, full_table_id
+            )
         )
-        load_job.result()
-        destination_table = client.get_table(full_table_id)
-        print("Loaded {} rows successfully.".format(destination_table.num_rows))
+        # Partition loads leave this to the finish step of the table
+        if not time_partitioning:
+            restore_table_properties(
+                client=client,
+                project_id=project_id,
+                full_table_id=full_table_id,
+                table_definition=table_definition,
+            )
         success_criteria = 0
     except Exception as error:
         print(
-            "Exception occurred at function {} inside export-loop: {}".format(
+            "Exception occurred at function {} inside import-loop: {}".format(
                 "load_table_from_gcs", error
             )
         )
@@ -192,175 +464,1209 @@ def load_table_from_gcs(job_params):
         return success_criteria
 
 
-def main_process_function(project_id, config_file, retention, restore_type, date):
+def load_table_partitions_from_gcs(job_params):
+    """
+    Loads a partitioned table back one partition at a time, using the
+    <table>-partitions.json record of the backup. An existing table is
+    deleted first, so partitions the backup doesn't hold aren't left behind,
+    and the first partition load recreates it. The remaining partition loads
+    run as sub-units of the work-queue, under the same caps as every other
+    load job.
+    :param client: Big Query Client (type:google.cloud.bigquery.client.Client)
+    :param full_table_id: Project_Id.Dataset_Id.Table_Id (type:str)
+    :param table_partitions: Partitions record of the backup (type:dict)
+    :param table_exists: True if the table already exists (type:bool)
+    :param table_path: Table Data Uri Template (type:str)
+    :param table_path_params: Fields of table_path except timestamp and
+                              table_file_name (type:dict)
+    :return success_criteria: {0:success, 1:fail}, or the fan_out of the
+                              remaining partition loads
+    """
+    full_table_id = str(job_params.get("full_table_id"))
+    table_partitions = job_params.get("table_partitions")
+    table_path = job_params.get("table_path")
+    table_path_params = job_params.get("table_path_params")
+    backup_format = job_params.get("backup_format")
+    table_name = full_table_id.split(".")[-1]
+
+    partition_job_params_list = []
+    for partition_id, partition in sorted(table_partitions["partitions"].items()):
+        partition_job_params = dict(job_params)
+        partition_job_params["full_table_id"] = "{}${}".format(
+            full_table_id, partition_id
+        )
+        partition_job_params["time_partitioning"] = table_partitions[
+            "time_partitioning"
+        ]
+        partition_job_params["checkpoint_key"] = get_partition_checkpoint_key(
+            job_params.get("checkpoint_key"), partition_id
+        )
+        partition_job_params["gcs_table_path"] = table_path.format(
+            timestamp=partition["timestamp"],
+            table_file_name="{}-{}-*.{}".format(
+                table_name, partition_id, backup_format["extension"]
+            ),
+            **table_path_params
+        )
+        partition_job_params_list.append(partition_job_params)
+    if not partition_job_params_list:
+        return 0
+
+    # Replacing the whole table, as the load of an unpartitioned table does.
+    # A journaled first partition means an earlier attempt already did it
+    first_job_params = partition_job_params_list.pop(0)
+    if job_params.get("table_exists") and (
+        get_checkpoint(
+            job_params.get("journal"), first_job_params.get("checkpoint_key")
+        )
+        is None
+    ):
+        client = job_params.get("client")
+        call_with_rate_limit(
+            project_id=job_params.get("project_id"),
+            methods=["tables.delete"],
+            api_call=lambda: client.delete_table(full_table_id, not_found_ok=True),
+        )
+    # Creating the table with one load before fanning out
+    success_criteria = load_table_from_gcs(first_job_params)
+    if success_criteria != 0:
+        return success_criteria
+
+    def finish_partitions(partition_results):
+        for _, partition_criteria, error in partition_results:
+            if error is not None or partition_criteria != 0:
+                return 1
+        restore_table_properties(
+            client=job_params.get("client"),
+            project_id=job_params.get("project_id"),
+            full_table_id=full_table_id,
+            table_definition=job_params.get("table_definition"),
+        )
+        return success_criteria
+
+    return fan_out(
+        sub_units=partition_job_params_list,
+        process_sub_unit=load_table_from_gcs,
+        finish_unit=finish_partitions,
+    )
+
+
+def locate_table_backup(**kwargs):
     """
-    This is the main function for exporting the big-query datasets
-    to google-cloud-storage.
+    Finds the backup of a table for the restore date, following the
+    reference left by an incremental backup to the date holding the data.
     :param project_id: Google Cloud Project Id (type:str)
-    :param config_file: Restore Configuration File Path (type:str)
-    :param retention: Retention Type ["daily", "monthly", "weekly", "yearly"] (type:str)
-    :param restore_type: Restore Type ["all", "config"] (type:str)
-    :param date: restore Date. Supported format: YYYY-mm-dd (type:bool/str)
+    :param schema_path: Schema Uri Template (type:str)
+    :param table_path: Table Data Uri Template (type:str)
+    :param path_params: bucket_name, retention, dataset_name (type:dict)
+    :param table_name: Table-Id (type:str)
+    :param timestamp: Restore Date. Format: YYYY-mm-dd (type:str)
+    :param table_manifest: Entry of the table in the manifest of the restore
+                           date, None if the run wrote no manifest (type:dict)
+    :return table_timestamp, backup_format, table_partitions: Date holding the
+            data, its format (None if no backup exists) and the partitions
+            record of partitioned backups (type:str,dict,dict)
+    """
+    project_id = kwargs.get("project_id")
+    schema_path = kwargs.get("schema_path")
+    table_path = kwargs.get("table_path")
+    path_params = kwargs.get("path_params")
+    bq_table_name = kwargs.get("table_name")
+    timestamp = kwargs.get("timestamp")
+    table_manifest = kwargs.get("table_manifest")
+
+    # The manifest already names the date and format holding the data
+    if table_manifest is not None:
+        if table_manifest["status"] == "failed":
+            return timestamp, None, None
+        table_timestamp = table_manifest["timestamp"]
+        backup_format = get_backup_format(
+            {
+                "format": table_manifest["format"],
+                "compression": table_manifest["compression"],
+            }
+        )
+        table_partitions = None
+        if "partitions" in table_manifest:
+            table_partitions = read_json_schema(
+                schema_path.format(
+                    timestamp=table_timestamp,
+                    schema_file_name=bq_table_name + "-partitions.json",
+                    **path_params
+                ),
+                project_id,
+            )
+        return table_timestamp, backup_format, table_partitions
+
+    table_timestamp = timestamp
+    while True:
+        # Partitioned backups are described by their partitions record
+        table_partitions = read_json_schema(
+            schema_path.format(
+                timestamp=table_timestamp,
+                schema_file_name=bq_table_name + "-partitions.json",
+                **path_params
+            ),
+            project_id,
+        )
+        if table_partitions is not None:
+            return (
+                table_timestamp,
+                get_backup_format(table_partitions["format"]),
+                table_partitions,
+            )
+        # Detecting the backup format from the data files
+        backup_format = detect_backup_format(
+            project_id=project_id,
+            gcs_table_path=table_path.format(
+                timestamp=table_timestamp,
+                table_file_name=bq_table_name + "-",
+                **path_params
+            ),
+        )
+        if backup_format is not None or table_timestamp != timestamp:
+            return table_timestamp, backup_format, None
+        # Following the reference left by an incremental backup
+        backup_reference = read_json_schema(
+            schema_path.format(
+                timestamp=timestamp,
+                schema_file_name=bq_table_name + "-reference.json",
+                **path_params
+            ),
+            project_id,
+        )
+        if backup_reference is None:
+            return table_timestamp, None, None
+        table_timestamp = backup_reference["timestamp"]
+
+
+def iter_backup_tables(**kwargs):
+    """
+    Yields the tables of a backup from the backup bucket alone, so a
+    restore does not depend on the live warehouse. The manifest of the run
+    is used when there is one. Otherwise the dataset folders of the
+    retention tier are listed once and the schema folder of every dataset
+    is read concurrently, which also prefetches the schemas for the loads.
+    Tables are yielded as each dataset's folder arrives.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param schema_path: Schema Uri Template (type:str)
+    :param path_params: bucket_name, retention (type:dict)
+    :param timestamp: Restore Date. Format: YYYY-mm-dd (type:str)
+    :param table_manifests: Tables of the backup manifest (type:dict)
+    :param max_workers: Number of datasets read at once (type:int)
+    :return units: Generator of (dataset_id, table_id, None) (type:generator)
+    """
+    project_id = kwargs.get("project_id")
+    schema_path = kwargs.get("schema_path")
+    path_params = kwargs.get("path_params")
+    timestamp = kwargs.get("timestamp")
+    table_manifests = kwargs.get("table_manifests")
+    max_workers = kwargs.get("max_workers", 8)
+
+    if table_manifests:
+        for table_key, table_manifest in sorted(table_manifests.items()):
+            if table_manifest["status"] != "failed":
+                bq_dataset_name, bq_table_name = table_key.split(".", 1)
+                yield (bq_dataset_name, bq_table_name, None)
+        return
+
+    # Listing the dataset folders of the retention tier
+    dataset_pattern = get_layout_pattern(
+        schema_path, end_field="dataset_name", timestamp=timestamp, **path_params
+    )
+    datasets = []
+    for dataset_prefix in list_prefixes(
+        get_layout_prefix(schema_path, timestamp=timestamp, **path_params),
+        project_id=project_id,
+    ):
+        match = dataset_pattern.match(dataset_prefix)
+        if match:
+            datasets.append(match.group("dataset_name"))
+
+    def list_backup_tables(bq_dataset_name):
+        schema_files = read_schema_folder(
+            get_schema_folder_path(
+                schema_path,
+                dataset_name=bq_dataset_name,
+                timestamp=timestamp,
+                **path_params
+            ),
+            project_id,
+        )
+        return sorted(
+            set(
+                schema_file_name[: -len(suffix)]
+                for schema_file_name in schema_files
+                for suffix in BACKUP_FILE_SUFFIXES
+                if schema_file_name.endswith(suffix)
+            )
+        )
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_dataset = {
+            executor.submit(list_backup_tables, bq_dataset_name): bq_dataset_name
+            for bq_dataset_name in datasets
+        }
+        for future in concurrent.futures.as_completed(future_to_dataset):
+            bq_dataset_name = future_to_dataset[future]
+            try:
+                bq_table_names = future.result()
+            except Exception as error:
+                print(
+                    "Exception occurred at function {} for dataset {}: {}".format(
+                        "iter_backup_tables", bq_dataset_name, error
+                    )
+                )
+                continue
+            for bq_table_name in bq_table_names:
+                yield (bq_dataset_name, bq_table_name, None)
+
+
+def restore_table(job_params):
+    """
+    Restores one table from its backup in google-cloud-storage.
+    :param client: Big Query Client (type:google.cloud.bigquery.client.Client)
+    :param project_id: Google Cloud Project Id (type:str)
+    :param bucket_name: Backup Bucket Name (type:str)
+    :param dataset_name: Dataset-Id (type:str)
+    :param table_name: Table-Id (type:str)
+    :param retention: Retention Type (type:str)
+    :param timestamp: Restore Date. Format: YYYY-mm-dd (type:str)
+    :param location: Table-Data File Location (type:str)
+    :param schema_path: Schema Uri Template (type:str)
+    :param table_path: Table Data Uri Template (type:str)
+    :param table_manifest: Entry of the table in the backup manifest (type:dict)
+    :param table_index: Existing tables of the dataset from
+                        get_dataset_table_index. None if the dataset
+                        couldn't be indexed (type:dict)
+    :param dataset_error: Error creating the missing dataset, which fails
+                          the restore (type:Exception)
+    :param point_in_time: Restore from the most recent backup at or before
+                          timestamp, in any retention tier (type:bool)
+    :param manifest_path: Manifest Uri Template (type:str)
+    :param journal: Checkpoint journal of the run. None disables
+                    checkpointing (type:dict)
+    :param checkpoint_key: Journal key of the table (type:str)
+    :return success_criteria: {0:success, 1:fail, None:skipped}, or the
+                              fan_out of a per-partition restore. The backup
+                              restored from is set as job_params["restored_from"]
+    """
+    client = job_params.get("client")
+    project_id = job_params.get("project_id")
+    bucket_name = job_params.get("bucket_name")
+    bq_dataset_name = job_params.get("dataset_name")
+    bq_table_name = job_params.get("table_name")
+    retention = job_params.get("retention")
+    timestamp = job_params.get("timestamp")
+    location = job_params.get("location")
+    schema_path = job_params.get("schema_path")
+    table_path = job_params.get("table_path")
+    print("Restoring table: {}".format(bq_table_name))
+
+    # Skipping tables an interrupted attempt of this run already restored
+    checkpoint = get_checkpoint(
+        job_params.get("journal"), job_params.get("checkpoint_key")
+    )
+    if checkpoint is not None and checkpoint["status"] == "done":
+        print(
+            "Table {}.{} already restored by an earlier attempt".format(
+                bq_dataset_name, bq_table_name
+            )
+        )
+        job_params["restored_from"] = checkpoint["restored_from"]
+        return 0
+    if job_params.get("dataset_error") is not None:
+        raise RuntimeError(
+            "Dataset {} could not be created: {}".format(
+                bq_dataset_name, job_params["dataset_error"]
+            )
+        )
+
+    # Resolving the backup nearest to the target time (point-in-time restore)
+    if job_params.get("point_in_time"):
+        retention, timestamp = resolve_point_in_time(
+            project_id=project_id,
+            schema_path=schema_path,
+            manifest_path=job_params.get("manifest_path"),
+            path_params={"bucket_name": bucket_name, "dataset_name": bq_dataset_name},
+            table_name=bq_table_name,
+            target_timestamp=timestamp,
+        )
+        if timestamp is None:
+            print(
+                "No backup at or before {} for {}.{}. Skipping load job...".format(
+                    job_params.get("timestamp"), bq_dataset_name, bq_table_name
+                )
+            )
+            return None
+        print(
+            "Restoring {}.{} from {} backup of {}".format(
+                bq_dataset_name, bq_table_name, retention, timestamp
+            )
+        )
+
+    job_params["restored_from"] = {"retention": retention, "timestamp": timestamp}
+
+    # Getting dataset and table objects
+    dataset_ref = bigquery.DatasetReference(project_id, bq_dataset_name)
+    table_ref = dataset_ref.table(bq_table_name)
+    # Check if table exists, from the dataset's table index when there is one
+    table_index = job_params.get("table_index")
+    if table_index is not None:
+        table_exists = bq_table_name in table_index
+    else:
+        try:
+            call_with_rate_limit(
+                project_id=project_id,
+                methods=["tables.get"],
+                api_call=lambda: client.get_table(table_ref),
+            )
+            table_exists = True
+        except NotFound:
+            table_exists = False
+    # Defining Load Job Parameters
+    load_job_params = {}
+    path_params = {
+        "bucket_name": bucket_name,
+        "retention": retention,
+        "dataset_name": bq_dataset_name,
+    }
+    table_timestamp, backup_format, table_partitions = locate_table_backup(
+        project_id=project_id,
+        schema_path=schema_path,
+        table_path=table_path,
+        path_params=path_params,
+        table_name=bq_table_name,
+        timestamp=timestamp,
+        table_manifest=job_params.get("table_manifest"),
+    )
+    # Reading the table-definition. Avro and Parquet files carry their own
+    # schema, but partitioning and clustering only come from here
+    table_definition = None
+    if backup_format is not None:
+        gcs_schema_path = schema_path.format(
+            timestamp=table_timestamp,
+            schema_file_name=bq_table_name + "-schema.json",
+            **path_params
+        )
+        table_definition = read_table_definition(
+            read_json_schema(gcs_schema_path, project_id)
+        )
+    if backup_format is None:
+        print(
+            "Backup data doesn't exist for {}. Skipping load job...".format(table_ref)
+        )
+        return None
+    if (
+        not table_exists
+        and table_definition is None
+        and not backup_format["embeds_schema"]
+    ):
+        print(
+            "Schema and table doesn't exist for {}. Skipping load job...".format(
+                table_ref
+            )
+        )
+        return None
+    gcs_table_path = table_path.format(
+        timestamp=table_timestamp,
+        table_file_name=bq_table_name + "-*." + backup_format["extension"],
+        **path_params
+    )
+    load_job_params["backup_format"] = backup_format
+    load_job_params["gcs_table_path"] = gcs_table_path
+    load_job_params["table_definition"] = table_definition
+    load_job_params["location"] = location
+    load_job_params["full_table_id"] = table_ref
+    load_job_params["client"] = client
+    load_job_params["project_id"] = project_id
+    load_job_params["journal"] = job_params.get("journal")
+    load_job_params["checkpoint_key"] = job_params.get("checkpoint_key")
+    if table_partitions is not None:
+        load_job_params["table_partitions"] = table_partitions
+        load_job_params["table_exists"] = table_exists
+        load_job_params["table_path"] = table_path
+        load_job_params["table_path_params"] = path_params
+        return load_table_partitions_from_gcs(load_job_params)
+    return load_table_from_gcs(load_job_params)
+
+
+def report_restore_outcome(job_params, success_criteria, error):
+    """
+    Prints the outcome of one table restore.
+    :param job_params: Restore Job Parameters (type:dict)
+    :param success_criteria: Value returned by restore_table (type:int)
+    :param error: Exception raised by the restore, if any (type:Exception)
     :return NoneType:
     """
-    print("Running bigquery dataset import for project:{}".format(project_id))
-    # Reading restore-parameters from json config
-    with open(config_file) as f:
-        master_config = json.load(f)
-    restore_config = master_config["restore"]
+    if error is not None:
+        print(
+            "Exception occurred for project {} at function {} inside import-loop: {}".format(
+                job_params["project_id"], "main_process_function", error
+            )
+        )
+    elif success_criteria == 0:
+        print(
+            "Table load from google cloud storage successful for {}.{}".format(
+                job_params["dataset_name"], job_params["table_name"]
+            )
+        )
+    elif success_criteria == 1:
+        print(
+            "Table load from google cloud storage not successful for {}.{}".format(
+                job_params["dataset_name"], job_params["table_name"]
+            )
+        )
+
+
+def get_restore_table_units(**kwargs):
+    """
+    Returns the tables a restore_type selects, streamed as the listing
+    progresses.
+    :param client: Bigquery Client (type:google.cloud.bigquery.client.Client)
+    :param project_id: Google Cloud Project Id (type:str)
+    :param restore_config: Restore Configuration (type:dict)
+    :param restore_type: Restore Type ["all", "config", "backup"] (type:str)
+    :param retention: Retention Type (type:str)
+    :param timestamp: Restore Date (type:str)
+    :param table_manifests: Tables of the backup manifest (type:dict)
+    :return table_units: Generator of (dataset_id, table_id, table_type).
+                         None if the restore_type is invalid (type:generator)
+    """
+    client = kwargs.get("client")
+    project_id = kwargs.get("project_id")
+    restore_config = kwargs.get("restore_config")
+    restore_type = kwargs.get("restore_type")
+    project_restore_config = restore_config["projects_dict"][project_id]
+    max_concurrent_listings = restore_config.get("max_concurrent_listings", 8)
+    if restore_type == "all":
+        return iter_dataset_tables(
+            client=client, project_id=project_id, max_workers=max_concurrent_listings
+        )
+    if restore_type == "config":
+        # Extract the restore pattern from config
+        return iter_pattern_tables(
+            client=client,
+            project_id=project_id,
+            pattern=project_restore_config["restore_pattern"],
+            max_workers=max_concurrent_listings,
+        )
+    if restore_type == "backup":
+        # Discovering the tables from the backup bucket
+        return iter_backup_tables(
+            project_id=project_id,
+            schema_path=restore_config["schema_uri"],
+            path_params={
+                "bucket_name": project_restore_config["bucket_name"],
+                "retention": kwargs.get("retention"),
+            },
+            timestamp=kwargs.get("timestamp"),
+            table_manifests=kwargs.get("table_manifests"),
+            max_workers=max_concurrent_listings,
+        )
+    print(
+        "Please provide a valid restore_type option. Choose from ['all', 'config', 'backup']"
+    )
+    return None
+
 
+def prepare_project_import(
+    project_id, restore_config, retention, restore_type, date, point_in_time="False"
+):
+    """
+    Prepares the import of one project for the shared work-queue: a stream of
+    table restore jobs and the stage run once every table is done.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param restore_config: Restore Configuration (type:dict)
+    :param retention: Retention Type ["daily", "monthly", "weekly", "yearly"] (type:str)
+    :param restore_type: Restore Type ["all", "config", "backup"] (type:str)
+    :param date: restore Date. Supported format: YYYY-mm-dd (type:str)
+    :param point_in_time: True/False. Restore every table from its most recent
+                          backup at or before date, in any retention tier.
+                          date may then be YYYY-mm-ddTHH:MM:SS (type:bool/str)
+    :return project_import: {project_id, max_concurrent_jobs, work_units,
+                            on_unit_done, finish_import}. None if the
+                            restore_type is invalid (type:dict)
+    """
+    print("Running bigquery dataset import for project:{}".format(project_id))
     location = restore_config["location"]
     schema_path = restore_config["schema_uri"]
     table_path = restore_config["table_uri"]
     project_restore_config = restore_config["projects_dict"][project_id]
-    mapped_list = []
+    # Project-level cap of in-flight restores overrides the global one
+    max_concurrent_jobs = project_restore_config.get(
+        "max_concurrent_jobs", restore_config.get("max_concurrent_jobs", 1)
+    )
+    max_concurrent_listings = restore_config.get("max_concurrent_listings", 8)
+    # Project-level dispatch order and priorities override the global ones
+    restore_order = project_restore_config.get(
+        "restore_order", restore_config.get("restore_order", "listing")
+    )
+    restore_priorities = dict(
+        restore_config.get("restore_priorities", {}),
+        **project_restore_config.get("restore_priorities", {})
+    )
     timestamp = date
+    point_in_time = str(point_in_time).title() == "True"
+    if point_in_time and restore_type == "backup":
+        print(
+            "Point-in-time restore needs restore_type 'all' or 'config'. Skipping project:{}".format(
+                project_id
+            )
+        )
+        return None
+    if restore_order not in RESTORE_ORDERS:
+        print(
+            "Invalid restore_order {} for project:{}. Restoring in listing order.".format(
+                restore_order, project_id
+            )
+        )
+        restore_order = "listing"
 
     # Creating Big Query Client
     client = bigquery.Client(project=project_id)
 
-    # Getting mapped relation between datasets and their tables
-    if restore_type == "all":
-        # Get all datasets
-        datasets = list_all_datasets(client=client)
-        # Map dataset->[tables]
-        dataset_tables_map = get_datasets_tables_dict(
-            client=client, project_id=project_id, datasets=datasets
-        )
-        mapped_list.append(dataset_tables_map)
-    elif restore_type == "config":
-        # Extract the restore pattern from config
-        restore_pattern = project_restore_config["restore_pattern"]
-        for key, value in restore_pattern.items():
-            dataset_tables_map = {}
-            if value == "all":
-                # Map dataset->[tables]
-                dataset_tables_map = get_datasets_tables_dict(
-                    client=client, project_id=project_id, datasets=[key]
-                )
-                mapped_list.append(dataset_tables_map)
-            else:
-                # Map dataset->[tables]
-                dataset_tables_map[key] = value
-                mapped_list.append(dataset_tables_map)
-    else:
-        print(
-            "Please provide a valid restore_type option. Choose from ['all', 'config']"
+    # Reading the manifest of the backup run, if it wrote one. Point-in-time
+    # restores pick a backup date per table instead
+    backup_manifest = None
+    if not point_in_time:
+        backup_manifest = read_backup_manifest(
+            manifest_uri=get_manifest_uri(
+                restore_config,
+                bucket_name=project_restore_config["bucket_name"],
+                retention=retention,
+                timestamp=timestamp,
+                project_id=project_id,
+            ),
+            project_id=project_id,
         )
+    table_manifests = (backup_manifest or {}).get("tables", {})
+
+    # Streaming (dataset, table, table_type) units as the listing progresses
+    table_units = get_restore_table_units(
+        client=client,
+        project_id=project_id,
+        restore_config=restore_config,
+        restore_type=restore_type,
+        retention=retention,
+        timestamp=timestamp,
+        table_manifests=table_manifests,
+    )
+    if table_units is None:
         return None
 
-    # Performing dataset import to gcs (data, schema)
-    if mapped_list:
-        for datasets_tables_dict in mapped_list:
-            for bq_dataset_name in datasets_tables_dict.keys():
+    restored_datasets = []
+    table_indexes = {}
+    dataset_errors = {}
+    # Datasets whose schema folder couldn't be prefetched
+    unreadable_datasets = set()
+    restored_tables, failed_tables = [], []
+    # Journal of this run, so a restarted run skips the tables already done
+    journal = None
+    if restore_config.get("journal_path"):
+        journal = open_checkpoint_journal(
+            restore_config["journal_path"].format(
+                retention=retention, timestamp=timestamp, project_id=project_id
+            )
+        )
+    verification_uri = get_verification_uri(
+        restore_config,
+        bucket_name=project_restore_config["bucket_name"],
+        retention=retention,
+        timestamp=timestamp,
+        project_id=project_id,
+    )
+
+    def get_table_index(bq_dataset_name):
+        # Indexing the dataset's existing tables in one listing. Tables of a
+        # dataset that can't be indexed are looked up one by one instead
+        try:
+            table_index = get_dataset_table_index(
+                client=client,
+                project_id=project_id,
+                dataset=bq_dataset_name,
+                location=location,
+            )
+        except Exception as error:
+            print(
+                "Exception occurred for dataset {} at function {}: {}".format(
+                    bq_dataset_name, "get_dataset_table_index", error
+                )
+            )
+            return None
+        # Recreating datasets lost with the warehouse
+        if table_index is None:
+            print("Creating missing dataset: {}".format(bq_dataset_name))
+            dataset = bigquery.Dataset("{}.{}".format(project_id, bq_dataset_name))
+            dataset.location = location
+            try:
+                call_with_rate_limit(
+                    project_id=project_id,
+                    methods=["datasets.insert"],
+                    api_call=lambda: client.create_dataset(dataset, exists_ok=True),
+                )
+            except Exception as error:
+                print(
+                    "Exception occurred for dataset {} at function {}: {}".format(
+                        bq_dataset_name, "create_dataset", error
+                    )
+                )
+                # Failing the dataset's tables instead of ending the stream
+                dataset_errors[bq_dataset_name] = error
+            table_index = {}
+        return table_index
+
+    def iter_job_params():
+        for bq_dataset_name, bq_table_name, table_type in table_units:
+            if bq_dataset_name not in restored_datasets:
                 print("Restore Operation on dataset: {}".format(bq_dataset_name))
-                for bq_table_name in datasets_tables_dict[bq_dataset_name]:
-                    print("Restoring table: {}".format(bq_table_name))
-                    try:
-                        # Getting dataset and table objects
-                        dataset_ref = bigquery.DatasetReference(
-                            project_id, bq_dataset_name
-                        )
-                        table_ref = dataset_ref.table(bq_table_name)
-                        # Check if table exists
-                        try:
-                            client.get_table(table_ref)
-                            table_exists = True
-                        except NotFound:
-                            table_exists = False
-                        # Defining Load Job Parameters
-                        job_params = {}
-                        gcs_schema_path = schema_path.format(
+                restored_datasets.append(bq_dataset_name)
+                table_indexes[bq_dataset_name] = get_table_index(bq_dataset_name)
+            table_manifest = table_manifests.get(
+                "{}.{}".format(bq_dataset_name, bq_table_name)
+            )
+            # Prefetching the dataset's schema files before its loads start.
+            # Datasets interleave, so the cached folder is looked up per table.
+            # Point-in-time restores resolve each table's date when it runs
+            schema_files = None
+            if not point_in_time and bq_dataset_name not in unreadable_datasets:
+                try:
+                    schema_files = read_schema_folder(
+                        get_schema_folder_path(
+                            schema_path,
                             bucket_name=project_restore_config["bucket_name"],
                             retention=retention,
                             dataset_name=bq_dataset_name,
                             timestamp=timestamp,
-                            schema_file_name=bq_table_name + "-schema.json",
-                        )
-                        json_schema = read_json_schema(gcs_schema_path)
-                        if not table_exists and json_schema is None:
-                            print(
-                                "Schema and table doesn't exist for {}. Skipping load job...".format(
-                                    table_ref
-                                )
-                            )
-                            pass
-                        else:
-                            gcs_table_path = table_path.format(
-                                bucket_name=project_restore_config["bucket_name"],
-                                retention=retention,
-                                dataset_name=bq_dataset_name,
-                                timestamp=timestamp,
-                                table_file_name=bq_table_name + "-*.json",
-                            )
-                            job_params["gcs_table_path"] = gcs_table_path
-                            job_params["json_schema"] = json_schema
-                            job_params["location"] = location
-                            job_params["full_table_id"] = table_ref
-                            job_params["client"] = client
-                            success_criteria = load_table_from_gcs(job_params)
-                            if success_criteria == 0:
-                                print(
-                                    "Table load from google cloud storage successful."
-                                )
-                            else:
-                                print(
-                                    "Table load from google cloud storage not successful."
-                                )
-                            pass
-                    except Exception as error:
-                        print(
-                            "Exception occurred for project {} at function {} inside export-loop: {}".format(
-                                project_id, "main_process_function", error
-                            )
+                        ),
+                        project_id,
+                    )
+                except Exception as error:
+                    # Loads read the schema files again when they run
+                    print(
+                        "Exception occurred for dataset {} at function {}: {}".format(
+                            bq_dataset_name, "read_schema_folder", error
                         )
+                    )
+                    unreadable_datasets.add(bq_dataset_name)
+            # Reporting missing schemas before any load is submitted
+            if (
+                schema_files is not None
+                and table_manifest is None
+                and not has_table_backup(schema_files, bq_table_name)
+            ):
+                print(
+                    "Schema doesn't exist for {}.{} in backup of {}".format(
+                        bq_dataset_name, bq_table_name, timestamp
+                    )
+                )
+            yield {
+                "client": client,
+                "project_id": project_id,
+                "bucket_name": project_restore_config["bucket_name"],
+                "dataset_name": bq_dataset_name,
+                "table_name": bq_table_name,
+                "retention": retention,
+                "timestamp": timestamp,
+                "location": location,
+                "schema_path": schema_path,
+                "table_path": table_path,
+                "table_manifest": table_manifest,
+                "table_index": table_indexes[bq_dataset_name],
+                "dataset_error": dataset_errors.get(bq_dataset_name),
+                "point_in_time": point_in_time,
+                "manifest_path": restore_config.get("manifest_uri"),
+                "journal": journal,
+                "checkpoint_key": get_checkpoint_key(
+                    project_id=project_id,
+                    dataset_name=bq_dataset_name,
+                    table_name=bq_table_name,
+                    retention=retention,
+                    timestamp=timestamp,
+                ),
+            }
+
+    def get_table_bytes(job_params):
+        # Tables done in an earlier attempt are skipped without loading
+        checkpoint = get_checkpoint(journal, job_params["checkpoint_key"])
+        if checkpoint is not None and checkpoint["status"] == "done":
+            return 0
+        table_manifest = job_params["table_manifest"]
+        if table_manifest is not None and table_manifest.get("num_bytes") is not None:
+            return table_manifest["num_bytes"]
+        table_plan = plan_table_restore(job_params)
+        return sum(table_plan["job_bytes"]) if table_plan is not None else 0
+
+    def iter_ordered_job_params():
+        # Sizing and sorting needs every table, so loads start once the
+        # listing is complete
+        job_params_list = order_restore_jobs(
+            job_params_list=list(iter_job_params()),
+            restore_order=restore_order,
+            restore_priorities=restore_priorities,
+            get_table_bytes=get_table_bytes,
+            max_workers=max_concurrent_listings,
+        )
+        print(
+            "Restoring {} tables of project:{} in {} order, starting with: {}".format(
+                len(job_params_list),
+                project_id,
+                restore_order,
+                ", ".join(
+                    "{}.{}".format(job_params["dataset_name"], job_params["table_name"])
+                    for job_params in job_params_list[:5]
+                ),
+            )
+        )
+        for job_params in job_params_list:
+            yield job_params
+
+    def on_table_done(job_params, success_criteria, error):
+        report_restore_outcome(job_params, success_criteria, error)
+        if error is None and success_criteria == 0:
+            restored_tables.append(job_params)
+            write_checkpoint(
+                journal,
+                job_params["checkpoint_key"],
+                "done",
+                restored_from=job_params["restored_from"],
+            )
+        elif error is not None or success_criteria == 1:
+            failed_tables.append(job_params)
+            write_checkpoint(
+                journal,
+                job_params["checkpoint_key"],
+                "failed",
+                error=str(error) if error is not None else None,
+            )
+
+    def get_expected_tables():
+        # Export-time row counts and sizes, from the manifest of the backup
+        # each table was restored from
+        backup_manifests = {(retention, timestamp): backup_manifest}
+        expected_tables = {}
+        for job_params in restored_tables:
+            table_key = "{}.{}".format(
+                job_params["dataset_name"], job_params["table_name"]
+            )
+            if job_params["table_manifest"] is not None:
+                expected_tables[table_key] = job_params["table_manifest"]
+                continue
+            restored_from = job_params["restored_from"]
+            manifest_key = (restored_from["retention"], restored_from["timestamp"])
+            if manifest_key not in backup_manifests:
+                backup_manifests[manifest_key] = read_backup_manifest(
+                    manifest_uri=get_manifest_uri(
+                        restore_config,
+                        bucket_name=project_restore_config["bucket_name"],
+                        project_id=project_id,
+                        **restored_from
+                    ),
+                    project_id=project_id,
+                )
+            manifest_tables = (backup_manifests[manifest_key] or {}).get("tables", {})
+            expected_tables[table_key] = manifest_tables.get(table_key)
+        return expected_tables
+
+    def finish_import():
+        close_checkpoint_journal(journal)
+        if not restored_datasets:
+            print(
+                "The mapping between datasets and their tables is empty for project:{}".format(
+                    project_id
+                )
+            )
+            return None
+        # Verification stage: comparing restored tables with the backup
+        if verification_uri is not None and (restored_tables or failed_tables):
+            table_results = verify_restored_tables(
+                client=client,
+                project_id=project_id,
+                location=location,
+                expected_tables=get_expected_tables(),
+                bytes_tolerance=restore_config.get("verify_bytes_tolerance", 0.0),
+                max_workers=max_concurrent_listings,
+            )
+            for job_params in failed_tables:
+                table_results[
+                    "{}.{}".format(job_params["dataset_name"], job_params["table_name"])
+                ] = {"status": "failed", "reason": "restore failed"}
+            write_verification_report(
+                verification_uri=verification_uri,
+                project_id=project_id,
+                retention=retention,
+                timestamp=timestamp,
+                table_results=table_results,
+            )
         return None
+
+    return {
+        "project_id": project_id,
+        "max_concurrent_jobs": max_concurrent_jobs,
+        "work_units": (
+            iter_job_params()
+            if restore_order == "listing"
+            else iter_ordered_job_params()
+        ),
+        "on_unit_done": on_table_done,
+        "finish_import": finish_import,
+    }
+
+
+def plan_table_restore(job_params):
+    """
+    Finds the backup files one table restore would load, without loading
+    them. Follows the same manifest, reference and point-in-time rules as
+    restore_table.
+    :param job_params: Restore Job Parameters, as for restore_table (type:dict)
+    :return table_plan: {job_bytes, shard_count}. None if the table has no
+                        backup (type:dict)
+    """
+    project_id = job_params.get("project_id")
+    bq_dataset_name = job_params.get("dataset_name")
+    bq_table_name = job_params.get("table_name")
+    retention = job_params.get("retention")
+    timestamp = job_params.get("timestamp")
+    schema_path = job_params.get("schema_path")
+    table_path = job_params.get("table_path")
+    path_params = {
+        "bucket_name": job_params.get("bucket_name"),
+        "dataset_name": bq_dataset_name,
+    }
+    if job_params.get("point_in_time"):
+        retention, timestamp = resolve_point_in_time(
+            project_id=project_id,
+            schema_path=schema_path,
+            manifest_path=job_params.get("manifest_path"),
+            path_params=path_params,
+            table_name=bq_table_name,
+            target_timestamp=timestamp,
+        )
+        if timestamp is None:
+            return None
+    path_params["retention"] = retention
+    table_timestamp, backup_format, table_partitions = locate_table_backup(
+        project_id=project_id,
+        schema_path=schema_path,
+        table_path=table_path,
+        path_params=path_params,
+        table_name=bq_table_name,
+        timestamp=timestamp,
+        table_manifest=job_params.get("table_manifest"),
+    )
+    if backup_format is None:
+        return None
+    # One load job per partition, or one for the whole table
+    if table_partitions is not None:
+        load_jobs = [
+            (partition["timestamp"], "{}-{}-".format(bq_table_name, partition_id))
+            for partition_id, partition in table_partitions["partitions"].items()
+        ]
     else:
-        print("The mapping between datasets and their tables is empty.")
+        load_jobs = [(table_timestamp, bq_table_name + "-")]
+    table_plan = {"job_bytes": [], "shard_count": 0}
+    for data_timestamp, file_prefix in load_jobs:
+        file_sizes = read_data_folder_sizes(
+            table_path.format(
+                timestamp=data_timestamp, table_file_name="", **path_params
+            ),
+            project_id,
+        )
+        shard_pattern = re.compile(re.escape(file_prefix) + r"\d{12}\.")
+        shard_sizes = [
+            size
+            for file_name, size in file_sizes.items()
+            if shard_pattern.match(file_name)
+        ]
+        table_plan["job_bytes"].append(sum(shard_sizes))
+        table_plan["shard_count"] = table_plan["shard_count"] + len(shard_sizes)
+    return table_plan
+
+
+def plan_project_import(
+    project_id, restore_config, retention, restore_type, date, point_in_time="False"
+):
+    """
+    Expands the tables of one project's restore and sizes their backup files
+    concurrently, without creating datasets or submitting any job.
+    :param project_id: Google Cloud Project Id (type:str)
+    :param restore_config: Restore Configuration (type:dict)
+    :param retention: Retention Type ["daily", "monthly", "weekly", "yearly"] (type:str)
+    :param restore_type: Restore Type ["all", "config", "backup"] (type:str)
+    :param date: restore Date. Supported format: YYYY-mm-dd (type:str)
+    :param point_in_time: True/False, as for prepare_project_import (type:bool/str)
+    :return project_plan: {project_id, max_concurrent_jobs, table_count,
+                          skipped, job_bytes, shard_count, object_count}.
+                          None if the restore_type is invalid (type:dict)
+    """
+    print("Planning bigquery dataset import for project:{}".format(project_id))
+    project_restore_config = restore_config["projects_dict"][project_id]
+    point_in_time = str(point_in_time).title() == "True"
+    if point_in_time and restore_type == "backup":
+        print(
+            "Point-in-time restore needs restore_type 'all' or 'config'. Skipping project:{}".format(
+                project_id
+            )
+        )
         return None
+    client = bigquery.Client(project=project_id)
+    backup_manifest = None
+    if not point_in_time:
+        backup_manifest = read_backup_manifest(
+            manifest_uri=get_manifest_uri(
+                restore_config,
+                bucket_name=project_restore_config["bucket_name"],
+                retention=retention,
+                timestamp=date,
+                project_id=project_id,
+            ),
+            project_id=project_id,
+        )
+    table_manifests = (backup_manifest or {}).get("tables", {})
+    table_units = get_restore_table_units(
+        client=client,
+        project_id=project_id,
+        restore_config=restore_config,
+        restore_type=restore_type,
+        retention=retention,
+        timestamp=date,
+        table_manifests=table_manifests,
+    )
+    if table_units is None:
+        return None
+    project_plan = {
+        "project_id": project_id,
+        "max_concurrent_jobs": project_restore_config.get(
+            "max_concurrent_jobs", restore_config.get("max_concurrent_jobs", 1)
+        ),
+        "table_count": 0,
+        "skipped": {},
+        "job_bytes": [],
+        "shard_count": 0,
+        "object_count": 0,
+    }
+
+    # Sizing the backup of every table concurrently while the listing streams in
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=restore_config.get("max_workers", 16)
+    ) as executor:
+        future_to_table = {}
+        for bq_dataset_name, bq_table_name, table_type in table_units:
+            project_plan["table_count"] = project_plan["table_count"] + 1
+            job_params = {
+                "project_id": project_id,
+                "bucket_name": project_restore_config["bucket_name"],
+                "dataset_name": bq_dataset_name,
+                "table_name": bq_table_name,
+                "retention": retention,
+                "timestamp": date,
+                "schema_path": restore_config["schema_uri"],
+                "table_path": restore_config["table_uri"],
+                "table_manifest": table_manifests.get(
+                    "{}.{}".format(bq_dataset_name, bq_table_name)
+                ),
+                "point_in_time": point_in_time,
+                "manifest_path": restore_config.get("manifest_uri"),
+            }
+            future = executor.submit(plan_table_restore, job_params)
+            future_to_table[future] = "{}.{}".format(bq_dataset_name, bq_table_name)
+        for future in concurrent.futures.as_completed(future_to_table):
+            try:
+                table_plan = future.result()
+            except Exception as error:
+                print(
+                    "Exception occurred for {} at function {}: {}".format(
+                        future_to_table[future], "plan_project_import", error
+                    )
+                )
+                table_plan, reason = None, "backup not readable"
+            else:
+                reason = "no backup"
+            if table_plan is None:
+                project_plan["skipped"][reason] = (
+                    project_plan["skipped"].get(reason, 0) + 1
+                )
+                continue
+            project_plan["job_bytes"].extend(table_plan["job_bytes"])
+            project_plan["shard_count"] = (
+                project_plan["shard_count"] + table_plan["shard_count"]
+            )
+            project_plan["object_count"] = (
+                project_plan["object_count"] + table_plan["shard_count"]
+            )
+    return project_plan
+
+
+def plan_process_function(project_params_list, config_file):
+    """
+    Prints the estimate of an import run instead of running it: job count,
+    total bytes, backup shards and the projected wall time at the configured
+    concurrency. No dataset is created and no job is submitted.
+    :param project_params_list: [{project_id, retention, restore_type,
+                                date, point_in_time}] (type:list)
+    :param config_file: Restore Configuration File Path (type:str)
+    :return run_plan: From print_run_plan (type:dict)
+    """
+    with open(config_file) as f:
+        master_config = json.load(f)
+    restore_config = master_config["restore"]
+
+    project_plans = []
+    for project_params in project_params_list:
+        try:
+            project_plan = plan_project_import(
+                restore_config=restore_config, **project_params
+            )
+        except Exception as error:
+            print(
+                "Exception occurred for project {} at function {}: {}".format(
+                    project_params["project_id"], "plan_project_import", error
+                )
+            )
+            continue
+        if project_plan is not None:
+            project_plans.append(project_plan)
+    return print_run_plan(
+        label="import",
+        project_plans=project_plans,
+        max_workers=restore_config.get(
+            "max_workers",
+            sum(project_plan["max_concurrent_jobs"] for project_plan in project_plans)
+            or 1,
+        ),
+        job_type="load",
+        plan_config=restore_config.get("plan"),
+    )
+
+
+def main_process_function(project_params_list, config_file):
+    """
+    This is the main function for importing the big-query tables
+    from google-cloud-storage. The tables of every project are flattened
+    into one work-queue served by max_workers threads, with each project
+    capped at its max_concurrent_jobs.
+    :param project_params_list: [{project_id, retention, restore_type,
+                                date, point_in_time}] (type:list)
+    :param config_file: Restore Configuration File Path (type:str)
+    :return table_count: Number of table restores run (type:int)
+    """
+    run_io_stats = get_io_stats()
+    # Reading restore-parameters from json config
+    with open(config_file) as f:
+        master_config = json.load(f)
+    restore_config = master_config["restore"]
+    # Limits shared by every load job of the run
+    configure_rate_limits(master_config.get("rate_limits"))
+
+    project_imports = []
+    for project_params in project_params_list:
+        try:
+            project_import = prepare_project_import(
+                restore_config=restore_config, **project_params
+            )
+        except Exception as error:
+            print(
+                "Exception occurred for project {} at function {}: {}".format(
+                    project_params["project_id"], "prepare_project_import", error
+                )
+            )
+            continue
+        if project_import is not None:
+            project_imports.append(project_import)
+
+    # A project listed twice (e.g. for two retentions) shares one cap
+    max_in_flight_per_key = {}
+    for project_import in project_imports:
+        max_in_flight_per_key[project_import["project_id"]] = max(
+            max_in_flight_per_key.get(project_import["project_id"], 1),
+            project_import["max_concurrent_jobs"],
+        )
+    # Without a max_workers setting every project gets its full cap
+    max_workers = restore_config.get(
+        "max_workers", sum(max_in_flight_per_key.values()) or 1
+    )
+
+    def iter_stream_units(project_import):
+        for job_params in project_import["work_units"]:
+            yield project_import, job_params
+
+    unit_results = run_work_queue(
+        unit_streams=[
+            (project_import["project_id"], iter_stream_units(project_import))
+            for project_import in project_imports
+        ],
+        process_unit=lambda unit: restore_table(unit[1]),
+        on_unit_done=lambda unit, success_criteria, error: unit[0]["on_unit_done"](
+            unit[1], success_criteria, error
+        ),
+        max_workers=max_workers,
+        max_in_flight_per_key=max_in_flight_per_key,
+    )
+    for project_import in project_imports:
+        try:
+            project_import["finish_import"]()
+        except Exception as error:
+            print(
+                "Exception occurred for project {} at function {}: {}".format(
+                    project_import["project_id"], "finish_import", error
+                )
+            )
+    print_io_stats(label="import", since=run_io_stats)
+    return len(unit_results)
 
 
 if __name__ == "__main__":
     # Reading cmd args
     cmdargs = cmd_args_parser()
 
-    # Preparing params for multi-processing
+    # Preparing params for the work-queue
 
     project_id_list = cmdargs["project_id"]
-    # Define number of workers
-    num_workers = len(project_id_list)
+    # Define number of projects
+    num_projects = len(project_id_list)
     # Defining other positional params list
-    config_file_param_list = [cmdargs["config_file"]] * num_workers
     if len(cmdargs["retention"]) == 1:
-        retention_param_list = cmdargs["retention"] * num_workers
+        retention_param_list = cmdargs["retention"] * num_projects
     else:
         retention_param_list = cmdargs["retention"]
     if len(cmdargs["restore_type"]) == 1:
-        restore_type_param_list = cmdargs["restore_type"] * num_workers
+        restore_type_param_list = cmdargs["restore_type"] * num_projects
     else:
         restore_type_param_list = cmdargs["restore_type"]
     if len(cmdargs["date"]) == 1:
-        date_param_list = cmdargs["date"] * num_workers
+        date_param_list = cmdargs["date"] * num_projects
     else:
         date_param_list = cmdargs["date"]
-    # Starting Multi Processing
-    process_call_count = 0
-    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
-        try:
-            for val in executor.map(
-                main_process_function,
-                project_id_list,
-                config_file_param_list,
-                retention_param_list,
-                restore_type_param_list,
-                date_param_list,
-            ):
-                process_call_count = process_call_count + 1
-        except futures.process.BrokenProcessPool as e:
-            print("Could not start new tasks: {}".format(e))
+    if len(cmdargs["point_in_time"]) == 1:
+        point_in_time_param_list = cmdargs["point_in_time"] * num_projects
+    else:
+        point_in_time_param_list = cmdargs["point_in_time"]
+    project_params_list = [
+        {
+            "project_id": project_id,
+            "retention": retention,
+            "restore_type": restore_type,
+            "date": date,
+            "point_in_time": point_in_time,
+        }
+        for project_id, retention, restore_type, date, point_in_time in zip(
+            project_id_list,
+            retention_param_list,
+            restore_type_param_list,
+            date_param_list,
+            point_in_time_param_list,
+        )
+    ]
 
-    print(
-        "For projects: {}, total number of processes executed: {}".format(
-            num_workers, process_call_count
+    if cmdargs["plan"].title() == "True":
+        # Printing the estimate of the run without submitting jobs
+        plan_process_function(project_params_list, cmdargs["config_file"])
+    else:
+        # Starting the work-queue
+        table_count = main_process_function(project_params_list, cmdargs["config_file"])
+
+        print(
+            "For projects: {}, total number of table restores executed: {}".format(
+                num_projects, table_count
+            )
         )
-    )